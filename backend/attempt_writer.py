@@ -0,0 +1,107 @@
+import asyncio
+import os
+from dotenv import load_dotenv
+from pymongo import WriteConcern
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteConcernError
+from database import attempts_collection
+
+load_dotenv()
+
+# Attempts are written with insert_many once this many are queued or the window has passed
+ATTEMPT_BATCH_SIZE = int(os.getenv("ATTEMPT_BATCH_SIZE", "100"))
+ATTEMPT_BATCH_WINDOW_SECONDS = float(os.getenv("ATTEMPT_BATCH_WINDOW_SECONDS", "0.02"))
+# A submission is only acknowledged once its attempt is journaled on a majority of the replica set
+ATTEMPT_WRITE_CONCERN = WriteConcern(w="majority", j=True)
+
+
+class AttemptWriter:
+    """Coalesces quiz attempt inserts from concurrent submissions into insert_many batches.
+
+    insert() only returns once the batch holding the attempt has been
+    acknowledged by MongoDB, so a submission is never reported as saved
+    before it is; a failed write is raised to that submission's caller."""
+
+    def __init__(self, collection, batch_size=ATTEMPT_BATCH_SIZE, window=ATTEMPT_BATCH_WINDOW_SECONDS):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.window = window
+        self._pending = []
+        self._timer = None
+        self._flushes = set()
+        self.batches = 0
+        self.written = 0
+        self.failed = 0
+
+    async def insert(self, attempt):
+        """Queue an attempt (with its _id already set) and wait until it is written"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((attempt, future))
+        if len(self._pending) >= self.batch_size:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._start_flush)
+        # shield: a client disconnecting must not drop its attempt from the batch
+        await asyncio.shield(future)
+        return attempt
+
+    def _start_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.ensure_future(self._write(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _write(self, batch):
+        self.batches += 1
+        errors = {}
+        try:
+            await self.collection.insert_many([attempt for attempt, _ in batch], ordered=False)
+        except BulkWriteError as e:
+            concern_errors = e.details.get("writeConcernErrors") or []
+            if concern_errors:
+                # Written, but not durably: nothing in the batch may be reported as saved
+                concern_error = WriteConcernError(
+                    concern_errors[0].get("errmsg", "write concern error"), concern_errors[0].get("code"), concern_errors[0]
+                )
+                errors = {index: concern_error for index in range(len(batch))}
+            # Unordered: everything except the listed documents was written
+            for error in e.details.get("writeErrors", []):
+                if error.get("code") == 11000:
+                    errors[error["index"]] = DuplicateKeyError(error.get("errmsg", "duplicate key"), 11000, error)
+                else:
+                    errors[error["index"]] = e
+        except Exception as e:
+            errors = {index: e for index in range(len(batch))}
+
+        for index, (attempt, future) in enumerate(batch):
+            if future.done():
+                continue
+            if index in errors:
+                self.failed += 1
+                future.set_exception(errors[index])
+            else:
+                self.written += 1
+                future.set_result(attempt)
+
+    async def flush(self):
+        """Write everything queued and wait for all batches in flight (used on shutdown)"""
+        self._start_flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def stats(self):
+        return {
+            "batch_size": self.batch_size,
+            "window_seconds": self.window,
+            "queued": len(self._pending),
+            "batches": self.batches,
+            "written": self.written,
+            "failed": self.failed
+        }
+
+
+attempt_writer = AttemptWriter(attempts_collection.with_options(write_concern=ATTEMPT_WRITE_CONCERN))
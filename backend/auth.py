@@ -5,8 +5,11 @@ from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from typing import Optional
 import os
+from bson import ObjectId
 from dotenv import load_dotenv
-from database import Teacher, Student, verify_password
+from caching import LRUCache
+from database import Teacher, Student, User
+from passwords import verify_password, hash_password, needs_rehash
 
 # Load environment variables
 load_dotenv()
@@ -15,6 +18,16 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-for-jwt-tokens")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Look up teachers/students directly when an email is missing from the users collection
+LEGACY_LOGIN_FALLBACK = os.getenv("LEGACY_LOGIN_FALLBACK", "true").lower() == "true"
+# Authenticated users cached per (role, user id, token issue time); TTL bounds staleness across workers
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+# Let read-only endpoints trust the name/email signed into the token instead of loading the user
+TRUST_TOKEN_CLAIMS = os.getenv("TRUST_TOKEN_CLAIMS", "false").lower() == "true"
+
+ROLE_MODELS = {"teacher": Teacher, "student": Student}
+principal_cache = LRUCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -29,11 +42,35 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": datetime.utcnow()})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
+def invalidate_principal(user_id):
+    """Forget cached principals of a user after a profile or password change.
+    Other worker processes keep theirs for at most PRINCIPAL_CACHE_TTL_SECONDS."""
+    principal_cache.pop_where(lambda key: key[1] == str(user_id))
+
+async def load_principal(user_type, user_id, issued_at):
+    key = (user_type, user_id, issued_at)
+    user = principal_cache.get(key)
+    if user is None:
+        user = await ROLE_MODELS[user_type].get_by_id(user_id)
+        if user is None:
+            return None
+        # Handlers only need the profile; keep password hashes out of memory
+        user.pop("password", None)
+        principal_cache.set(key, user)
+    return user
+
+def claims_principal(payload):
+    """The user as described by the token's signed claims, or None for tokens issued without them"""
+    if not payload.get("name") or not payload.get("email"):
+        return None
+    return {"_id": ObjectId(payload["sub"]), "email": payload["email"], "name": payload["name"]}
+
+async def authenticated_principal(token: str, trust_claims: bool = False):
+    """(role, user) for a bearer token. Cached users must be treated as read-only."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -48,48 +85,75 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     except JWTError:
         raise credentials_exception
     
-    if user_type == "teacher":
-        user = await Teacher.get_by_id(user_id)
-    elif user_type == "student":
-        user = await Student.get_by_id(user_id)
-    else:
+    if user_type not in ROLE_MODELS:
         raise credentials_exception
     
+    user = claims_principal(payload) if trust_claims and TRUST_TOKEN_CLAIMS else None
+    if user is None:
+        user = await load_principal(user_type, user_id, payload.get("iat"))
     if user is None:
         raise credentials_exception
+    return user_type, user
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    user_type, user = await authenticated_principal(token)
     return user
 
-async def get_current_teacher(token: str = Depends(oauth2_scheme)):
-    user = await get_current_user(token)
-    if not user or "email" not in user:
+def require_role(user_type, role):
+    if user_type != role:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not a teacher"
+            detail=f"Not a {role}"
         )
+
+async def get_current_teacher(token: str = Depends(oauth2_scheme)):
+    user_type, user = await authenticated_principal(token)
+    require_role(user_type, "teacher")
     return user
 
 async def get_current_student(token: str = Depends(oauth2_scheme)):
-    user = await get_current_user(token)
-    if not user or "email" not in user:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not a student"
-        )
+    user_type, user = await authenticated_principal(token)
+    require_role(user_type, "student")
+    return user
+
+# Read-only endpoints: may skip the user lookup entirely when TRUST_TOKEN_CLAIMS is on
+async def get_teacher_claims(token: str = Depends(oauth2_scheme)):
+    user_type, user = await authenticated_principal(token, trust_claims=True)
+    require_role(user_type, "teacher")
+    return user
+
+async def get_student_claims(token: str = Depends(oauth2_scheme)):
+    user_type, user = await authenticated_principal(token, trust_claims=True)
+    require_role(user_type, "student")
     return user
 
 # Authentication functions
-async def authenticate_teacher(email: str, password: str):
-    teacher = await Teacher.get_by_email(email)
-    if not teacher:
-        return False
-    if not verify_password(password, teacher["password"]):
-        return False
-    return teacher
-
-async def authenticate_student(email: str, password: str):
-    student = await Student.get_by_email(email)
-    if not student:
-        return False
-    if not verify_password(password, student["password"]):
-        return False
-    return student 
\ No newline at end of file
+async def legacy_credentials(email: str):
+    """Credentials for accounts missing from the users collection (not yet backfilled by migrate.py)"""
+    found = False
+    for role, model in ROLE_MODELS.items():
+        user = await model.get_by_email(email)
+        if user:
+            await User.save(role, user)
+            found = True
+    return await User.get_by_email(email) if found else []
+
+async def rehash_if_needed(credential, password):
+    """Upgrade a stored hash to the current bcrypt work factor after a successful login"""
+    if needs_rehash(credential["password"]):
+        new_hash = await hash_password(password)
+        await User.replace_password_hash(credential["_id"], credential["password"], new_hash)
+        await ROLE_MODELS[credential["role"]].replace_password_hash(credential["user_id"], credential["password"], new_hash)
+        invalidate_principal(credential["user_id"])
+
+async def authenticate(email: str, password: str):
+    """Check a login against the users collection. Returns the matching credential or None."""
+    credentials = await User.get_by_email(email)
+    if not credentials and LEGACY_LOGIN_FALLBACK:
+        credentials = await legacy_credentials(email)
+    # Teachers first, matching the old teacher-then-student order
+    for credential in credentials:
+        if await verify_password(password, credential["password"]):
+            await rehash_if_needed(credential, password)
+            return credential
+    return None
@@ -0,0 +1,98 @@
+"""Attempt ingest throughput against a real MongoDB: batched vs. per-document inserts.
+
+Fires --submissions concurrent attempt writes at MONGO_URL and reports
+attempts/s and latency for AttemptWriter (insert_many batches) and for one
+insert_one per attempt, both with ATTEMPT_WRITE_CONCERN and the unique
+(student_id, quiz_id) index in place. It writes to a scratch database
+(--db, dropped afterwards unless --keep), never to DB_NAME.
+
+    MONGO_URL=mongodb://localhost:27017 python -m bench.attempt_ingest [--submissions 1000]
+"""
+import argparse
+import asyncio
+import time
+
+from bson import ObjectId
+
+from bench.common import correct_answer, make_questions, print_summary
+
+
+def make_attempts(count, answers_per_attempt=20):
+    from database import QuizAttempt
+
+    questions = make_questions(answers_per_attempt)
+    quiz_id = ObjectId()
+    answers = [{
+        "question_id": question["id"],
+        "student_answer": correct_answer(question),
+        "correct_answer": question.get("correct_answer", ""),
+        "correct_answers": question.get("correct_answers", []),
+        "is_correct": True
+    } for question in questions]
+    return [QuizAttempt.new(str(ObjectId()), str(quiz_id), answers, 100.0) for _ in range(count)]
+
+
+async def ingest(write, attempts):
+    """Write every attempt concurrently; returns (elapsed seconds, per-write latencies)"""
+    async def timed(attempt):
+        started = time.perf_counter()
+        await write(attempt)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(timed(attempt) for attempt in attempts))
+    return time.perf_counter() - started, latencies
+
+
+async def run(args):
+    import database
+    from attempt_writer import ATTEMPT_WRITE_CONCERN, AttemptWriter
+
+    if args.db == database.DB_NAME:
+        raise SystemExit(f"--db must not be the app database ({database.DB_NAME})")
+    scratch = database.client[args.db]
+    print(f"MongoDB {(await database.client.server_info())['version']} at {database.MONGO_URL}, database {args.db}")
+
+    async def fresh_collection(name):
+        collection = scratch[name]
+        await collection.drop()
+        await collection.create_index(
+            [("student_id", 1), ("quiz_id", 1)], unique=True, name=database.ATTEMPTS_INDEX_NAME
+        )
+        return collection.with_options(write_concern=ATTEMPT_WRITE_CONCERN)
+
+    results = {}
+    try:
+        for _ in range(args.rounds):
+            collection = await fresh_collection("attempts_insert_one")
+            results.setdefault("insert_one per attempt", []).append(
+                await ingest(collection.insert_one, make_attempts(args.submissions))
+            )
+
+            writer = AttemptWriter(await fresh_collection("attempts_batched"), batch_size=args.batch_size)
+            results.setdefault(f"AttemptWriter (batches of {args.batch_size})", []).append(
+                await ingest(writer.insert, make_attempts(args.submissions))
+            )
+    finally:
+        if not args.keep:
+            await database.client.drop_database(args.db)
+
+    print(f"{args.submissions} concurrent attempts x {args.rounds} rounds, write concern {ATTEMPT_WRITE_CONCERN.document}")
+    for label, runs in results.items():
+        elapsed = min(seconds for seconds, _ in runs)
+        summary = print_summary(label, [latency for _, latencies in runs for latency in latencies])
+        print(f"{'':<40} best round {elapsed * 1000:.0f} ms, {args.submissions / elapsed:,.0f} attempts/s (p99 {summary['p99_ms']} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--submissions", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--db", default="QuizGen_bench")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch database")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Helpers shared by the benchmarks in this directory.
+
+Run the benchmarks from backend/, e.g. `python -m bench.submit_load`. The
+HTTP benchmarks drive the app in-process through httpx's ASGI transport, with
+MongoDB (and Gemini) replaced by in-memory stand-ins that answer after a fixed
+delay, so the numbers show how much the work in this process holds up the
+event loop rather than network or database latency.
+"""
+import asyncio
+import contextlib
+import io
+import time
+
+from bson import ObjectId
+
+
+def percentile(samples, p):
+    """p-th percentile (0-100) of samples, nearest rank"""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize(samples):
+    """Latency summary in milliseconds of samples given in seconds"""
+    return {
+        "n": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "max_ms": round(max(samples, default=0.0) * 1000, 2)
+    }
+
+
+def print_summary(label, samples):
+    summary = summarize(samples)
+    print(
+        f"{label:<40} n={summary['n']:<5} p50={summary['p50_ms']:>9.2f} ms  "
+        f"p95={summary['p95_ms']:>9.2f} ms  p99={summary['p99_ms']:>9.2f} ms  max={summary['max_ms']:>9.2f} ms"
+    )
+    return summary
+
+
+def best_of(func, repeat=5, number=1):
+    """Fastest of repeat runs of number calls to func, in seconds per call"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best
+
+
+@contextlib.contextmanager
+def quiet():
+    """Swallow the app's debug prints while a benchmark runs"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def app_client(app):
+    import httpx
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None)
+
+
+async def timed_request(client, method, url, **kwargs):
+    """(response, seconds) for one request"""
+    started = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    return response, time.perf_counter() - started
+
+
+async def steady_load(client, method, url, duration, concurrency=10, until=None, **kwargs):
+    """Keep concurrency requests in flight for duration seconds, or until the
+    future until is done if one is given; returns their latencies"""
+    started = time.perf_counter()
+    samples = []
+
+    def running():
+        return not until.done() if until is not None else time.perf_counter() - started < duration
+
+    async def worker():
+        while running():
+            response, elapsed = await timed_request(client, method, url, **kwargs)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{method} {url} failed: {response.status_code} {response.text[:200]}")
+            samples.append(elapsed)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples
+
+
+class MemoryCollection:
+    """Just enough of a Motor collection for the benchmarks, answering after latency seconds.
+
+    At most pool_size operations run at once (Motor's default maxPoolSize), so
+    a burst of queries queues like it would for connections."""
+
+    def __init__(self, latency=0.002, pool_size=100):
+        self.latency = latency
+        self.pool_size = pool_size
+        self._pool = None
+        self.documents = {}
+        self.reads = 0
+        self.writes = 0
+
+    async def _round_trip(self):
+        if self._pool is None:
+            self._pool = asyncio.Semaphore(self.pool_size)
+        async with self._pool:
+            await asyncio.sleep(self.latency)
+
+    async def find_one(self, query, projection=None):
+        await self._round_trip()
+        self.reads += 1
+        for document in self.documents.values():
+            if all(document.get(key) == value for key, value in query.items()):
+                return document
+        return None
+
+    async def insert_many(self, documents, ordered=True):
+        await self._round_trip()
+        self.writes += 1
+        for document in documents:
+            self.documents[document.setdefault("_id", ObjectId())] = document
+
+    async def replace_one(self, query, document, upsert=False):
+        await self._round_trip()
+        self.writes += 1
+        self.documents[query["_id"]] = {"_id": query["_id"], **document}
+
+
+def use_memory_database(latency=0.002):
+    """Point the models, the attempt writer and the generation cache at MemoryCollections"""
+    import database
+    import generation_cache
+    from attempt_writer import attempt_writer
+
+    collections = {name: MemoryCollection(latency) for name in ("quizzes", "attempts", "generation_cache")}
+    database.quizzes_collection = collections["quizzes"]
+    database.attempts_collection = collections["attempts"]
+    attempt_writer.collection = collections["attempts"]
+    generation_cache.generation_cache_collection = collections["generation_cache"]
+    return collections
+
+
+def sign_in_as(app, student):
+    """Skip token checks: every student endpoint sees this student"""
+    from auth import get_current_student, get_student_claims
+    app.dependency_overrides[get_current_student] = lambda: student
+    app.dependency_overrides[get_student_claims] = lambda: student
+
+
+def make_questions(count):
+    """count questions cycling through the three quiz types, each with a stable id"""
+    questions = []
+    for index in range(count):
+        kind = ("mcq", "true_false", "multi_answer")[index % 3]
+        question = {
+            "id": str(index),
+            "text": f"Question {index}: which of these statements about topic {index} holds?",
+            "type": kind,
+            "difficulty": "medium",
+            "explanation": f"Topic {index} is covered in section {index % 7} of the text."
+        }
+        if kind == "mcq":
+            question["options"] = [f"Option {letter} for {index}" for letter in "ABCD"]
+            question["correct_answer"] = f"Option B for {index}"
+        elif kind == "true_false":
+            question["options"] = ["True", "False"]
+            question["correct_answer"] = "True"
+        else:
+            question["options"] = [f"Option {letter} for {index}" for letter in "ABCDE"]
+            question["correct_answers"] = [f"Option A for {index}", f"Option C for {index}"]
+        questions.append(question)
+    return questions
+
+
+def correct_answer(question):
+    if question["type"] == "multi_answer":
+        return ",".join(question["correct_answers"])
+    return question["correct_answer"]
+
+
+def make_quiz(num_questions, access_code="BENCH1"):
+    from datetime import datetime
+    return {
+        "_id": ObjectId(),
+        "title": f"Benchmark quiz ({num_questions} questions)",
+        "description": "Generated for benchmarking",
+        "quiz_type": "mixed",
+        "teacher_id": ObjectId(),
+        "access_code": access_code,
+        "questions": make_questions(num_questions),
+        "created_at": datetime.utcnow()
+    }
+
+
+def make_student():
+    return {"_id": ObjectId(), "name": "Bench Student", "email": "student@bench.local"}
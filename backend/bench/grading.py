@@ -0,0 +1,87 @@
+"""Grading micro-benchmark for one submission to a --questions question quiz.
+
+Compares the per-submission question scan submit_quiz used before the answer
+key (kept below as legacy_grade), compiling the key on every submission, and
+grading against the cached compiled key. --positional answers by question
+position, the legacy scan's worst case (it calls list.index per question).
+
+    python -m bench.grading [--questions 200] [--positional]
+"""
+import argparse
+
+from bench.common import best_of, correct_answer, make_questions
+from grading import compile_answer_key, grade
+
+
+def legacy_grade(quiz, answers):
+    """submit_quiz's grading loop before grading.py, for comparison"""
+    correct_answers = 0
+    answer_details = []
+    for question_id, student_answer in answers:
+        question = None
+        for q in quiz["questions"]:
+            if str(q.get("id", "")) == question_id or str(quiz["questions"].index(q)) == question_id:
+                question = q
+                break
+        if not question:
+            continue
+
+        is_correct = False
+        question_type = question.get("type", "mcq")
+        if question_type == "mcq" or question_type == "true_false":
+            is_correct = student_answer == question.get("correct_answer", "")
+        elif question_type == "multi_answer":
+            correct_answers_list = question.get("correct_answers", [])
+            student_answers = student_answer.split(",") if isinstance(student_answer, str) else student_answer
+            is_correct = (
+                len(student_answers) == len(correct_answers_list) and
+                all(ans in correct_answers_list for ans in student_answers)
+            )
+        if is_correct:
+            correct_answers += 1
+        answer_details.append({
+            "question_id": question_id,
+            "student_answer": student_answer,
+            "correct_answer": question.get("correct_answer", ""),
+            "correct_answers": question.get("correct_answers", []),
+            "is_correct": is_correct
+        })
+    total_questions = len(quiz["questions"])
+    score = (correct_answers / total_questions) * 100 if total_questions > 0 else 0
+    return correct_answers, score, answer_details
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--positional", action="store_true", help="answer by position instead of question id")
+    parser.add_argument("--number", type=int, default=200, help="submissions per timing run")
+    args = parser.parse_args()
+
+    questions = make_questions(args.questions)
+    if args.positional:
+        for question in questions:
+            del question["id"]
+    quiz = {"_id": "bench", "questions": questions}
+    answers = [(str(index), correct_answer(question)) for index, question in enumerate(questions)]
+    answer_key = compile_answer_key(quiz)
+
+    expected = legacy_grade(quiz, answers)
+    assert grade(answer_key, answers) == expected, "compiled grading disagrees with the legacy loop"
+
+    timings = [
+        ("legacy scan", lambda: legacy_grade(quiz, answers)),
+        ("compile key + grade", lambda: grade(compile_answer_key(quiz), answers)),
+        ("grade with cached key", lambda: grade(answer_key, answers)),
+    ]
+    ids = "positions" if args.positional else "question ids"
+    print(f"one submission, {args.questions} questions answered by {ids} (best of 5 x {args.number})")
+    legacy = None
+    for label, func in timings:
+        seconds = best_of(func, repeat=5, number=args.number)
+        legacy = legacy or seconds
+        print(f"{label:<24} {seconds * 1e6:>10.1f} us  {legacy / seconds:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
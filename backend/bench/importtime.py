@@ -0,0 +1,66 @@
+"""Import-time regression guard for worker startup.
+
+Imports main in a fresh interpreter under `python -X importtime` and
+reports the total and the slowest modules. It exits non-zero if a module
+that must stay lazy (Gemini SDK, scraping and PDF libraries, NLTK) was
+imported, or if the import took longer than --budget-ms.
+
+    python -m bench.importtime [--module main] [--budget-ms 3000] [--top 15]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported on first use (or by PRELOAD_HEAVY_MODULES after startup), never by importing main
+LAZY_MODULES = ("google.generativeai", "grpc", "newspaper", "nltk", "bs4", "PyPDF2", "httpx")
+
+
+def import_times(module):
+    """{module name: (self us, cumulative us)} for a fresh `import module`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+        env={**os.environ, "PRELOAD_HEAVY_MODULES": "false"}
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{result.stderr[-2000:]}")
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--budget-ms", type=float, default=3000)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    times = import_times(args.module)
+    total_ms = times[args.module][1] / 1000
+    print(f"import {args.module}: {total_ms:.0f} ms cumulative, {len(times)} modules")
+    print(f"{'module':<50} {'self ms':>9} {'cumulative ms':>14}")
+    slowest = sorted(times.items(), key=lambda item: item[1][1], reverse=True)[1:args.top + 1]
+    for name, (self_us, cumulative_us) in slowest:
+        print(f"{name:<50} {self_us / 1000:>9.1f} {cumulative_us / 1000:>14.1f}")
+
+    failures = []
+    eager = [name for name in LAZY_MODULES if name in times]
+    if eager:
+        failures.append(f"imported eagerly: {', '.join(eager)}")
+    if total_ms > args.budget_ms:
+        failures.append(f"{total_ms:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
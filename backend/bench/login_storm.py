@@ -0,0 +1,88 @@
+"""Latency of unrelated endpoints during a login storm.
+
+Fires --logins concurrent POST /token requests (bcrypt verification at
+--rounds) while GET /quizzes/{id} runs at a steady concurrency, and compares
+its p99 with an idle baseline. Password work runs in the passwords pool;
+--inline runs bcrypt on the event loop instead, as before the pool existed.
+
+    python -m bench.login_storm [--logins 300] [--rounds 8] [--inline]
+"""
+import argparse
+import asyncio
+from collections import Counter
+
+import bcrypt
+from bson import ObjectId
+
+from bench.common import (
+    app_client, make_quiz, make_student, print_summary, quiet, sign_in_as,
+    steady_load, timed_request, use_memory_database
+)
+
+PASSWORD = "correct horse battery staple"
+
+
+async def run(args):
+    import main
+    import passwords
+    from database import User
+
+    passwords.BCRYPT_ROUNDS = args.rounds
+    if args.inline:
+        async def run_inline(func, *func_args):
+            return func(*func_args)
+        passwords._run = run_inline
+
+    collections = use_memory_database(args.db_latency)
+    quiz = make_quiz(20)
+    collections["quizzes"].documents[quiz["_id"]] = quiz
+    sign_in_as(main.app, make_student())
+
+    password_hash = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(rounds=args.rounds))
+
+    async def get_by_email(email):
+        await asyncio.sleep(args.db_latency)
+        return [{
+            "_id": ObjectId(), "user_id": ObjectId(), "role": "student",
+            "email": email, "name": "Bench Student", "password": password_hash
+        }]
+    User.get_by_email = staticmethod(get_by_email)
+
+    quiz_url = f"/quizzes/{quiz['_id']}"
+    async with app_client(main.app) as client:
+        with quiet():
+            await timed_request(client, "GET", quiz_url)
+            baseline = await steady_load(client, "GET", quiz_url, args.duration, args.concurrency)
+
+            storm = asyncio.ensure_future(asyncio.gather(*(
+                timed_request(client, "POST", "/token", data={
+                    "username": f"student{index}@bench.local", "password": PASSWORD
+                })
+                for index in range(args.logins)
+            )))
+            during = await steady_load(client, "GET", quiz_url, None, args.concurrency, until=storm)
+            logins = await storm
+
+    mode = "inline on the event loop" if args.inline else f"pool of {passwords.PASSWORD_HASH_WORKERS}"
+    print(f"{args.logins} concurrent logins, bcrypt rounds {args.rounds}, {mode}")
+    base = print_summary(f"GET /quizzes/{{id}} idle", baseline)
+    busy = print_summary(f"GET /quizzes/{{id}} during the storm", during)
+    print_summary("POST /token", [elapsed for _, elapsed in logins])
+    statuses = Counter(response.status_code for response, _ in logins)
+    print(f"login statuses: {dict(sorted(statuses.items()))} (503 = password queue full)")
+    print(f"p99 ratio (storm / idle): {busy['p99_ms'] / max(base['p99_ms'], 0.001):.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=2.0, help="seconds of the idle baseline")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--db-latency", type=float, default=0.002)
+    parser.add_argument("--inline", action="store_true")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
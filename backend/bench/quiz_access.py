@@ -0,0 +1,59 @@
+"""Exam-start stampede: concurrent /quizzes/access requests for one access code.
+
+Sends --requests concurrent POST /quizzes/access with the same code against
+a cold quiz cache. Concurrent misses should be coalesced into a single quiz
+read; the benchmark exits non-zero otherwise. --uncached looks the quiz up
+in the database on every request, as before the quiz cache.
+
+    python -m bench.quiz_access [--requests 500] [--db-latency 0.02] [--uncached]
+"""
+import argparse
+import asyncio
+import sys
+
+from bench.common import (
+    app_client, make_quiz, make_student, print_summary, quiet, sign_in_as,
+    timed_request, use_memory_database
+)
+
+
+async def run(args):
+    import main
+    from database import Quiz
+
+    collections = use_memory_database(args.db_latency)
+    quiz = make_quiz(args.questions, access_code="EXAM42")
+    collections["quizzes"].documents[quiz["_id"]] = quiz
+    sign_in_as(main.app, make_student())
+    if args.uncached:
+        main.quiz_cache.get_by_access_code = Quiz.get_by_access_code
+
+    async with app_client(main.app) as client:
+        with quiet():
+            results = await asyncio.gather(*(
+                timed_request(client, "POST", "/quizzes/access", json={"access_code": "EXAM42"})
+                for _ in range(args.requests)
+            ))
+
+    failed = sum(1 for response, _ in results if response.status_code != 200)
+    quiz_reads = collections["quizzes"].reads
+    mode = "no quiz cache" if args.uncached else "quiz cache"
+    print(f"{args.requests} concurrent /quizzes/access, {args.questions} questions, DB latency {args.db_latency * 1000:.0f} ms, {mode}")
+    print_summary("POST /quizzes/access", [elapsed for _, elapsed in results])
+    print(f"quiz reads: {quiz_reads}, coalesced: {main.quiz_cache.coalesced}, failed requests: {failed}")
+    if failed or (not args.uncached and quiz_reads != 1):
+        print("FAIL: expected every request to succeed with one quiz read")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--questions", type=int, default=30)
+    parser.add_argument("--db-latency", type=float, default=0.02)
+    parser.add_argument("--uncached", action="store_true")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Scrape latency with and without NLP (keywords and summary) on saved pages.
+
+Times the work /scrape-website does after the download, for each .html file
+in --pages: parse_page alone (the default) and parse_page followed by
+run_nlp (include_nlp=true, or /scrape-website/metadata). The NLTK punkt
+check runs once before timing.
+
+    python -m bench.scrape_nlp [--pages bench/pages] [--repeat 5]
+"""
+import argparse
+import os
+
+from bench.common import best_of, quiet
+
+PAGES_DIR = os.path.join(os.path.dirname(__file__), "pages")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", default=PAGES_DIR, help="directory of saved .html pages")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    import nltk
+    import web_scraper
+    web_scraper.ensure_nltk_data()
+    try:
+        nltk.data.find("tokenizers/punkt")
+    except LookupError:
+        raise SystemExit("NLTK punkt is not available: point NLTK_DATA at a copy or allow the download")
+
+    names = sorted(name for name in os.listdir(args.pages) if name.endswith(".html"))
+    if not names:
+        raise SystemExit(f"No .html pages in {args.pages}")
+
+    print(f"{'page':<28} {'KiB':>6} {'words':>6} {'parse ms':>10} {'parse+nlp ms':>13} {'nlp share':>10}")
+    totals = [0.0, 0.0]
+    for name in names:
+        with open(os.path.join(args.pages, name), encoding="utf-8") as page:
+            html = page.read()
+        url = f"https://bench.local/{name}"
+
+        def parse():
+            return web_scraper.parse_page(url, html)
+
+        def parse_and_nlp():
+            _, _, article = web_scraper.parse_page(url, html)
+            if article is not None:
+                web_scraper.run_nlp(article)
+
+        with quiet():
+            text, _, _ = parse()
+            parse_seconds = best_of(parse, repeat=args.repeat)
+            nlp_seconds = best_of(parse_and_nlp, repeat=args.repeat)
+        totals[0] += parse_seconds
+        totals[1] += nlp_seconds
+        print(
+            f"{name:<28} {len(html.encode()) / 1024:>6.1f} {len(text.split()):>6} {parse_seconds * 1000:>10.2f} "
+            f"{nlp_seconds * 1000:>13.2f} {1 - parse_seconds / nlp_seconds:>10.0%}"
+        )
+    print(
+        f"{'total':<28} {'':>6} {'':>6} {totals[0] * 1000:>10.2f} {totals[1] * 1000:>13.2f} "
+        f"{1 - totals[0] / totals[1]:>10.0%}"
+    )
+
+
+if __name__ == "__main__":
+    main()
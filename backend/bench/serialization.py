@@ -0,0 +1,101 @@
+"""Response serialization before and after the orjson response layer.
+
+Encodes a --questions question quiz and an --attempts attempt listing
+(with student names, as /quizzes/{id}/attempts returns it) two ways:
+
+- before: stringify each document's ObjectIds in place, then FastAPI's
+  default path, jsonable_encoder followed by JSONResponse's json.dumps
+- after: BSONJSONResponse, orjson with native ObjectId/datetime handling
+
+    python -m bench.serialization [--questions 200] [--attempts 1000]
+"""
+import argparse
+import copy
+import random
+from datetime import datetime, timedelta
+
+import orjson
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from bench.common import best_of, correct_answer, make_quiz
+from responses import BSONJSONResponse
+
+
+def make_attempts(count, quiz, answers_per_attempt=20):
+    random.seed(42)
+    started = datetime(2024, 5, 1, 9, 0)
+    questions = quiz["questions"][:answers_per_attempt]
+    attempts = []
+    for index in range(count):
+        answers = []
+        for question in questions:
+            right = random.random() < 0.7
+            answers.append({
+                "question_id": question["id"],
+                "student_answer": correct_answer(question) if right else "Option D",
+                "correct_answer": question.get("correct_answer", ""),
+                "correct_answers": question.get("correct_answers", []),
+                "is_correct": right
+            })
+        attempts.append({
+            "_id": ObjectId(),
+            "student_id": ObjectId(),
+            "quiz_id": quiz["_id"],
+            "answers": answers,
+            "score": 100 * sum(answer["is_correct"] for answer in answers) / len(answers),
+            "submitted_at": started + timedelta(seconds=index * 7),
+            "student_name": f"Student {index}",
+            "student_email": f"student{index}@school.example"
+        })
+    return attempts
+
+
+def before_quiz(quiz):
+    quiz["_id"] = str(quiz["_id"])
+    quiz["teacher_id"] = str(quiz["teacher_id"])
+    return JSONResponse(jsonable_encoder(quiz)).body
+
+
+def before_attempts(attempts):
+    for attempt in attempts:
+        attempt["_id"] = str(attempt["_id"])
+        attempt["student_id"] = str(attempt["student_id"])
+        attempt["quiz_id"] = str(attempt["quiz_id"])
+    return JSONResponse(jsonable_encoder(attempts)).body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--attempts", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    quiz = make_quiz(args.questions)
+    attempts = make_attempts(args.attempts, quiz)
+    cases = [
+        (f"quiz, {args.questions} questions", quiz, before_quiz, 50),
+        (f"attempts listing, {args.attempts}", attempts, before_attempts, 2),
+    ]
+
+    for label, document, before, _ in cases:
+        assert orjson.loads(before(copy.deepcopy(document))) == orjson.loads(BSONJSONResponse(document).body), \
+            f"{label}: before and after encode differently"
+
+    print(f"{'payload':<28} {'KiB':>7} {'before ms':>10} {'after ms':>9} {'speedup':>8}")
+    for label, document, before, number in cases:
+        # Documents from Motor are fresh per request, and the old path modified them in place
+        copies = [copy.deepcopy(document) for _ in range(args.repeat * number)]
+        before_seconds = best_of(lambda: before(copies.pop()), repeat=args.repeat, number=number)
+        after_seconds = best_of(lambda: BSONJSONResponse(document).body, repeat=args.repeat, number=number)
+        size = len(BSONJSONResponse(document).body)
+        print(
+            f"{label:<28} {size / 1024:>7.1f} {before_seconds * 1000:>10.2f} {after_seconds * 1000:>9.2f} "
+            f"{before_seconds / after_seconds:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
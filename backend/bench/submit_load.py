@@ -0,0 +1,128 @@
+"""/quizzes/submit latency while quiz generations are in flight.
+
+Submissions run at a steady concurrency, first alone and then while
+--generations /generate-quiz requests wait on a stand-in Gemini model that
+answers after --llm-seconds. Submit p99 should stay flat. --blocking makes
+the stand-in sleep on the event loop, like the synchronous generate_content
+calls did before generation went async, to show what it protects against.
+
+    python -m bench.submit_load [--generations 20] [--llm-seconds 3] [--blocking]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+
+from bench.common import (
+    app_client, correct_answer, make_quiz, make_student, print_summary, quiet,
+    sign_in_as, steady_load, timed_request, use_memory_database
+)
+
+_question_ids = itertools.count()
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.candidates = []
+
+
+class FakeGeminiModel:
+    """Answers generate_content_async with num_questions valid MCQs after latency seconds"""
+
+    def __init__(self, latency, blocking=False):
+        self.latency = latency
+        self.blocking = blocking
+        self.calls = 0
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        self.calls += 1
+        if self.blocking:
+            time.sleep(self.latency)
+        else:
+            await asyncio.sleep(self.latency)
+        count = int(prompt.split("Generate exactly ")[1].split()[0])
+        questions = []
+        for _ in range(count):
+            n = next(_question_ids)
+            questions.append({
+                "text": f"Benchmark question {n} on subject {n * 7919} of the text",
+                "type": "mcq",
+                "difficulty": "medium",
+                "options": [f"Answer {n}-{letter}" for letter in "ABCD"],
+                "correct_answer": f"Answer {n}-A",
+                "explanation": "Stated in the text."
+            })
+        return FakeResponse(json.dumps(questions))
+
+
+async def run(args):
+    import database
+    import main
+    import quiz_generator
+
+    model = FakeGeminiModel(args.llm_seconds, blocking=args.blocking)
+    quiz_generator.get_model = lambda model_name: model
+    collections = use_memory_database(args.db_latency)
+    # Measure the migrated path: the unique index, not a lookup, rejects resubmissions
+    # (the same student submits over and over here)
+    database._unique_attempts_confirmed = True
+
+    quiz = make_quiz(args.questions)
+    collections["quizzes"].documents[quiz["_id"]] = quiz
+    sign_in_as(main.app, make_student())
+    submission = {
+        "quiz_id": str(quiz["_id"]),
+        "answers": [{"question_id": q["id"], "answer": correct_answer(q)} for q in quiz["questions"]]
+    }
+
+    async with app_client(main.app) as client:
+        with quiet():
+            # Warm up the quiz cache and the answer key
+            await timed_request(client, "POST", "/quizzes/submit", json=submission)
+            baseline = await steady_load(
+                client, "POST", "/quizzes/submit", args.duration, args.concurrency, json=submission
+            )
+
+            # Generations are started once submissions are already flowing, so time spent
+            # blocked on the model (--blocking) lands inside the measured window
+            load = asyncio.ensure_future(steady_load(
+                client, "POST", "/quizzes/submit", args.duration, args.concurrency, json=submission
+            ))
+            await asyncio.sleep(0.1)
+            generations = [
+                asyncio.ensure_future(timed_request(client, "POST", "/generate-quiz", json={
+                    "text": f"Benchmark source text number {index}. " * 40,
+                    "num_questions": 5,
+                    "fresh": True
+                }))
+                for index in range(args.generations)
+            ]
+            loaded = await load
+            generated = await asyncio.gather(*generations)
+
+    mode = "blocking" if args.blocking else "async"
+    print(f"/quizzes/submit, {args.questions} questions, concurrency {args.concurrency}, DB latency {args.db_latency * 1000:.0f} ms")
+    base = print_summary("idle", baseline)
+    busy = print_summary(f"{args.generations} generations in flight ({mode})", loaded)
+    print_summary("/generate-quiz", [elapsed for _, elapsed in generated])
+    failed = sum(1 for response, _ in generated if response.status_code != 200 or not response.json().get("questions"))
+    print(f"model calls: {model.calls}, failed generations: {failed}")
+    print(f"p99 ratio (in flight / idle): {busy['p99_ms'] / max(base['p99_ms'], 0.001):.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--generations", type=int, default=20)
+    parser.add_argument("--llm-seconds", type=float, default=3.0)
+    parser.add_argument("--duration", type=float, default=2.0, help="seconds of submissions per phase")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--db-latency", type=float, default=0.002)
+    parser.add_argument("--blocking", action="store_true")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Size-bounded in-process LRU cache with an optional per-entry TTL.
+
+    With maxbytes, sizeof(value) is also summed over the entries and the
+    least recently used ones are evicted once the total goes over it."""
+
+    def __init__(self, maxsize=256, ttl=None, maxbytes=None, sizeof=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self._data = OrderedDict()
+        self._sizes = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _forget(self, key):
+        self.bytes -= self._sizes.pop(key, 0)
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, expires_at = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            self._forget(key)
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        if self.maxbytes is not None:
+            self._forget(key)
+            self._sizes[key] = self.sizeof(value)
+            self.bytes += self._sizes[key]
+        # A single value larger than maxbytes is evicted right away
+        while len(self._data) > self.maxsize or (self.maxbytes is not None and self.bytes > self.maxbytes):
+            oldest, _ = self._data.popitem(last=False)
+            self._forget(oldest)
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        self._forget(key)
+        return entry[0] if entry is not None else default
+
+    def pop_where(self, predicate):
+        """Drop every entry whose key matches predicate; returns how many were dropped"""
+        keys = [key for key in self._data if predicate(key)]
+        for key in keys:
+            del self._data[key]
+            self._forget(key)
+        return len(keys)
+
+    def clear(self):
+        self._data.clear()
+        self._sizes.clear()
+        self.bytes = 0
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        stats = {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+        if self.maxbytes is not None:
+            stats["bytes"] = self.bytes
+            stats["maxbytes"] = self.maxbytes
+        return stats
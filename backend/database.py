@@ -1,9 +1,11 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo import MongoClient
 from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pagination import keyset_filter
 import os
 from dotenv import load_dotenv
-import bcrypt
+from passwords import hash_password
 import secrets
 import string
 import ssl
@@ -14,27 +16,168 @@ load_dotenv()
 
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
 DB_NAME = os.getenv("DB_NAME", "QuizGen")
+GENERATION_CACHE_TTL_SECONDS = int(os.getenv("GENERATION_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+GENERATION_JOB_RETENTION_SECONDS = int(os.getenv("GENERATION_JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
 
 
 client = AsyncIOMotorClient(MONGO_URL, tlsAllowInvalidCertificates=True)
 db = client[DB_NAME]
 
-
-sync_client = MongoClient(MONGO_URL, tlsAllowInvalidCertificates=True)
-sync_db = sync_client[DB_NAME]
-
 # Collections
 teachers_collection = db.teachers
 students_collection = db.students
 quizzes_collection = db.quizzes
 attempts_collection = db.attempts
+generation_cache_collection = db.generation_cache
+generation_jobs_collection = db.generation_jobs
+# Login credentials of both roles keyed by email, so a login is a single query
+users_collection = db.users
+# Extra attempts removed when the one-attempt-per-quiz index was introduced
+attempt_duplicates_collection = db.attempts_duplicates
+
+ATTEMPTS_INDEX_NAME = "student_id_1_quiz_id_1"
+# Set once this process has seen the unique attempts index; until then submissions
+# are checked for an earlier attempt before they are written
+_unique_attempts_confirmed = False
+
+
+def unique_attempts_enforced():
+    """True if the unique (student_id, quiz_id) index is known to be in place"""
+    return _unique_attempts_confirmed
+
+
+async def ensure_indexes():
+    """Create every index the app relies on. Idempotent and non-destructive, so it is safe
+    in every worker's startup hook; data migrations are in migrate.py."""
+    await teachers_collection.create_index("email", unique=True)
+    await students_collection.create_index("email", unique=True)
+    await users_collection.create_index([("email", 1), ("role", -1)], unique=True)
+    await quizzes_collection.create_index("teacher_id")
+    await quizzes_collection.create_index([("teacher_id", 1), ("_id", 1)])
+    await quizzes_collection.create_index("access_code")
+    await check_unique_attempts_index()
+    # Teacher dashboards: a quiz's attempts in submission or score order
+    await attempts_collection.create_index([("quiz_id", 1), ("submitted_at", 1), ("_id", 1)])
+    await attempts_collection.create_index([("quiz_id", 1), ("score", 1), ("_id", 1)])
+    await ensure_ttl_index(generation_cache_collection, "created_at", GENERATION_CACHE_TTL_SECONDS)
+    await generation_jobs_collection.create_index([("status", 1), ("created_at", 1)])
+    await generation_jobs_collection.create_index([("teacher_id", 1), ("created_at", -1)])
+    await ensure_ttl_index(generation_jobs_collection, "finished_at", GENERATION_JOB_RETENTION_SECONDS)
+
+
+async def ensure_ttl_index(collection, field, seconds):
+    """TTL index on field expiring after seconds. When the setting changed since the index
+    was built, the expiry is updated with collMod (create_index would fail with
+    IndexOptionsConflict)."""
+    existing = (await collection.index_information()).get(f"{field}_1")
+    if existing is not None and "expireAfterSeconds" in existing:
+        if existing["expireAfterSeconds"] != seconds:
+            await collection.database.command(
+                "collMod", collection.name,
+                index={"keyPattern": {field: 1}, "expireAfterSeconds": seconds}
+            )
+        return
+    await collection.create_index(field, expireAfterSeconds=seconds)
+
 
+async def archive_duplicate_attempts():
+    """Keep each student's first attempt per quiz and move the others to attempts_duplicates.
+    Returns the number of attempts moved."""
+    pipeline = [
+        {"$sort": {"submitted_at": 1, "_id": 1}},
+        {"$group": {"_id": {"student_id": "$student_id", "quiz_id": "$quiz_id"}, "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}}
+    ]
+    moved = 0
+    async for group in attempts_collection.aggregate(pipeline, allowDiskUse=True):
+        duplicate_ids = group["ids"][1:]
+        duplicates = await attempts_collection.find({"_id": {"$in": duplicate_ids}}).to_list(length=None)
+        try:
+            await attempt_duplicates_collection.insert_many(duplicates, ordered=False)
+        except BulkWriteError as e:
+            # Already archived by an earlier, interrupted run
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+        await attempts_collection.delete_many({"_id": {"$in": duplicate_ids}})
+        moved += len(duplicate_ids)
+    return moved
 
-sync_db.teachers.create_index("email", unique=True)
-sync_db.students.create_index("email", unique=True)
-sync_db.quizzes.create_index("teacher_id")
-sync_db.quizzes.create_index("access_code")
-sync_db.attempts.create_index([("student_id", 1), ("quiz_id", 1)])
+
+async def check_unique_attempts_index(create=True):
+    """Startup check: make sure one attempt per (student, quiz) is enforced, without touching data.
+
+    Creates the unique index on a fresh database (unless create is False);
+    anything else (a non-unique index from before, or existing duplicates) is
+    left to migrate.py. The result is recorded for unique_attempts_enforced()."""
+    global _unique_attempts_confirmed
+    existing = (await attempts_collection.index_information()).get(ATTEMPTS_INDEX_NAME)
+    if existing and existing.get("unique"):
+        _unique_attempts_confirmed = True
+        return True
+    if existing is None and create:
+        try:
+            await attempts_collection.create_index(
+                [("student_id", 1), ("quiz_id", 1)], unique=True, name=ATTEMPTS_INDEX_NAME
+            )
+            _unique_attempts_confirmed = True
+            return True
+        except OperationFailure as e:
+            print(f"Could not create the unique attempts index: {e}")
+    print("Quiz attempts are not unique per student and quiz yet; run `python migrate.py`")
+    _unique_attempts_confirmed = False
+    return False
+
+
+async def migrate_unique_attempts_index(max_rounds=5):
+    """Archive duplicate attempts and replace the attempts index with a unique one (migrate.py only).
+
+    Duplicates can still arrive while the old index is in place, so the
+    archive is repeated whenever the unique build trips over one."""
+    existing = (await attempts_collection.index_information()).get(ATTEMPTS_INDEX_NAME)
+    if existing and existing.get("unique"):
+        return
+    for _ in range(max_rounds):
+        moved = await archive_duplicate_attempts()
+        if moved:
+            print(f"Archived {moved} duplicate quiz attempts")
+        if existing:
+            try:
+                await attempts_collection.drop_index(ATTEMPTS_INDEX_NAME)
+            except OperationFailure as e:
+                # IndexNotFound: already dropped by an earlier, interrupted run
+                if e.code != 27:
+                    raise
+            existing = None
+        try:
+            await attempts_collection.create_index(
+                [("student_id", 1), ("quiz_id", 1)], unique=True, name=ATTEMPTS_INDEX_NAME
+            )
+            return
+        except DuplicateKeyError:
+            continue
+    raise RuntimeError("Could not build the unique attempts index: duplicates keep arriving")
+
+
+async def backfill_users(batch_size=500):
+    """Copy credentials of teachers and students created before the users collection existed.
+    Returns the number of credentials written."""
+    written = 0
+    for role, collection in (("teacher", teachers_collection), ("student", students_collection)):
+        operations = []
+        async for user in collection.find({}, {"email": 1, "password": 1, "name": 1}):
+            operations.append(UpdateOne(
+                {"email": user["email"], "role": role},
+                {"$set": {"user_id": user["_id"], "password": user["password"], "name": user.get("name")}},
+                upsert=True
+            ))
+            if len(operations) >= batch_size:
+                await users_collection.bulk_write(operations, ordered=False)
+                written += len(operations)
+                operations = []
+        if operations:
+            await users_collection.bulk_write(operations, ordered=False)
+            written += len(operations)
+    return written
 
 
 def generate_access_code(length=8):
@@ -42,20 +185,34 @@ def generate_access_code(length=8):
     alphabet = string.ascii_uppercase + string.digits
     return ''.join(secrets.choice(alphabet) for _ in range(length))
 
-def hash_password(password):
-    """Hash a password using bcrypt"""
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password.encode(), salt)
+# Login credentials (users collection)
+class User:
+    @staticmethod
+    async def save(role, user):
+        await users_collection.update_one(
+            {"email": user["email"], "role": role},
+            {"$set": {"user_id": user["_id"], "password": user["password"], "name": user["name"]}},
+            upsert=True
+        )
 
-def verify_password(plain_password, hashed_password):
-    """Verify a password against its hash"""
-    return bcrypt.checkpw(plain_password.encode(), hashed_password)
+    @staticmethod
+    async def get_by_email(email):
+        """Credentials of every account registered with this email, teachers first"""
+        cursor = users_collection.find({"email": email}).sort("role", -1)
+        return await cursor.to_list(length=2)
+
+    @staticmethod
+    async def replace_password_hash(credential_id, old_hash, new_hash):
+        await users_collection.update_one(
+            {"_id": credential_id, "password": old_hash},
+            {"$set": {"password": new_hash}}
+        )
 
 # Teacher model
 class Teacher:
     @staticmethod
     async def create(email, password, name):
-        hashed_password = hash_password(password)
+        hashed_password = await hash_password(password)
         teacher = {
             "email": email,
             "password": hashed_password,
@@ -64,6 +221,7 @@ class Teacher:
         }
         result = await teachers_collection.insert_one(teacher)
         teacher["_id"] = result.inserted_id
+        await User.save("teacher", teacher)
         return teacher
 
     @staticmethod
@@ -74,11 +232,19 @@ class Teacher:
     async def get_by_id(teacher_id):
         return await teachers_collection.find_one({"_id": ObjectId(teacher_id)})
 
+    @staticmethod
+    async def replace_password_hash(teacher_id, old_hash, new_hash):
+        """Swap in a rehashed password unless the password changed in the meantime"""
+        await teachers_collection.update_one(
+            {"_id": ObjectId(teacher_id), "password": old_hash},
+            {"$set": {"password": new_hash}}
+        )
+
 # Student model
 class Student:
     @staticmethod
     async def create(email, password, name):
-        hashed_password = hash_password(password)
+        hashed_password = await hash_password(password)
         student = {
             "email": email,
             "password": hashed_password,
@@ -87,6 +253,7 @@ class Student:
         }
         result = await students_collection.insert_one(student)
         student["_id"] = result.inserted_id
+        await User.save("student", student)
         return student
 
     @staticmethod
@@ -97,6 +264,24 @@ class Student:
     async def get_by_id(student_id):
         return await students_collection.find_one({"_id": ObjectId(student_id)})
 
+    @staticmethod
+    async def replace_password_hash(student_id, old_hash, new_hash):
+        """Swap in a rehashed password unless the password changed in the meantime"""
+        await students_collection.update_one(
+            {"_id": ObjectId(student_id), "password": old_hash},
+            {"$set": {"password": new_hash}}
+        )
+
+# Quiz listings without questions (and answers); question_count replaces them
+QUIZ_SUMMARY_PROJECTION = {
+    "title": 1,
+    "description": 1,
+    "quiz_type": 1,
+    "teacher_id": 1,
+    "created_at": 1,
+    "question_count": {"$size": "$questions"}
+}
+
 # Quiz model
 class Quiz:
     @staticmethod
@@ -107,6 +292,8 @@ class Quiz:
             "title": title,
             "description": description,
             "questions": [{
+                # Stable id matching the position-based ids students submit
+                "id": str(index),
                 "text": q["text"],
                 "type": q["type"],
                 "difficulty": q["difficulty"],
@@ -114,7 +301,7 @@ class Quiz:
                 "correct_answer": q.get("correct_answer"),  # For MCQ and True/False
                 "correct_answers": q.get("correct_answers", []),  # For multi-answer
                 "created_at": datetime.utcnow()
-            } for q in questions],
+            } for index, q in enumerate(questions)],
             "quiz_type": quiz_type,
             "access_code": access_code,
             "created_at": datetime.utcnow()
@@ -132,26 +319,33 @@ class Quiz:
         return await quizzes_collection.find_one({"access_code": access_code})
 
     @staticmethod
-    async def get_all():
-        cursor = quizzes_collection.find()
-        return await cursor.to_list(length=None)
-
-    @staticmethod
-    async def get_by_teacher(teacher_id):
-        cursor = quizzes_collection.find({"teacher_id": ObjectId(teacher_id)})
-        return await cursor.to_list(length=None)
+    def find_page(query, projection=None, after=None, descending=False, limit=None):
+        """Cursor over quizzes in _id (creation) order, starting after the _id `after`.
+        With limit, yields up to limit + 1 quizzes so callers can tell whether another page exists."""
+        if after is not None:
+            query = {**query, "_id": {"$lt" if descending else "$gt": after}}
+        cursor = quizzes_collection.find(query, projection).sort("_id", -1 if descending else 1)
+        if limit is not None:
+            cursor = cursor.limit(limit + 1)
+        return cursor
 
 # Quiz Attempt model
 class QuizAttempt:
     @staticmethod
-    async def create(student_id, quiz_id, answers, score):
-        attempt = {
+    def new(student_id, quiz_id, answers, score):
+        """Attempt document with its _id assigned up front, for batched inserts (attempt_writer)"""
+        return {
+            "_id": ObjectId(),
             "student_id": ObjectId(student_id),
             "quiz_id": ObjectId(quiz_id),
             "answers": answers,
             "score": score,
             "submitted_at": datetime.utcnow()
         }
+
+    @staticmethod
+    async def create(student_id, quiz_id, answers, score):
+        attempt = QuizAttempt.new(student_id, quiz_id, answers, score)
         result = await attempts_collection.insert_one(attempt)
         attempt["_id"] = result.inserted_id
         return attempt
@@ -169,9 +363,32 @@ class QuizAttempt:
         return await cursor.to_list(length=None)
 
     @staticmethod
-    async def get_by_quiz(quiz_id):
-        cursor = attempts_collection.find({"quiz_id": ObjectId(quiz_id)})
-        return await cursor.to_list(length=None)
+    async def get_by_quiz_with_students(quiz_id, sort="submitted_at", descending=False, after=None, limit=None):
+        """A quiz's attempts with student_name joined in one aggregation, keyset-paginated.
+
+        after is the [sort value, _id] of the previous page's last attempt. Returns
+        up to limit + 1 attempts so callers can tell whether another page exists."""
+        match = {"quiz_id": ObjectId(quiz_id)}
+        if after is not None:
+            match.update(keyset_filter(sort, descending, after))
+        direction = -1 if descending else 1
+        pipeline = [
+            {"$match": match},
+            {"$sort": {sort: direction, "_id": direction}}
+        ]
+        if limit is not None:
+            pipeline.append({"$limit": limit + 1})
+        pipeline += [
+            {"$lookup": {
+                "from": students_collection.name,
+                "localField": "student_id",
+                "foreignField": "_id",
+                "as": "student"
+            }},
+            {"$addFields": {"student_name": {"$ifNull": [{"$arrayElemAt": ["$student.name", 0]}, "Unknown Student"]}}},
+            {"$project": {"student": 0}}
+        ]
+        return await attempts_collection.aggregate(pipeline).to_list(length=None)
 
 # Import datetime at the end to avoid circular imports
 from datetime import datetime 
\ No newline at end of file
@@ -0,0 +1,173 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+from dotenv import load_dotenv
+from caching import LRUCache
+
+load_dotenv()
+
+# In-process tier: number of documents; persistent tier: directory and total size bound
+EXTRACTION_CACHE_SIZE = int(os.getenv("EXTRACTION_CACHE_SIZE", "64"))
+EXTRACTION_CACHE_DIR = os.getenv(
+    "EXTRACTION_CACHE_DIR", os.path.join(tempfile.gettempdir(), "quizgen-extraction-cache")
+)
+EXTRACTION_CACHE_MAX_BYTES = int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+
+def sha256_hex(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class ExtractionStore:
+    """Content-addressed store of extracted text, keyed by the SHA-256 of the source bytes.
+
+    Text is kept per page, so a later request for a different page range only
+    extracts the pages that were never seen. Entries live in an in-process LRU
+    and in one JSON file per document under EXTRACTION_CACHE_DIR; the least
+    recently used files are deleted once the directory exceeds
+    EXTRACTION_CACHE_MAX_BYTES.
+
+    An entry is {"page_count": int, "pages": {page_number: text}, "metadata": dict}.
+    """
+
+    def __init__(self, directory=EXTRACTION_CACHE_DIR, max_bytes=EXTRACTION_CACHE_MAX_BYTES,
+                 maxsize=EXTRACTION_CACHE_SIZE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory = LRUCache(maxsize=maxsize)
+        self.disk_bytes = None
+        self.lookups = 0
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self.pages_served = 0
+        self.pages_extracted = 0
+        self.source_bytes_saved = 0
+        self.evictions = 0
+
+    def _path(self, digest):
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def _read(self, digest):
+        path = self._path(digest)
+        try:
+            with open(path, "r", encoding="utf-8") as cached:
+                entry = json.load(cached)
+            # Touch so eviction sees it as recently used
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        entry["pages"] = {int(number): text for number, text in entry["pages"].items()}
+        return entry
+
+    def _write(self, digest, entry):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(digest)
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as cached:
+            json.dump(entry, cached)
+        os.replace(tmp_path, path)
+
+        if self.disk_bytes is None:
+            self.disk_bytes = self._scan_size()
+        else:
+            self.disk_bytes += os.path.getsize(path) - old_size
+        if self.disk_bytes > self.max_bytes:
+            self._evict(keep=path)
+
+    def _scan_size(self):
+        total = 0
+        for name in os.listdir(self.directory):
+            try:
+                total += os.path.getsize(os.path.join(self.directory, name))
+            except OSError:
+                pass
+        return total
+
+    def _evict(self, keep):
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        for _, size, path in files:
+            if self.disk_bytes <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            self.disk_bytes -= size
+            self.evictions += 1
+
+    async def get(self, digest):
+        """Return the cached entry for digest, or None"""
+        entry = self.memory.get(digest)
+        if entry is None:
+            entry = await asyncio.to_thread(self._read, digest)
+            if entry is not None:
+                self.memory.set(digest, entry)
+        return entry
+
+    async def put(self, digest, page_count, pages, metadata=None):
+        """Merge newly extracted pages into the entry for digest and persist it"""
+        entry = self.memory.get(digest) or await asyncio.to_thread(self._read, digest) or {
+            "page_count": page_count, "pages": {}, "metadata": {}
+        }
+        entry["page_count"] = page_count
+        entry["pages"].update(pages)
+        if metadata:
+            entry.setdefault("metadata", {}).update(metadata)
+        self.memory.set(digest, entry)
+        self.pages_extracted += len(pages)
+        # Serialize a snapshot: the live entry can change while the thread writes
+        snapshot = {
+            "page_count": entry["page_count"],
+            "pages": dict(entry["pages"]),
+            "metadata": dict(entry.get("metadata") or {})
+        }
+        try:
+            await asyncio.to_thread(self._write, digest, snapshot)
+        except OSError as e:
+            print(f"Extraction cache write failed: {e}")
+        return entry
+
+    def record_lookup(self, requested_pages, cached_pages, source_bytes):
+        """Account for one request needing requested_pages, of which cached_pages were already stored"""
+        self.lookups += 1
+        self.pages_served += cached_pages
+        if requested_pages and cached_pages >= requested_pages:
+            self.hits += 1
+            self.source_bytes_saved += source_bytes
+        elif cached_pages:
+            self.partial_hits += 1
+        else:
+            self.misses += 1
+
+    def stats(self):
+        return {
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "partial_hits": self.partial_hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+            "pages_served_from_cache": self.pages_served,
+            "pages_extracted": self.pages_extracted,
+            # Uploads that did not need parsing at all
+            "source_bytes_saved": self.source_bytes_saved,
+            "memory_entries": len(self.memory),
+            "disk_bytes": self.disk_bytes,
+            "evictions": self.evictions
+        }
+
+
+extraction_cache = ExtractionStore()
@@ -0,0 +1,190 @@
+import hashlib
+import os
+import re
+import time
+import unicodedata
+from datetime import datetime
+from dotenv import load_dotenv
+from caching import LRUCache
+from database import generation_cache_collection
+from quiz_generator import QuizGenerator, PROMPT_VERSION
+
+load_dotenv()
+
+# Number of entries kept in the in-process tier (the MongoDB tier expires by TTL)
+GENERATION_CACHE_SIZE = int(os.getenv("GENERATION_CACHE_SIZE", "256"))
+
+
+def normalize_text(text):
+    """Normalize source text so trivially different copies share a cache key"""
+    text = unicodedata.normalize("NFC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def make_cache_key(text, quiz_type, difficulty, model_name, prompt_version, num_questions=10, chunked=None):
+    """Content-addressed key for one generation request"""
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    parts = [digest, quiz_type, difficulty, model_name, str(prompt_version), str(num_questions), str(chunked)]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+class GenerationCache:
+    """Two-tier cache of generated questions: an in-process LRU backed by MongoDB"""
+
+    def __init__(self, maxsize=GENERATION_CACHE_SIZE):
+        self.memory = LRUCache(maxsize=maxsize)
+        self.memory_hits = 0
+        self.mongo_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.stores = 0
+        self.generation_seconds = 0.0
+
+    async def get(self, key):
+        questions = self.memory.get(key)
+        if questions is not None:
+            self.memory_hits += 1
+            return questions
+
+        try:
+            doc = await generation_cache_collection.find_one({"_id": key})
+        except Exception as e:
+            print(f"Generation cache lookup failed: {e}")
+            doc = None
+
+        if doc and doc.get("questions"):
+            self.mongo_hits += 1
+            self.memory.set(key, doc["questions"])
+            return doc["questions"]
+
+        self.misses += 1
+        return None
+
+    async def set(self, key, questions, metadata=None, generation_seconds=0.0):
+        # Never cache an empty result, the next request should retry generation
+        if not questions:
+            return
+        self.stores += 1
+        self.generation_seconds += generation_seconds
+        self.memory.set(key, questions)
+
+        doc = {
+            "questions": questions,
+            "created_at": datetime.utcnow(),
+            **(metadata or {})
+        }
+        try:
+            await generation_cache_collection.replace_one({"_id": key}, doc, upsert=True)
+        except Exception as e:
+            print(f"Generation cache store failed: {e}")
+
+    def record_bypass(self):
+        self.bypassed += 1
+
+    def stats(self):
+        hits = self.memory_hits + self.mongo_hits
+        lookups = hits + self.misses
+        avg_generation_seconds = self.generation_seconds / self.stores if self.stores else 0.0
+        return {
+            "memory_hits": self.memory_hits,
+            "mongo_hits": self.mongo_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "stores": self.stores,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_size": len(self.memory),
+            "avg_generation_seconds": round(avg_generation_seconds, 3),
+            # Every hit is one generate_quiz run (one or two LLM calls) we did not pay for
+            "llm_runs_saved": hits,
+            "estimated_seconds_saved": round(hits * avg_generation_seconds, 3)
+        }
+
+
+generation_cache = GenerationCache()
+
+
+def cache_metadata(generator, quiz_type, difficulty, num_questions):
+    """Descriptive fields stored next to a cached result"""
+    return {
+        "quiz_type": quiz_type,
+        "difficulty": difficulty,
+        "num_questions": num_questions,
+        "model": generator.model_name,
+        "prompt_version": PROMPT_VERSION
+    }
+
+
+async def generate_with_cache(text, quiz_type='mcq', difficulty='medium', num_questions=10,
+                              chunked=None, fresh=False):
+    """Cache-aside quiz generation. Returns (questions, cached)."""
+    generator = QuizGenerator(text)
+    cache_key = make_cache_key(
+        text, quiz_type, difficulty, generator.model_name, PROMPT_VERSION, num_questions, chunked
+    )
+
+    if fresh:
+        generation_cache.record_bypass()
+    else:
+        cached_questions = await generation_cache.get(cache_key)
+        if cached_questions:
+            print(f"Generation cache hit: {len(cached_questions)} questions")
+            return cached_questions, True
+
+    started = time.perf_counter()
+    questions = await generator.generate_quiz(quiz_type, difficulty, num_questions, chunked)
+    await generation_cache.set(
+        cache_key,
+        questions,
+        metadata=cache_metadata(generator, quiz_type, difficulty, num_questions),
+        generation_seconds=time.perf_counter() - started
+    )
+    return questions, False
+
+
+async def generate_variants_with_cache(text, variants, num_questions=10, fresh=False):
+    """Cache-aside batch generation of several (quiz_type, difficulty) variants over one text.
+
+    Cached variants are served from the cache; the rest are generated together.
+    Returns a list of {"quiz_type", "difficulty", "questions", "cached"}."""
+    generator = QuizGenerator(text)
+    variants = list(dict.fromkeys(variants))
+    keys = {
+        variant: make_cache_key(text, variant[0], variant[1], generator.model_name, PROMPT_VERSION, num_questions)
+        for variant in variants
+    }
+
+    results = {}
+    if fresh:
+        for _ in variants:
+            generation_cache.record_bypass()
+    else:
+        for variant in variants:
+            cached_questions = await generation_cache.get(keys[variant])
+            if cached_questions:
+                results[variant] = (cached_questions, True)
+
+    missing = [variant for variant in variants if variant not in results]
+    if missing:
+        started = time.perf_counter()
+        generated = await generator.generate_variants(missing, num_questions)
+        # Attribute the shared wall-clock time evenly across the variants it produced
+        seconds = (time.perf_counter() - started) / len(missing)
+        for variant in missing:
+            questions = generated.get(variant, [])
+            await generation_cache.set(
+                keys[variant],
+                questions,
+                metadata=cache_metadata(generator, variant[0], variant[1], num_questions),
+                generation_seconds=seconds
+            )
+            results[variant] = (questions, False)
+
+    return [
+        {
+            "quiz_type": quiz_type,
+            "difficulty": difficulty,
+            "questions": results[(quiz_type, difficulty)][0],
+            "cached": results[(quiz_type, difficulty)][1]
+        }
+        for quiz_type, difficulty in variants
+    ]
@@ -0,0 +1,86 @@
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Optional
+
+
+@dataclass(frozen=True)
+class KeyEntry:
+    """Everything grading needs from one question, computed once per quiz"""
+    question_type: str
+    correct_answer: object
+    correct_answers: List[str]
+    correct_set: Optional[FrozenSet[str]] = None
+
+
+@dataclass
+class AnswerKey:
+    entries: List[KeyEntry]
+    # Submitted question_id -> question index; accepts a question's "id" or its position
+    index_by_id: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def total_questions(self):
+        return len(self.entries)
+
+    def lookup(self, question_id):
+        index = self.index_by_id.get(question_id)
+        return None if index is None else self.entries[index]
+
+
+def compile_answer_key(quiz):
+    """Compile a quiz's questions into an AnswerKey (cache it with the quiz; see quiz_cache)"""
+    entries = []
+    index_by_id = {}
+    for index, question in enumerate(quiz["questions"]):
+        question_type = question.get("type", "mcq")
+        correct_answers = question.get("correct_answers", [])
+        entries.append(KeyEntry(
+            question_type=question_type,
+            correct_answer=question.get("correct_answer", ""),
+            correct_answers=correct_answers,
+            correct_set=frozenset(correct_answers) if question_type == "multi_answer" else None
+        ))
+        # The first question matching either its id or its position wins
+        index_by_id.setdefault(str(question.get("id", "")), index)
+        index_by_id.setdefault(str(index), index)
+    return AnswerKey(entries=entries, index_by_id=index_by_id)
+
+
+def is_correct(entry, student_answer):
+    if entry.question_type == "mcq" or entry.question_type == "true_false":
+        # For MCQ and True/False, exact match is required
+        return student_answer == entry.correct_answer
+    if entry.question_type == "multi_answer":
+        # All correct answers selected and no incorrect ones
+        student_answers = student_answer.split(",") if isinstance(student_answer, str) else student_answer
+        return (
+            len(student_answers) == len(entry.correct_answers) and
+            frozenset(student_answers) == entry.correct_set
+        )
+    return False
+
+
+def grade(answer_key, answers):
+    """Grade (question_id, answer) pairs in one pass.
+
+    Returns (correct count, score percentage, answer details); answers to
+    unknown questions are skipped."""
+    correct = 0
+    answer_details = []
+    for question_id, student_answer in answers:
+        entry = answer_key.lookup(question_id)
+        if entry is None:
+            continue
+        answer_correct = is_correct(entry, student_answer)
+        if answer_correct:
+            correct += 1
+        # Stored with the attempt for feedback
+        answer_details.append({
+            "question_id": question_id,
+            "student_answer": student_answer,
+            "correct_answer": entry.correct_answer,
+            "correct_answers": entry.correct_answers,
+            "is_correct": answer_correct
+        })
+    total = answer_key.total_questions
+    score = (correct / total) * 100 if total > 0 else 0
+    return correct, score, answer_details
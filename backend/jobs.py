@@ -0,0 +1,259 @@
+import asyncio
+import os
+import socket
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import ReturnDocument
+from database import generation_jobs_collection
+
+load_dotenv()
+
+# Concurrent jobs per process, and how many of them one teacher may occupy
+GENERATION_WORKERS = int(os.getenv("GENERATION_WORKERS", "4"))
+MAX_RUNNING_JOBS_PER_TEACHER = int(os.getenv("MAX_RUNNING_JOBS_PER_TEACHER", "2"))
+# A running job whose lease is not renewed in time is handed to another worker
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+MAX_JOB_ATTEMPTS = int(os.getenv("MAX_JOB_ATTEMPTS", "3"))
+# How often to requeue expired leases and pick up jobs queued by other processes
+JOB_SWEEP_INTERVAL_SECONDS = float(os.getenv("JOB_SWEEP_INTERVAL_SECONDS", "10"))
+
+TERMINAL_STATUSES = ("done", "failed")
+
+
+class JobQueue:
+    """Durable generation job queue backed by MongoDB with per-teacher round-robin scheduling.
+
+    Job documents are the source of truth. Each process keeps one FIFO per
+    teacher and serves teachers in turn, so a teacher who submits 50 jobs
+    only ever holds MAX_RUNNING_JOBS_PER_TEACHER workers. A job is claimed
+    atomically (queued -> running) with a lease the worker keeps renewing;
+    jobs whose lease lapses, e.g. after a crash, are queued again.
+    """
+
+    def __init__(self, workers=GENERATION_WORKERS):
+        self.workers = workers
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.handlers = {}
+        self.queues = OrderedDict()
+        self.queued_ids = set()
+        self.running = {}
+        self.wakeup = asyncio.Event()
+        self.watchers = {}
+        self.tasks = []
+
+    def register(self, kind, handler):
+        """Register an async handler(params) -> result dict for a job kind"""
+        self.handlers[kind] = handler
+
+    async def submit(self, teacher_id, kind, params):
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job = {
+            "teacher_id": ObjectId(teacher_id),
+            "kind": kind,
+            "params": params,
+            "status": "queued",
+            "attempts": 0,
+            "created_at": datetime.utcnow()
+        }
+        result = await generation_jobs_collection.insert_one(job)
+        job["_id"] = result.inserted_id
+        self._enqueue(job["_id"], str(job["teacher_id"]))
+        return job
+
+    async def get(self, job_id):
+        return await generation_jobs_collection.find_one({"_id": ObjectId(job_id)})
+
+    async def watch(self, job_id, poll_interval=2.0):
+        """Yield the job document every time it changes, until it finishes"""
+        event = asyncio.Event()
+        self.watchers.setdefault(job_id, set()).add(event)
+        last_seen = None
+        try:
+            while True:
+                job = await self.get(job_id)
+                if job is None:
+                    return
+                marker = (job["status"], job.get("attempts"))
+                if marker != last_seen:
+                    last_seen = marker
+                    yield job
+                if job["status"] in TERMINAL_STATUSES:
+                    return
+                # Woken early by this process; jobs run by another process are seen by polling
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                event.clear()
+        finally:
+            watchers = self.watchers.get(job_id)
+            if watchers is not None:
+                watchers.discard(event)
+                if not watchers:
+                    del self.watchers[job_id]
+
+    def _notify(self, job_id):
+        for event in self.watchers.get(str(job_id), ()):
+            event.set()
+
+    def _enqueue(self, job_id, teacher_id):
+        if job_id in self.queued_ids:
+            return
+        self.queued_ids.add(job_id)
+        self.queues.setdefault(teacher_id, deque()).append(job_id)
+        self.wakeup.set()
+
+    def _next_job(self):
+        """Pop the next job, rotating across teachers and skipping those at their running limit"""
+        for teacher_id in list(self.queues):
+            if self.running.get(teacher_id, 0) >= MAX_RUNNING_JOBS_PER_TEACHER:
+                continue
+            queue = self.queues.pop(teacher_id)
+            job_id = queue.popleft()
+            if queue:
+                # Back of the line until every other teacher has had a turn
+                self.queues[teacher_id] = queue
+            self.queued_ids.discard(job_id)
+            return job_id, teacher_id
+        return None
+
+    async def _claim(self, job_id):
+        now = datetime.utcnow()
+        return await generation_jobs_collection.find_one_and_update(
+            {"_id": job_id, "status": "queued"},
+            {
+                "$set": {
+                    "status": "running",
+                    "worker_id": self.worker_id,
+                    "started_at": now,
+                    "lease_expires_at": now + timedelta(seconds=JOB_LEASE_SECONDS)
+                },
+                "$inc": {"attempts": 1}
+            },
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _renew_lease(self, job_id):
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            await generation_jobs_collection.update_one(
+                {"_id": job_id, "status": "running", "worker_id": self.worker_id},
+                {"$set": {"lease_expires_at": datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)}}
+            )
+
+    async def _finish(self, job_id, update):
+        update["finished_at"] = datetime.utcnow()
+        await generation_jobs_collection.update_one(
+            {"_id": job_id, "worker_id": self.worker_id},
+            {"$set": update, "$unset": {"lease_expires_at": ""}}
+        )
+
+    async def _run(self, job):
+        job_id = job["_id"]
+        self._notify(job_id)
+        lease = asyncio.ensure_future(self._renew_lease(job_id))
+        try:
+            handler = self.handlers[job["kind"]]
+            result = await handler(job["params"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Generation job {job_id} failed: {e}")
+            if job["attempts"] < MAX_JOB_ATTEMPTS:
+                await generation_jobs_collection.update_one(
+                    {"_id": job_id, "worker_id": self.worker_id},
+                    {"$set": {"status": "queued", "error": str(e)}, "$unset": {"lease_expires_at": ""}}
+                )
+                self._enqueue(job_id, str(job["teacher_id"]))
+            else:
+                await self._finish(job_id, {"status": "failed", "error": str(e)})
+        else:
+            await self._finish(job_id, {"status": "done", "result": result})
+        finally:
+            lease.cancel()
+            self._notify(job_id)
+
+    async def _worker(self):
+        while True:
+            picked = self._next_job()
+            if picked is None:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            job_id, teacher_id = picked
+            job = await self._claim(job_id)
+            if job is None:
+                # Claimed by another process, or no longer queued
+                continue
+
+            self.running[teacher_id] = self.running.get(teacher_id, 0) + 1
+            try:
+                await self._run(job)
+            finally:
+                self.running[teacher_id] -= 1
+                if not self.running[teacher_id]:
+                    del self.running[teacher_id]
+                # A teacher below the limit again may have jobs waiting
+                self.wakeup.set()
+
+    async def sweep(self):
+        """Requeue jobs with an expired lease and load queued jobs this process does not know about"""
+        now = datetime.utcnow()
+        await generation_jobs_collection.update_many(
+            {"status": "running", "lease_expires_at": {"$lt": now}, "attempts": {"$gte": MAX_JOB_ATTEMPTS}},
+            {"$set": {"status": "failed", "error": "Job exceeded its retry limit", "finished_at": now},
+             "$unset": {"lease_expires_at": ""}}
+        )
+        await generation_jobs_collection.update_many(
+            {"status": "running", "lease_expires_at": {"$lt": now}},
+            {"$set": {"status": "queued"}, "$unset": {"lease_expires_at": ""}}
+        )
+        cursor = generation_jobs_collection.find(
+            {"status": "queued"}, {"teacher_id": 1}
+        ).sort("created_at", 1)
+        async for job in cursor:
+            self._enqueue(job["_id"], str(job["teacher_id"]))
+
+    async def _sweeper(self):
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                print(f"Generation job sweep failed: {e}")
+            await asyncio.sleep(JOB_SWEEP_INTERVAL_SECONDS)
+
+    async def start(self):
+        # Recover this process's jobs from a previous run right away instead of waiting for the lease
+        await generation_jobs_collection.update_many(
+            {"status": "running", "worker_id": self.worker_id},
+            {"$set": {"status": "queued"}, "$unset": {"lease_expires_at": ""}}
+        )
+        self.wakeup = asyncio.Event()
+        self.tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        self.tasks.append(asyncio.ensure_future(self._sweeper()))
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        # Hand unfinished work back to the queue so the next worker starts it immediately
+        await generation_jobs_collection.update_many(
+            {"status": "running", "worker_id": self.worker_id},
+            {"$set": {"status": "queued"}, "$unset": {"lease_expires_at": ""}}
+        )
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "queued": len(self.queued_ids),
+            "teachers_waiting": len(self.queues),
+            "running": sum(self.running.values())
+        }
+
+
+job_queue = JobQueue()
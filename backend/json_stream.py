@@ -0,0 +1,85 @@
+import json
+
+
+class JSONArrayStreamParser:
+    """Incrementally pull complete objects out of a JSON array as its text arrives.
+
+    Text before the array (prose, markdown fences) is ignored: the array
+    starts at the first '[' whose next non-whitespace character is '{', so a
+    bracket in prose such as "[1]" is not mistaken for it. Only top-level
+    objects of the array are returned, and a malformed object is counted and
+    skipped instead of failing the whole array.
+    """
+
+    def __init__(self):
+        self.in_array = False
+        # Saw a '[' and waiting for its next non-whitespace character
+        self.bracket = False
+        self.done = False
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.current = []
+        self.parsed = 0
+        self.malformed = 0
+
+    def feed(self, chunk):
+        """Consume the next piece of text and return the objects it completed"""
+        objects = []
+        for ch in chunk:
+            if self.done:
+                break
+            if not self.in_array:
+                if ch == '[':
+                    self.bracket = True
+                    continue
+                if self.bracket and ch.isspace():
+                    continue
+                if not (self.bracket and ch == '{'):
+                    self.bracket = False
+                    continue
+                self.in_array = True
+            if self.depth == 0:
+                if ch == '{':
+                    self.depth = 1
+                    self.current = [ch]
+                elif ch == ']':
+                    self.done = True
+                continue
+
+            self.current.append(ch)
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                continue
+
+            if ch == '"':
+                self.in_string = True
+            elif ch in '{[':
+                self.depth += 1
+            elif ch in '}]':
+                self.depth -= 1
+                if self.depth == 0:
+                    obj = self._decode(''.join(self.current))
+                    self.current = []
+                    if obj is not None:
+                        objects.append(obj)
+        return objects
+
+    @property
+    def incomplete(self):
+        """True if the text ended inside the array, e.g. output was truncated"""
+        return self.in_array and not self.done
+
+    def _decode(self, text):
+        try:
+            obj = json.loads(text)
+        except json.JSONDecodeError:
+            self.malformed += 1
+            return None
+        self.parsed += 1
+        return obj
@@ -1,39 +1,92 @@
-from fastapi import FastAPI, File, UploadFile, Depends, HTTPException, status
+from fastapi import FastAPI, File, UploadFile, Depends, HTTPException, Query, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.security import OAuth2PasswordRequestForm
-from pydantic import BaseModel, EmailStr, HttpUrl
-from quiz_generator import QuizGenerator
-import PyPDF2
-import io
+from pydantic import BaseModel, EmailStr, Field, HttpUrl
+import quiz_generator
+from quiz_generator import QuizGenerator, PROMPT_VERSION, router, validation_stats
 import os
+import json
+import time
 from dotenv import load_dotenv
 from datetime import timedelta
-from typing import List, Optional, Dict, Any
+from typing import List, Literal, Optional, Dict, Any
 from bson import ObjectId
-import requests
-from bs4 import BeautifulSoup
-from newspaper import Article
-import nltk
-
-# Download required NLTK data
-nltk.download('punkt', quiet=True)
+from pymongo.errors import DuplicateKeyError
+import asyncio
 
 # Import our modules
-from database import Teacher, Student, Quiz, QuizAttempt, generate_access_code
+from database import (
+    Teacher, Student, Quiz, QuizAttempt, generate_access_code, ensure_indexes, QUIZ_SUMMARY_PROJECTION,
+    check_unique_attempts_index, unique_attempts_enforced
+)
+from generation_cache import (
+    generation_cache,
+    generate_with_cache,
+    generate_variants_with_cache,
+    make_cache_key,
+    cache_metadata
+)
+from jobs import job_queue
+from quiz_cache import quiz_cache
+from pagination import encode_cursor, decode_cursor, InvalidCursorError
+from responses import BSONJSONResponse, stream_json_array
+import grading
+from attempt_writer import attempt_writer
+from extraction_cache import extraction_cache
+import web_scraper
+import pdf_extraction
+import passwords
 from auth import (
     create_access_token, 
     get_current_teacher, 
     get_current_student, 
-    authenticate_teacher, 
-    authenticate_student,
+    get_teacher_claims,
+    get_student_claims,
+    authenticate,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI()
+# Create missing indexes on startup (non-destructive); data migrations only run from migrate.py
+RUN_MIGRATIONS_ON_STARTUP = os.getenv("RUN_MIGRATIONS_ON_STARTUP", "true").lower() == "true"
+# Import the Gemini SDK and scraping libraries in the background after startup instead of on first request
+PRELOAD_HEAVY_MODULES = os.getenv("PRELOAD_HEAVY_MODULES", "false").lower() == "true"
+# Room for the multipart boundaries and form fields around the PDF itself
+PDF_MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# orjson with native ObjectId/datetime handling for every response
+app = FastAPI(default_response_class=BSONJSONResponse)
+
+class PDFUploadLimitMiddleware:
+    """Reject /upload-pdf requests whose Content-Length is over MAX_PDF_UPLOAD_BYTES.
+
+    Starlette parses (and spools) the whole multipart body before upload_pdf
+    runs, so spool_upload's limit only applies afterwards; this checks the
+    declared size up front (chunked uploads without one are still buffered
+    first). Plain ASGI so every other request passes straight through."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == "/upload-pdf":
+            declared = dict(scope["headers"]).get(b"content-length", b"0")
+            limit = pdf_extraction.MAX_PDF_UPLOAD_BYTES
+            if declared.isdigit() and int(declared) > limit + PDF_MULTIPART_OVERHEAD_BYTES:
+                response = JSONResponse(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    content={"detail": f"PDF exceeds {limit} bytes"}
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+# Added before CORS so it runs inside it and the 413 still carries CORS headers
+app.add_middleware(PDFUploadLimitMiddleware)
 
 # CORS Configuration
 app.add_middleware(
@@ -42,8 +95,75 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+async def run_quiz_job(params):
+    questions, cached = await generate_with_cache(
+        params["text"], params["quiz_type"], params["difficulty"],
+        params["num_questions"], params.get("chunked"), params.get("fresh", False)
+    )
+    if not questions:
+        raise RuntimeError("No questions could be generated from the provided text")
+    return {"questions": questions, "cached": cached}
+
+async def run_batch_job(params):
+    variants = await generate_variants_with_cache(
+        params["text"],
+        [(variant["quiz_type"], variant["difficulty"]) for variant in params["variants"]],
+        params["num_questions"],
+        params.get("fresh", False)
+    )
+    if not any(variant["questions"] for variant in variants):
+        raise RuntimeError("No questions could be generated from the provided text")
+    return {"variants": variants}
+
+job_queue.register("quiz", run_quiz_job)
+job_queue.register("batch", run_batch_job)
+
+@app.on_event("startup")
+async def run_migrations():
+    if RUN_MIGRATIONS_ON_STARTUP:
+        await ensure_indexes()
+    else:
+        # Still find out whether submit_quiz can rely on the unique attempts index
+        await check_unique_attempts_index(create=False)
+
+@app.on_event("startup")
+async def preload_heavy_modules():
+    if PRELOAD_HEAVY_MODULES:
+        loop = asyncio.get_running_loop()
+        loop.run_in_executor(None, quiz_generator.preload_modules)
+        loop.run_in_executor(None, web_scraper.preload_modules)
+
+@app.on_event("startup")
+async def start_job_queue():
+    await job_queue.start()
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    await job_queue.stop()
+
+@app.on_event("shutdown")
+async def stop_pdf_workers():
+    pdf_extraction.shutdown_pool()
+
+@app.on_event("shutdown")
+async def close_http_client():
+    await web_scraper.close_client()
+
+@app.on_event("shutdown")
+async def flush_attempts():
+    await attempt_writer.flush()
+
+@app.on_event("shutdown")
+async def stop_password_workers():
+    passwords.shutdown_pool()
+
+@app.exception_handler(passwords.PasswordQueueFullError)
+async def password_queue_full(request, exc):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -53,11 +173,45 @@ async def root():
 async def ping():
     return
 
+@app.get("/metrics")
+async def metrics():
+    return {
+        "generation_cache": generation_cache.stats(),
+        "validation": validation_stats(),
+        "router": router.stats(),
+        "jobs": job_queue.stats(),
+        "extraction_cache": extraction_cache.stats(),
+        "scrape_response_cache": web_scraper.response_cache.stats(),
+        "passwords": passwords.stats(),
+        "quiz_cache": quiz_cache.stats(),
+        "attempt_writer": attempt_writer.stats()
+    }
+
 # Pydantic models for request validation
+# Types and difficulties the prompts in quiz_generator support
+QuizType = Literal['mcq', 'true_false', 'multi_answer']
+Difficulty = Literal['easy', 'medium', 'hard']
+
 class QuizRequest(BaseModel):
     text: str
-    quiz_type: str = 'mcq'
-    difficulty: str = 'medium'
+    quiz_type: QuizType = 'mcq'
+    difficulty: Difficulty = 'medium'
+    num_questions: int = Field(10, ge=1, le=100)
+    # Split long texts into sections and quiz them map-reduce style (None = decide by length)
+    chunked: Optional[bool] = None
+    # Skip the generation cache and always call the model
+    fresh: bool = False
+
+class QuizVariant(BaseModel):
+    quiz_type: QuizType = 'mcq'
+    difficulty: Difficulty = 'medium'
+
+class BatchQuizRequest(BaseModel):
+    text: str
+    # e.g. every combination of mcq/true_false/multi_answer and easy/medium/hard
+    variants: List[QuizVariant] = Field(..., min_length=1, max_length=9)
+    num_questions: int = Field(10, ge=1, le=100)
+    fresh: bool = False
 
 class TeacherCreate(BaseModel):
     email: EmailStr
@@ -86,30 +240,35 @@ class QuizSubmission(BaseModel):
     quiz_id: str
     answers: List[QuizAnswer]
 
+class ReadingListRequest(BaseModel):
+    urls: List[HttpUrl] = Field(..., min_length=1, max_length=20)
+    # Size budget for the combined text handed to the quiz generator
+    max_chars: int = Field(100_000, ge=1_000, le=1_000_000)
+
 class WebsiteRequest(BaseModel):
     url: HttpUrl
+    # Also compute keywords and a summary (slow); /scrape-website/metadata does it on demand
+    include_nlp: bool = False
 
 # Authentication endpoints
 @app.post("/token")
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    # Check if user is a teacher or student
-    teacher = await authenticate_teacher(form_data.username, form_data.password)
-    if teacher:
+    # One users lookup covers both teachers and students
+    credential = await authenticate(form_data.username, form_data.password)
+    if credential:
+        user_type = credential["role"]
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        # name/email claims let read-only endpoints skip the user lookup (TRUST_TOKEN_CLAIMS)
         access_token = create_access_token(
-            data={"sub": str(teacher["_id"]), "type": "teacher"},
+            data={
+                "sub": str(credential["user_id"]),
+                "type": user_type,
+                "email": credential["email"],
+                "name": credential.get("name")
+            },
             expires_delta=access_token_expires
         )
-        return {"access_token": access_token, "token_type": "bearer", "user_type": "teacher"}
-    
-    student = await authenticate_student(form_data.username, form_data.password)
-    if student:
-        access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = create_access_token(
-            data={"sub": str(student["_id"]), "type": "student"},
-            expires_delta=access_token_expires
-        )
-        return {"access_token": access_token, "token_type": "bearer", "user_type": "student"}
+        return {"access_token": access_token, "token_type": "bearer", "user_type": user_type}
     
     raise HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -133,7 +292,7 @@ async def register_teacher(teacher: TeacherCreate):
     return {"message": "Teacher registered successfully", "teacher_id": str(new_teacher["_id"])}
 
 @app.get("/teachers/me")
-async def get_teacher_profile(current_teacher: dict = Depends(get_current_teacher)):
+async def get_teacher_profile(current_teacher: dict = Depends(get_teacher_claims)):
     return {
         "id": str(current_teacher["_id"]),
         "email": current_teacher["email"],
@@ -156,7 +315,7 @@ async def register_student(student: StudentCreate):
     return {"message": "Student registered successfully", "student_id": str(new_student["_id"])}
 
 @app.get("/students/me")
-async def get_student_profile(current_student: dict = Depends(get_current_student)):
+async def get_student_profile(current_student: dict = Depends(get_student_claims)):
     return {
         "id": str(current_student["_id"]),
         "email": current_student["email"],
@@ -180,8 +339,12 @@ async def generate_quiz(request: QuizRequest):
     cleaned_text = request.text.strip()
     
     try:
-        generator = QuizGenerator(cleaned_text)
-        questions = generator.generate_quiz(request.quiz_type, request.difficulty)
+        questions, cached = await generate_with_cache(
+            cleaned_text, request.quiz_type, request.difficulty,
+            request.num_questions, request.chunked, request.fresh
+        )
+        if cached:
+            return {"questions": questions, "cached": True}
         
         print(f"Generated questions: {len(questions)}")
         
@@ -194,6 +357,179 @@ async def generate_quiz(request: QuizRequest):
         print(f"Error in generate_quiz endpoint: {e}")
         return {"questions": [], "error": str(e)}
 
+def format_sse(event: str, data) -> str:
+    """Encode one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/generate-quiz/stream")
+async def generate_quiz_stream(request: QuizRequest):
+    """Same as /generate-quiz, but each question is sent as an SSE event as soon as it is ready"""
+    cleaned_text = request.text.strip()
+    generator = QuizGenerator(cleaned_text)
+    cache_key = make_cache_key(
+        cleaned_text, request.quiz_type, request.difficulty,
+        generator.model_name, PROMPT_VERSION, request.num_questions, request.chunked
+    )
+
+    async def events():
+        if not cleaned_text:
+            yield format_sse("error", {"error": "Text cannot be empty"})
+            return
+
+        if request.fresh:
+            generation_cache.record_bypass()
+        else:
+            cached_questions = await generation_cache.get(cache_key)
+            if cached_questions:
+                for question in cached_questions:
+                    yield format_sse("question", question)
+                yield format_sse("done", {"count": len(cached_questions), "cached": True})
+                return
+
+        started = time.perf_counter()
+        questions = []
+        try:
+            chunked = request.chunked
+            if chunked is None:
+                chunked = generator.needs_chunking(request.num_questions)
+            if chunked:
+                # Map-reduce needs every section before it can pick, so questions arrive together
+                questions = await generator.generate_quiz(
+                    request.quiz_type, request.difficulty, request.num_questions, True
+                )
+                for question in questions:
+                    yield format_sse("question", question)
+            else:
+                async for question in generator.stream_quiz(
+                    request.quiz_type, request.difficulty, request.num_questions
+                ):
+                    questions.append(question)
+                    yield format_sse("question", question)
+        except Exception as e:
+            print(f"Error in generate_quiz_stream endpoint: {e}")
+            yield format_sse("error", {"error": str(e)})
+            return
+
+        if not questions:
+            yield format_sse("error", {"error": "No questions could be generated from the provided text"})
+            return
+
+        await generation_cache.set(
+            cache_key,
+            questions,
+            metadata=cache_metadata(generator, request.quiz_type, request.difficulty, request.num_questions),
+            generation_seconds=time.perf_counter() - started
+        )
+        yield format_sse("done", {"count": len(questions), "cached": False})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def serialize_job(job):
+    response = {
+        "job_id": str(job["_id"]),
+        "kind": job["kind"],
+        "status": job["status"],
+        "attempts": job.get("attempts", 0),
+        "created_at": job["created_at"].isoformat(),
+        "started_at": job["started_at"].isoformat() if job.get("started_at") else None,
+        "finished_at": job["finished_at"].isoformat() if job.get("finished_at") else None
+    }
+    if job["status"] == "done":
+        response["result"] = job["result"]
+    if job.get("error"):
+        response["error"] = job["error"]
+    return response
+
+async def get_owned_job(job_id: str, current_teacher: dict):
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    job = await job_queue.get(job_id)
+    if not job or str(job["teacher_id"]) != str(current_teacher["_id"]):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+@app.post("/generate-quiz/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def create_generation_job(request: QuizRequest, current_teacher: dict = Depends(get_current_teacher)):
+    """Queue a generation and return a job id right away; poll or subscribe for the result"""
+    cleaned_text = request.text.strip()
+    if not cleaned_text:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Text cannot be empty")
+
+    job = await job_queue.submit(str(current_teacher["_id"]), "quiz", {
+        "text": cleaned_text,
+        "quiz_type": request.quiz_type,
+        "difficulty": request.difficulty,
+        "num_questions": request.num_questions,
+        "chunked": request.chunked,
+        "fresh": request.fresh
+    })
+    return serialize_job(job)
+
+@app.get("/generate-quiz/jobs/{job_id}")
+async def get_generation_job(job_id: str, current_teacher: dict = Depends(get_teacher_claims)):
+    job = await get_owned_job(job_id, current_teacher)
+    return serialize_job(job)
+
+@app.get("/generate-quiz/jobs/{job_id}/events")
+async def watch_generation_job(job_id: str, current_teacher: dict = Depends(get_teacher_claims)):
+    """SSE stream of the job's status changes, ending once it is done or failed"""
+    await get_owned_job(job_id, current_teacher)
+
+    async def events():
+        async for job in job_queue.watch(job_id):
+            yield format_sse("status", serialize_job(job))
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/generate-quiz/batch")
+async def generate_quiz_batch(request: BatchQuizRequest):
+    """Generate several (quiz_type, difficulty) variants of one text in a single response"""
+    cleaned_text = request.text.strip()
+    if not cleaned_text:
+        return {"variants": [], "error": "Text cannot be empty"}
+
+    try:
+        variants = await generate_variants_with_cache(
+            cleaned_text,
+            [(variant.quiz_type, variant.difficulty) for variant in request.variants],
+            request.num_questions,
+            request.fresh
+        )
+    except Exception as e:
+        print(f"Error in generate_quiz_batch endpoint: {e}")
+        return {"variants": [], "error": str(e)}
+
+    if not any(variant["questions"] for variant in variants):
+        return {"variants": variants, "error": "No questions could be generated from the provided text"}
+    return {"variants": variants}
+
+@app.post("/generate-quiz/batch/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def create_batch_generation_job(request: BatchQuizRequest, current_teacher: dict = Depends(get_current_teacher)):
+    """Queue a batch generation; the finished job's result holds every variant"""
+    cleaned_text = request.text.strip()
+    if not cleaned_text:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Text cannot be empty")
+
+    job = await job_queue.submit(str(current_teacher["_id"]), "batch", {
+        "text": cleaned_text,
+        "variants": [variant.model_dump() for variant in request.variants],
+        "num_questions": request.num_questions,
+        "fresh": request.fresh
+    })
+    return serialize_job(job)
+
+def quiz_response(quiz):
+    """Encode a quiz as is (ObjectIds as strings); the quiz itself may be shared through quiz_cache"""
+    return BSONJSONResponse(quiz)
+
 @app.post("/quizzes")
 async def create_quiz(quiz: QuizCreate, current_teacher: dict = Depends(get_current_teacher)):
     new_quiz = await Quiz.create(
@@ -209,27 +545,61 @@ async def create_quiz(quiz: QuizCreate, current_teacher: dict = Depends(get_curr
         "access_code": new_quiz["access_code"]
     }
 
+async def list_quizzes(query, view, order, limit, cursor, projections):
+    """Quiz listing shared by students and teachers.
+
+    view=summary (the default) returns the listing fields plus question_count,
+    view=full the quiz with its questions; projections maps each view to what
+    the caller may see. Without limit the response is streamed straight from
+    the cursor; with limit it is one page and the next page's cursor is in the
+    X-Next-Cursor header."""
+    try:
+        after = decode_cursor(cursor, 1)[0] if cursor else None
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    quizzes = Quiz.find_page(query, projections[view], after=after, descending=order == "desc", limit=limit)
+    if limit is None:
+        return StreamingResponse(stream_json_array(quizzes), media_type="application/json")
+    
+    page = await quizzes.to_list(length=limit + 1)
+    headers = {}
+    if len(page) > limit:
+        page = page[:limit]
+        headers["X-Next-Cursor"] = encode_cursor([page[-1]["_id"]])
+    return BSONJSONResponse(page, headers=headers)
+
 @app.get("/quizzes")
-async def get_all_quizzes(current_student: dict = Depends(get_current_student)):
-    quizzes = await Quiz.get_all()
-    # Convert ObjectId to string for JSON serialization
-    for quiz in quizzes:
-        quiz["_id"] = str(quiz["_id"])
-        quiz["teacher_id"] = str(quiz["teacher_id"])
-    return quizzes
+async def get_all_quizzes(
+    view: str = Query("summary", pattern="^(full|summary)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    limit: Optional[int] = Query(None, ge=1, le=200),
+    cursor: Optional[str] = None,
+    current_student: dict = Depends(get_student_claims)
+):
+    # Students never see answers or other teachers' access codes, even in full view
+    return await list_quizzes({}, view, order, limit, cursor, {
+        "summary": QUIZ_SUMMARY_PROJECTION,
+        "full": {"access_code": 0, "questions.correct_answer": 0, "questions.correct_answers": 0}
+    })
 
 @app.get("/quizzes/teacher")
-async def get_teacher_quizzes(current_teacher: dict = Depends(get_current_teacher)):
-    quizzes = await Quiz.get_by_teacher(str(current_teacher["_id"]))
-    # Convert ObjectId to string for JSON serialization
-    for quiz in quizzes:
-        quiz["_id"] = str(quiz["_id"])
-        quiz["teacher_id"] = str(quiz["teacher_id"])
-    return quizzes
+async def get_teacher_quizzes(
+    view: str = Query("summary", pattern="^(full|summary)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    limit: Optional[int] = Query(None, ge=1, le=200),
+    cursor: Optional[str] = None,
+    current_teacher: dict = Depends(get_teacher_claims)
+):
+    # Teachers also need the access code they hand out
+    return await list_quizzes(
+        {"teacher_id": ObjectId(current_teacher["_id"])}, view, order, limit, cursor,
+        {"summary": {**QUIZ_SUMMARY_PROJECTION, "access_code": 1}, "full": None}
+    )
 
 @app.post("/quizzes/access")
 async def access_quiz_by_code(access_request: QuizAccessRequest, current_student: dict = Depends(get_current_student)):
-    quiz = await Quiz.get_by_access_code(access_request.access_code)
+    quiz = await quiz_cache.get_by_access_code(access_request.access_code)
     if not quiz:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -249,107 +619,63 @@ async def access_quiz_by_code(access_request: QuizAccessRequest, current_student
             "score": existing_attempt["score"]
         }
     
-    # Convert ObjectId to string for JSON serialization
-    quiz["_id"] = str(quiz["_id"])
-    quiz["teacher_id"] = str(quiz["teacher_id"])
-    return quiz
+    return quiz_response(quiz)
 
 @app.get("/quizzes/{quiz_id}")
-async def get_quiz_by_id(quiz_id: str, current_student: dict = Depends(get_current_student)):
-    quiz = await Quiz.get_by_id(quiz_id)
+async def get_quiz_by_id(quiz_id: str, current_student: dict = Depends(get_student_claims)):
+    quiz = await quiz_cache.get_by_id(quiz_id)
     if not quiz:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Quiz not found"
         )
     
-    # Convert ObjectId to string for JSON serialization
-    quiz["_id"] = str(quiz["_id"])
-    quiz["teacher_id"] = str(quiz["teacher_id"])
-    return quiz
+    return quiz_response(quiz)
 
 @app.post("/quizzes/submit")
 async def submit_quiz(submission: QuizSubmission, current_student: dict = Depends(get_current_student)):
-    quiz = await Quiz.get_by_id(submission.quiz_id)
+    quiz = await quiz_cache.get_by_id(submission.quiz_id)
     if not quiz:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Quiz not found"
         )
     
-    # Check if student has already attempted this quiz
-    existing_attempt = await QuizAttempt.get_by_student_and_quiz(
-        str(current_student["_id"]), 
-        submission.quiz_id
+    # Until migrate.py has made the attempts index unique, fall back to looking for an earlier attempt
+    if not unique_attempts_enforced():
+        existing_attempt = await QuizAttempt.get_by_student_and_quiz(
+            str(current_student["_id"]),
+            submission.quiz_id
+        )
+        if existing_attempt:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="You have already submitted this quiz"
+            )
+
+    # Grade against the quiz's compiled answer key (cached with the quiz)
+    answer_key = quiz_cache.answer_key(quiz)
+    total_questions = answer_key.total_questions
+    correct_answers, score, answer_details = grading.grade(
+        answer_key,
+        ((answer.question_id, answer.answer) for answer in submission.answers)
     )
     
-    if existing_attempt:
+    # Save attempt with answer details; batched with concurrent submissions, returns once written.
+    # The unique (student_id, quiz_id) index rejects a second submission, even a concurrent one.
+    try:
+        attempt = await attempt_writer.insert(QuizAttempt.new(
+            student_id=str(current_student["_id"]),
+            quiz_id=submission.quiz_id,
+            answers=answer_details,
+            score=score
+        ))
+    except DuplicateKeyError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="You have already submitted this quiz"
         )
     
-    # Calculate score
-    correct_answers = 0
-    total_questions = len(quiz["questions"])
-    answer_details = []
-    
-    for answer in submission.answers:
-        question_id = answer.question_id
-        student_answer = answer.answer
-        
-        # Find the corresponding question
-        question = None
-        for q in quiz["questions"]:
-            if str(q.get("id", "")) == question_id or str(quiz["questions"].index(q)) == question_id:
-                question = q
-                break
-        
-        if not question:
-            continue
-        
-        # Check if the answer is correct based on question type
-        is_correct = False
-        question_type = question.get("type", "mcq")
-        
-        if question_type == "mcq" or question_type == "true_false":
-            # For MCQ and True/False, exact match is required
-            correct_answer = question.get("correct_answer", "")
-            is_correct = student_answer == correct_answer
-        elif question_type == "multi_answer":
-            # For multi-answer, check if all correct answers are selected
-            correct_answers_list = question.get("correct_answers", [])
-            student_answers = student_answer.split(",") if isinstance(student_answer, str) else student_answer
-            
-            # Check if all correct answers are selected and no incorrect ones
-            is_correct = (
-                len(student_answers) == len(correct_answers_list) and
-                all(ans in correct_answers_list for ans in student_answers)
-            )
-        
-        if is_correct:
-            correct_answers += 1
-        
-        # Store answer details for feedback
-        answer_details.append({
-            "question_id": question_id,
-            "student_answer": student_answer,
-            "correct_answer": question.get("correct_answer", ""),
-            "correct_answers": question.get("correct_answers", []),
-            "is_correct": is_correct
-        })
-    
-    # Calculate score as percentage
-    score = (correct_answers / total_questions) * 100 if total_questions > 0 else 0
-    
-    # Save attempt with answer details
-    attempt = await QuizAttempt.create(
-        student_id=str(current_student["_id"]),
-        quiz_id=submission.quiz_id,
-        answers=answer_details,
-        score=score
-    )
-    
     return {
         "message": "Quiz submitted successfully",
         "score": score,
@@ -359,24 +685,51 @@ async def submit_quiz(submission: QuizSubmission, current_student: dict = Depend
     }
 
 @app.get("/attempts")
-async def get_student_attempts(current_student: dict = Depends(get_current_student)):
+async def get_student_attempts(current_student: dict = Depends(get_student_claims)):
     attempts = await QuizAttempt.get_by_student(str(current_student["_id"]))
-    # Convert ObjectId to string for JSON serialization
-    for attempt in attempts:
-        attempt["_id"] = str(attempt["_id"])
-        attempt["student_id"] = str(attempt["student_id"])
-        attempt["quiz_id"] = str(attempt["quiz_id"])
-    return attempts
+    return BSONJSONResponse(attempts)
 
 @app.post("/upload-pdf")
-async def upload_pdf(file: UploadFile = File(...)):
+async def upload_pdf(
+    file: UploadFile = File(...),
+    start_page: int = Query(1, ge=1),
+    end_page: Optional[int] = Query(None, ge=1),
+    stream: bool = False
+):
+    """Extract text from a PDF, optionally only a 1-based inclusive page range.
+
+    With stream=true the pages are sent as SSE 'page' events as soon as they
+    are extracted (not necessarily in order), followed by a 'done' event."""
     try:
-        pdf_content = await file.read()
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_content))
-        
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text()
+        path, digest, size = await pdf_extraction.spool_upload(file)
+    except pdf_extraction.PDFTooLargeError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+
+    if stream:
+        async def events():
+            pages = 0
+            text_length = 0
+            try:
+                async for batch in pdf_extraction.iter_pages_cached(path, digest, size, start_page, end_page):
+                    for page_number, page_text in batch:
+                        pages += 1
+                        text_length += len(page_text)
+                        yield format_sse("page", {"page": page_number, "text": page_text})
+                yield format_sse("done", {"pages": pages, "text_length": text_length})
+            except Exception as e:
+                print(f"Error in upload_pdf stream: {e}")
+                yield format_sse("error", {"error": str(e)})
+
+        # A background task runs even if the client disconnects before the stream starts
+        return StreamingResponse(
+            events(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            background=BackgroundTask(os.unlink, path)
+        )
+
+    try:
+        text = await pdf_extraction.extract_text(path, digest, size, start_page, end_page)
         
         print(f"Extracted text length: {len(text)}")
         
@@ -388,11 +741,22 @@ async def upload_pdf(file: UploadFile = File(...)):
     except Exception as e:
         print(f"Error in upload_pdf endpoint: {e}")
         return {"text": "", "error": str(e)}
+    finally:
+        os.unlink(path)
 
 @app.get("/quizzes/{quiz_id}/attempts")
-async def get_quiz_attempts(quiz_id: str, current_teacher: dict = Depends(get_current_teacher)):
+async def get_quiz_attempts(
+    quiz_id: str,
+    sort: str = Query("submitted_at", pattern="^(submitted_at|score)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    current_teacher: dict = Depends(get_teacher_claims)
+):
+    """Attempts for a quiz with student names. With limit, pages are chained through
+    the X-Next-Cursor response header (absent on the last page)."""
     # First verify that the quiz belongs to this teacher
-    quiz = await Quiz.get_by_id(quiz_id)
+    quiz = await quiz_cache.get_by_id(quiz_id)
     if not quiz:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -405,103 +769,74 @@ async def get_quiz_attempts(quiz_id: str, current_teacher: dict = Depends(get_cu
             detail="Not authorized to view attempts for this quiz"
         )
     
-    # Get all attempts for this quiz
-    attempts = await QuizAttempt.get_by_quiz(quiz_id)
+    try:
+        # (sort value, _id) of the previous page's last attempt
+        after = decode_cursor(cursor, 2) if cursor else None
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
-    # For each attempt, get the student name
-    for attempt in attempts:
-        student = await Student.get_by_id(str(attempt["student_id"]))
-        attempt["student_name"] = student["name"] if student else "Unknown Student"
-        # Convert ObjectId to string for JSON serialization
-        attempt["_id"] = str(attempt["_id"])
-        attempt["student_id"] = str(attempt["student_id"])
-        attempt["quiz_id"] = str(attempt["quiz_id"])
+    # Attempts and student names in one aggregation
+    attempts = await QuizAttempt.get_by_quiz_with_students(
+        quiz_id, sort=sort, descending=order == "desc", after=after, limit=limit
+    )
+    headers = {}
+    if limit is not None and len(attempts) > limit:
+        attempts = attempts[:limit]
+        headers["X-Next-Cursor"] = encode_cursor([attempts[-1].get(sort), attempts[-1]["_id"]])
     
-    return attempts
+    return BSONJSONResponse(attempts, headers=headers)
 
 @app.post("/scrape-website")
 async def scrape_website(request: WebsiteRequest):
     try:
-        # Initialize article
-        article = Article(str(request.url))
+        text, metadata = await web_scraper.scrape(str(request.url), request.include_nlp)
         
-        try:
-            # Download and parse article
-            article.download()
-            article.parse()
-            
-            # Natural Language Processing
-            article.nlp()
-            
-            # Get the cleaned text
-            text = article.text
-            
-            # If article text is empty, try basic BeautifulSoup scraping as fallback
-            if not text.strip():
-                response = requests.get(str(request.url))
-                response.raise_for_status()
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                # Remove script and style elements
-                for script in soup(["script", "style"]):
-                    script.decompose()
-                
-                # Get text content
-                text = soup.get_text()
-                
-                # Clean up the text
-                lines = (line.strip() for line in text.splitlines())
-                chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-                text = ' '.join(chunk for chunk in chunks if chunk)
-            
-            print(f"Extracted text length: {len(text)}")
-            
-            if not text.strip():
-                return {"text": "", "error": "No text could be extracted from the website"}
-            
-            # Add article metadata if available
-            metadata = {
-                "title": article.title,
-                "authors": article.authors,
-                "publish_date": article.publish_date.isoformat() if article.publish_date else None,
-                "keywords": article.keywords,
-                "summary": article.summary
-            }
-            
-            return {
-                "text": text,
-                "metadata": metadata
-            }
-            
-        except Exception as e:
-            print(f"Article extraction failed: {e}")
-            # If article extraction fails, try basic BeautifulSoup scraping
-            response = requests.get(str(request.url))
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Remove script and style elements
-            for script in soup(["script", "style"]):
-                script.decompose()
-            
-            # Get text content
-            text = soup.get_text()
-            
-            # Clean up the text
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            text = ' '.join(chunk for chunk in chunks if chunk)
-            
-            print(f"Extracted text length (fallback): {len(text)}")
-            
-            if not text.strip():
-                return {"text": "", "error": "No text could be extracted from the website"}
-            
+        if not text.strip():
+            return {"text": "", "error": "No text could be extracted from the website"}
+        
+        if metadata is None:
             return {"text": text}
+        return {
+            "text": text,
+            "metadata": metadata
+        }
             
-    except requests.RequestException as e:
+    except web_scraper.FetchError as e:
         print(f"Error scraping website: {e}")
         return {"text": "", "error": f"Failed to access website: {str(e)}"}
     except Exception as e:
         print(f"Error in scrape_website endpoint: {e}")
-        return {"text": "", "error": str(e)}
\ No newline at end of file
+        return {"text": "", "error": str(e)}
+
+@app.post("/scrape-websites")
+async def scrape_websites(request: ReadingListRequest):
+    """Scrape a reading list concurrently into one combined, deduplicated text"""
+    urls = list(dict.fromkeys(str(url) for url in request.urls))
+    started = time.perf_counter()
+    text, sources = await web_scraper.scrape_many(urls, request.max_chars)
+    print(f"Scraped {len(urls)} URLs in {time.perf_counter() - started:.2f}s, combined text length: {len(text)}")
+
+    response = {
+        "text": text,
+        "sources": sources,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+    if not text.strip():
+        response["error"] = "No text could be extracted from any of the websites"
+    return response
+
+@app.post("/scrape-website/metadata")
+async def scrape_website_metadata(request: WebsiteRequest):
+    """Keywords and summary for a page, computed lazily from the recently scraped article"""
+    try:
+        metadata = await web_scraper.article_metadata(str(request.url))
+    except web_scraper.FetchError as e:
+        print(f"Error scraping website metadata: {e}")
+        return {"error": f"Failed to access website: {str(e)}"}
+    except Exception as e:
+        print(f"Error in scrape_website_metadata endpoint: {e}")
+        return {"error": str(e)}
+
+    if metadata is None:
+        return {"error": "No article metadata could be extracted from the website"}
+    return metadata
@@ -0,0 +1,17 @@
+"""Apply database migrations (indexes incl. attempt dedupe, users backfill). Run once per deploy: python migrate.py"""
+import asyncio
+
+from database import ensure_indexes, backfill_users, migrate_unique_attempts_index
+
+
+async def main():
+    # Before ensure_indexes, which only checks the attempts index
+    await migrate_unique_attempts_index()
+    await ensure_indexes()
+    print("Indexes are up to date")
+    written = await backfill_users()
+    print(f"Backfilled {written} login credentials into users")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
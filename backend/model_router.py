@@ -0,0 +1,276 @@
+import asyncio
+import bisect
+import contextvars
+import os
+import time
+from collections import Counter, deque
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Hedging: start the next model once the current one runs past this latency quantile
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", "0.95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MIN_DELAY_SECONDS = float(os.getenv("HEDGE_MIN_DELAY_SECONDS", "2"))
+# Used until a model has HEDGE_MIN_SAMPLES latencies recorded
+HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("HEDGE_DEFAULT_DELAY_SECONDS", "20"))
+
+# Circuit breaker: skip a model after this many consecutive failures, for this long
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_COOLDOWN_SECONDS = float(os.getenv("CIRCUIT_COOLDOWN_SECONDS", "30"))
+
+LATENCY_BUCKETS = [0.5, 1, 2, 5, 10, 20, 30, 45, 60, 90, 120]
+
+# When the current model call got its concurrency slot; per task, so concurrent calls don't mix
+_call_started = contextvars.ContextVar("model_call_started", default=None)
+
+
+def reset_call_timer():
+    _call_started.set(None)
+
+
+def mark_call_started():
+    """Called by the model client once it holds a concurrency slot, so queueing isn't model latency"""
+    if _call_started.get() is None:
+        _call_started.set(time.perf_counter())
+
+
+def call_elapsed():
+    """Seconds since the current call got its slot, or None if it never did"""
+    started = _call_started.get()
+    return None if started is None else time.perf_counter() - started
+
+
+class LatencyHistogram:
+    """Bucketed latency counts plus a window of recent samples for quantiles"""
+
+    def __init__(self, window=200):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.recent = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, seconds):
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.recent.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q):
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def stats(self):
+        labels = [f"le_{bound}" for bound in LATENCY_BUCKETS] + ["le_inf"]
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": dict(zip(labels, self.buckets))
+        }
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets one trial call through after the cooldown"""
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, cooldown=CIRCUIT_COOLDOWN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.times_opened = 0
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow_request(self):
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self.trial_in_flight)
+
+    def begin(self):
+        # In half-open state the call being started is the single trial
+        if self.state == "half_open":
+            self.trial_in_flight = True
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.trial_in_flight or self.consecutive_failures >= self.failure_threshold:
+            if self.opened_at is None or self.trial_in_flight:
+                self.times_opened += 1
+            self.opened_at = time.monotonic()
+        self.trial_in_flight = False
+
+    def release(self):
+        # A cancelled trial says nothing about the model's health
+        self.trial_in_flight = False
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened
+        }
+
+
+class ModelRouter:
+    """Routes a call across models in preference order with hedging and per-model circuit breakers.
+
+    The first model is called alone. If it has not answered within its
+    HEDGE_QUANTILE latency, the next model is started as well and the first
+    acceptable result wins; the slower call is cancelled. A failure or an
+    unacceptable result starts the next model immediately.
+    """
+
+    def __init__(self, models):
+        self.models = list(models)
+        self.latency = {name: LatencyHistogram() for name in self.models}
+        self.breakers = {name: CircuitBreaker() for name in self.models}
+        self.outcomes = {name: Counter() for name in self.models}
+        self.decisions = Counter()
+
+    def hedge_delay(self, model_name):
+        histogram = self.latency[model_name]
+        if len(histogram.recent) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY_SECONDS
+        return max(HEDGE_MIN_DELAY_SECONDS, histogram.quantile(HEDGE_QUANTILE))
+
+    def candidates(self):
+        """Models to try, in preference order, skipping those with an open circuit"""
+        names = [name for name in self.models if self.breakers[name].allow_request()]
+        skipped = len(self.models) - len(names)
+        if skipped:
+            self.decisions["skipped_open_circuit"] += skipped
+        if not names:
+            # Every circuit is open: trying anyway beats failing every request
+            self.decisions["all_circuits_open"] += 1
+            names = list(self.models)
+        return names
+
+    def begin(self, model_name):
+        """Mark the start of a call that is made outside route() (e.g. streaming)"""
+        self.breakers[model_name].begin()
+
+    def record(self, model_name, outcome, seconds=None):
+        """Record one call outcome: 'success', 'invalid', 'timeout', 'error' or 'cancelled'.
+
+        Only errors and timeouts count against the circuit breaker: an invalid
+        result means the model answered, and usually comes from the input."""
+        self.outcomes[model_name][outcome] += 1
+        breaker = self.breakers[model_name]
+        # A call cancelled after hedging ran at least this long; keeping it stops p95 drifting down
+        if seconds is not None and outcome in ("success", "invalid", "cancelled"):
+            self.latency[model_name].record(seconds)
+        if outcome in ("success", "invalid"):
+            breaker.record_success()
+        elif outcome == "cancelled":
+            breaker.release()
+        else:
+            breaker.record_failure()
+
+    async def _attempt(self, model_name, call, accept):
+        # Latency runs from mark_call_started() (slot acquired) when the call reports it
+        reset_call_timer()
+        started = time.perf_counter()
+
+        def elapsed():
+            seconds = call_elapsed()
+            return time.perf_counter() - started if seconds is None else seconds
+
+        try:
+            result = await call(model_name)
+        except asyncio.CancelledError:
+            # Cancelled while still queued for a slot: no latency to learn from
+            self.record(model_name, "cancelled", call_elapsed())
+            raise
+        except asyncio.TimeoutError:
+            self.record(model_name, "timeout")
+            raise
+        except Exception:
+            self.record(model_name, "error")
+            raise
+        self.record(model_name, "success" if accept(result) else "invalid", elapsed())
+        return result
+
+    async def route(self, call, accept=bool):
+        """Run call(model_name) across the models and return (model_name, result).
+
+        Returns (None, last result or None) if no model produced an acceptable result."""
+        names = self.candidates()
+        tasks = {}
+        next_index = 0
+        hedged = False
+        last_result = None
+
+        def launch():
+            nonlocal next_index
+            name = names[next_index]
+            next_index += 1
+            self.begin(name)
+            tasks[asyncio.ensure_future(self._attempt(name, call, accept))] = name
+
+        launch()
+        try:
+            while tasks:
+                timeout = None
+                if next_index < len(names):
+                    timeout = self.hedge_delay(names[next_index - 1])
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    print(f"Model {names[next_index - 1]} is slower than {timeout:.1f}s, hedging with {names[next_index]}")
+                    self.decisions["hedged"] += 1
+                    hedged = True
+                    launch()
+                    continue
+
+                for task in done:
+                    name = tasks.pop(task)
+                    if task.exception() is not None:
+                        print(f"Model {name} failed: {task.exception()!r}")
+                        continue
+                    result = task.result()
+                    if accept(result):
+                        if hedged:
+                            self.decisions[f"hedge_won_by:{name}"] += 1
+                        self.decisions[f"served_by:{name}"] += 1
+                        return name, result
+                    last_result = result
+
+                # Nothing acceptable and nothing still running: fail over right away
+                if not tasks and next_index < len(names):
+                    self.decisions["failover"] += 1
+                    launch()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        self.decisions["exhausted"] += 1
+        return None, last_result
+
+    def stats(self):
+        return {
+            "decisions": dict(self.decisions),
+            "models": {
+                name: {
+                    "circuit": self.breakers[name].stats(),
+                    "outcomes": dict(self.outcomes[name]),
+                    "hedge_delay_seconds": round(self.hedge_delay(name), 3),
+                    "latency": self.latency[name].stats()
+                }
+                for name in self.models
+            }
+        }
@@ -0,0 +1,35 @@
+import base64
+from bson import json_util
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    """Opaque keyset cursor for the sort values of the last item on a page (ObjectIds and dates survive)"""
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, length):
+    """Sort values of a cursor made by encode_cursor; it must hold exactly length of them"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json_util.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception as e:
+        # Untrusted input: besides bad base64/JSON, json_util raises BSONError (e.g. a bad
+        # $oid), IndexError (a bad $date) and others on malformed extended JSON
+        raise InvalidCursorError("Invalid cursor") from e
+    if not isinstance(values, list) or len(values) != length:
+        raise InvalidCursorError("Invalid cursor")
+    return values
+
+
+def keyset_filter(sort_field, descending, cursor_values):
+    """Match documents after (sort value, _id) in the given order"""
+    value, last_id = cursor_values
+    op = "$lt" if descending else "$gt"
+    return {"$or": [
+        {sort_field: {op: value}},
+        {sort_field: value, "_id": {op: last_id}}
+    ]}
@@ -0,0 +1,95 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+import bcrypt
+
+load_dotenv()
+
+# bcrypt work factor for new hashes; logins with an older factor are rehashed transparently
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Threads doing bcrypt work (bcrypt releases the GIL), and how many calls may wait for one
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "256"))
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = 0
+_rejected = 0
+
+
+class PasswordQueueFullError(Exception):
+    """Too many password hashes are already queued; the caller should retry later"""
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(
+                    max_workers=PASSWORD_HASH_WORKERS,
+                    thread_name_prefix="bcrypt"
+                )
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def _run(func, *args):
+    """Run one bcrypt call in the pool, rejecting it when the queue is full"""
+    global _pending, _rejected
+    if _pending >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_LIMIT:
+        _rejected += 1
+        raise PasswordQueueFullError("Too many logins in progress, please retry shortly")
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_pool(), func, *args)
+    finally:
+        _pending -= 1
+
+
+def _hash(password):
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=BCRYPT_ROUNDS))
+
+
+def _verify(plain_password, hashed_password):
+    return bcrypt.checkpw(plain_password.encode(), hashed_password)
+
+
+async def hash_password(password):
+    """Hash a password using bcrypt"""
+    return await _run(_hash, password)
+
+
+async def verify_password(plain_password, hashed_password):
+    """Verify a password against its hash"""
+    return await _run(_verify, plain_password, hashed_password)
+
+
+def hash_rounds(hashed_password):
+    """Work factor of a bcrypt hash ($2b$<rounds>$...), or None if it can't be read"""
+    try:
+        return int(bytes(hashed_password).split(b"$")[2])
+    except (IndexError, ValueError, TypeError):
+        return None
+
+
+def needs_rehash(hashed_password):
+    return hash_rounds(hashed_password) != BCRYPT_ROUNDS
+
+
+def stats():
+    return {
+        "workers": PASSWORD_HASH_WORKERS,
+        "queue_limit": PASSWORD_HASH_QUEUE_LIMIT,
+        "pending": _pending,
+        "rejected": _rejected,
+        "rounds": BCRYPT_ROUNDS
+    }
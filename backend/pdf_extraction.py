@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+from extraction_cache import extraction_cache
+
+load_dotenv()
+
+# Uploads above this size are rejected instead of parsed
+MAX_PDF_UPLOAD_BYTES = int(os.getenv("MAX_PDF_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+# Worker processes for page extraction, and how many pages each task handles
+PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+SPOOL_CHUNK_BYTES = 1024 * 1024
+
+_pool = None
+
+
+class PDFTooLargeError(Exception):
+    pass
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # spawn, not fork: the server process runs threads (Mongo driver, executors)
+        _pool = ProcessPoolExecutor(
+            max_workers=PDF_EXTRACTION_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def spool_upload(upload, max_bytes=MAX_PDF_UPLOAD_BYTES):
+    """Copy an upload to a temporary file in fixed-size chunks.
+
+    Returns (path, sha256 hex digest, size). Raises PDFTooLargeError once
+    more than max_bytes have been read."""
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as spooled:
+            while True:
+                chunk = await upload.read(SPOOL_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise PDFTooLargeError(f"PDF is larger than {max_bytes // (1024 * 1024)} MB")
+                digest.update(chunk)
+                await asyncio.to_thread(spooled.write, chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path, digest.hexdigest(), size
+
+
+def _count_pages(path):
+    import PyPDF2
+
+    return len(PyPDF2.PdfReader(path).pages)
+
+
+def _extract_page_range(path, start, end):
+    """Runs in a worker process: extract pages [start, end) as (page_number, text), 1-based"""
+    import PyPDF2
+
+    reader = PyPDF2.PdfReader(path)
+    return [(number + 1, reader.pages[number].extract_text() or "") for number in range(start, end)]
+
+
+async def count_pages(path):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_pool(), _count_pages, path)
+
+
+def resolve_page_range(page_count, start_page=1, end_page=None):
+    """Clamp a 1-based inclusive page range to the document and return 0-based [start, end)"""
+    start = max(1, start_page or 1) - 1
+    end = page_count if end_page is None else min(page_count, end_page)
+    return start, max(start, end)
+
+
+def _page_runs(page_numbers):
+    """Group 1-based page numbers into 0-based [start, end) runs of at most PDF_PAGES_PER_TASK pages"""
+    runs = []
+    for number in sorted(page_numbers):
+        index = number - 1
+        if runs and runs[-1][1] == index and runs[-1][1] - runs[-1][0] < PDF_PAGES_PER_TASK:
+            runs[-1][1] = index + 1
+        else:
+            runs.append([index, index + 1])
+    return runs
+
+
+async def iter_page_numbers(path, page_numbers):
+    """Extract the given 1-based pages in parallel worker processes, yielding (page_number, text) batches as they finish"""
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    futures = [
+        loop.run_in_executor(pool, _extract_page_range, path, start, end)
+        for start, end in _page_runs(page_numbers)
+    ]
+    try:
+        for future in asyncio.as_completed(futures):
+            yield await future
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+async def iter_pages(path, start_page=1, end_page=None):
+    """Extract a 1-based inclusive page range, yielding (page_number, text) batches as they finish"""
+    page_count = await count_pages(path)
+    start, end = resolve_page_range(page_count, start_page, end_page)
+    async for batch in iter_page_numbers(path, range(start + 1, end + 1)):
+        yield batch
+
+
+async def iter_pages_cached(path, digest, size, start_page=1, end_page=None):
+    """Like iter_pages, but serve pages already in the extraction cache and store the new ones.
+
+    Cached pages come first, as one batch."""
+    cached = await extraction_cache.get(digest)
+    page_count = cached["page_count"] if cached else await count_pages(path)
+    start, end = resolve_page_range(page_count, start_page, end_page)
+    requested = range(start + 1, end + 1)
+
+    cached_pages = {}
+    if cached:
+        cached_pages = {number: cached["pages"][number] for number in requested if number in cached["pages"]}
+    missing = [number for number in requested if number not in cached_pages]
+    extraction_cache.record_lookup(len(requested), len(cached_pages), size)
+
+    if cached_pages:
+        yield sorted(cached_pages.items())
+    if not missing:
+        return
+
+    extracted = {}
+    async for batch in iter_page_numbers(path, missing):
+        extracted.update(batch)
+        yield batch
+    await extraction_cache.put(digest, page_count, extracted)
+
+
+async def extract_text(path, digest, size, start_page=1, end_page=None):
+    """Extract the text of a page range, in page order, through the extraction cache"""
+    pages = {}
+    async for batch in iter_pages_cached(path, digest, size, start_page, end_page):
+        pages.update(batch)
+    return "\n".join(pages[number] for number in sorted(pages))
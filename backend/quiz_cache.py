@@ -0,0 +1,105 @@
+import asyncio
+import os
+from dotenv import load_dotenv
+from caching import LRUCache
+from database import Quiz
+from grading import compile_answer_key
+
+load_dotenv()
+
+# Quizzes kept in memory (by count), and how long a cached quiz may be served without re-reading it
+QUIZ_CACHE_SIZE = int(os.getenv("QUIZ_CACHE_SIZE", "256"))
+QUIZ_CACHE_TTL_SECONDS = int(os.getenv("QUIZ_CACHE_TTL_SECONDS", "300"))
+
+
+class QuizCache:
+    """In-process quiz cache indexed by _id and access_code.
+
+    Concurrent misses for the same key share one database read (single
+    flight), so an exam start where hundreds of students enter the same code
+    costs one query. Cached quiz documents are shared between requests:
+    callers must copy before modifying them."""
+
+    def __init__(self, maxsize=QUIZ_CACHE_SIZE, ttl=QUIZ_CACHE_TTL_SECONDS):
+        self.quizzes = LRUCache(maxsize=maxsize, ttl=ttl)
+        # access_code -> quiz id, so both lookups share one copy of the document
+        self.codes = LRUCache(maxsize=maxsize, ttl=ttl)
+        # quiz id -> (quiz document, compiled AnswerKey), recompiled when the document is reloaded
+        self.answer_keys = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._inflight = {}
+        # Bumped on invalidation so reads that started earlier don't store stale quizzes
+        self._generation = 0
+        self.loads = 0
+        self.coalesced = 0
+
+    def _store(self, quiz):
+        quiz_id = str(quiz["_id"])
+        self.quizzes.set(quiz_id, quiz)
+        if quiz.get("access_code"):
+            self.codes.set(quiz["access_code"], quiz_id)
+
+    async def _single_flight(self, key, load):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(load, self._generation))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # shield: one caller disconnecting must not cancel the read the others wait on
+        return await asyncio.shield(task)
+
+    async def _load(self, load, generation):
+        self.loads += 1
+        quiz = await load()
+        if quiz is not None and generation == self._generation:
+            self._store(quiz)
+        return quiz
+
+    async def get_by_id(self, quiz_id):
+        quiz_id = str(quiz_id)
+        quiz = self.quizzes.get(quiz_id)
+        if quiz is not None:
+            return quiz
+        return await self._single_flight(("id", quiz_id), lambda: Quiz.get_by_id(quiz_id))
+
+    async def get_by_access_code(self, access_code):
+        quiz_id = self.codes.get(access_code)
+        if quiz_id is not None:
+            quiz = self.quizzes.get(quiz_id)
+            if quiz is not None:
+                return quiz
+        return await self._single_flight(("code", access_code), lambda: Quiz.get_by_access_code(access_code))
+
+    def answer_key(self, quiz):
+        """Compiled answer key for a quiz document, compiled once per loaded document"""
+        quiz_id = str(quiz["_id"])
+        entry = self.answer_keys.get(quiz_id)
+        if entry is not None and entry[0] is quiz:
+            return entry[1]
+        answer_key = compile_answer_key(quiz)
+        self.answer_keys.set(quiz_id, (quiz, answer_key))
+        return answer_key
+
+    def invalidate(self, quiz_id, access_code=None):
+        """Drop a quiz after it was updated or deleted (other worker processes expire it via the TTL)"""
+        self._generation += 1
+        self.answer_keys.pop(str(quiz_id))
+        quiz = self.quizzes.pop(str(quiz_id))
+        if access_code is None and quiz is not None:
+            access_code = quiz.get("access_code")
+        if access_code is not None:
+            self.codes.pop(access_code)
+
+    def stats(self):
+        return {
+            "quizzes": self.quizzes.stats(),
+            "access_codes": self.codes.stats(),
+            "answer_keys": self.answer_keys.stats(),
+            "loads": self.loads,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight)
+        }
+
+
+quiz_cache = QuizCache()
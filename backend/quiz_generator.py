@@ -1,67 +1,312 @@
 import os
 import json
-import google.generativeai as genai
+import asyncio
+import math
 import re
+from collections import Counter
+from json_stream import JSONArrayStreamParser
+from model_router import ModelRouter, reset_call_timer, mark_call_started, call_elapsed
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Model settings
+PRIMARY_MODEL = os.getenv("GEMINI_PRIMARY_MODEL", "gemini-1.5-pro")
+FALLBACK_MODEL = os.getenv("GEMINI_FALLBACK_MODEL", "gemini-2.0-flash")
+
+# Prompt instructions per quiz type and difficulty, with strict type handling
+TYPE_INSTRUCTIONS = {
+    "mcq": """
+    - Generate ONLY Multiple Choice Questions with ONE correct answer
+    - Each question MUST have exactly 4 options
+    - Use the "correct_answer" field to specify the exact text of the correct option
+    - Do NOT use "correct_answers" field
+    """,
+    "true_false": """
+    - Generate ONLY True/False questions
+    - Each question MUST have exactly 2 options: ["True", "False"]
+    - Use the "correct_answer" field to specify either "True" or "False"
+    - Do NOT use "correct_answers" field
+    """,
+    "multi_answer": """
+    - Generate ONLY Multiple Choice Questions with MULTIPLE correct answers
+    - Each question MUST have 4-6 options
+    - Use the "correct_answers" field as an array of the exact text of ALL correct options
+    - Do NOT use "correct_answer" field
+    """
+}
+
+DIFFICULTY_INSTRUCTIONS = {
+    "easy": """
+    - Questions should test basic understanding and recall
+    - Use simple vocabulary and straightforward concepts
+    - Focus on main ideas and explicit information from the text
+    """,
+    "medium": """
+    - Questions should test comprehension and application
+    - Include some analytical thinking
+    - Mix straightforward and more nuanced concepts
+    """,
+    "hard": """
+    - Questions should test analysis and evaluation
+    - Include complex relationships between concepts
+    - Require deeper understanding and critical thinking
+    - Challenge students with nuanced distinctions
+    """
+}
+
+# Routes every call across the primary and fallback with hedging and circuit breakers
+router = ModelRouter([PRIMARY_MODEL, FALLBACK_MODEL])
+
+# Each call asks for at most this many questions so the JSON fits in max_output_tokens
+QUESTIONS_PER_CALL = 10
+GENERATION_CONFIG = {
+    'temperature': 0.7,
+    'max_output_tokens': 2048  # Increased token limit
+}
+# Ask the model for raw JSON output (needs a google-generativeai release with response_mime_type, >= 0.5)
+if os.getenv("GEMINI_JSON_MODE", "false").lower() == "true":
+    GENERATION_CONFIG['response_mime_type'] = 'application/json'
+
+# Batch generation asks for several (type, difficulty) variants in one call, so it needs a bigger output budget
+VARIANTS_PER_CALL = int(os.getenv("VARIANTS_PER_CALL", "3"))
+BATCH_GENERATION_CONFIG = {**GENERATION_CONFIG, 'max_output_tokens': 8192}
+
+# Texts longer than this (in estimated tokens) are split into sections and quizzed map-reduce style
+CHUNK_TOKEN_BUDGET = int(os.getenv("CHUNK_TOKEN_BUDGET", "6000"))
+CHARS_PER_TOKEN = 4
+# Ask each section for extra candidates so the reduce step can drop duplicates
+CHUNK_OVERSAMPLE = 1.5
+
+# Follow-up rounds asking for just the missing questions
+MAX_TOPUP_ROUNDS = int(os.getenv("MAX_TOPUP_ROUNDS", "2"))
+MAX_REPAIR_PASSES = 3
+
+# Spellings of the question types that models produce instead of the exact ones
+TYPE_ALIASES = {
+    "mcq": "mcq",
+    "multiple_choice": "mcq",
+    "single_choice": "mcq",
+    "true_false": "true_false",
+    "true/false": "true_false",
+    "truefalse": "true_false",
+    "boolean": "true_false",
+    "multi_answer": "multi_answer",
+    "multiple_answer": "multi_answer",
+    "multiple_answers": "multi_answer",
+    "multi_select": "multi_answer",
+}
+
+# Validation outcomes by reason code, reported on /metrics
+rejection_counts = Counter()
+repair_counts = Counter()
+
+def validation_stats():
+    return {
+        "rejections": dict(rejection_counts),
+        "repairs": dict(repair_counts)
+    }
+
+# Bump whenever the prompt or validation rules change so cached quizzes are not reused
+PROMPT_VERSION = 2
+
+# Upper bound on LLM calls in flight per worker, and the deadline for each call
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_CALL_TIMEOUT_SECONDS = float(os.getenv("LLM_CALL_TIMEOUT_SECONDS", "60"))
+
+# Shared clients, built once per process instead of on every request
+_configured = False
+_models = {}
+_llm_semaphore = None
+
+def get_model(model_name):
+    """Return the shared GenerativeModel for model_name"""
+    # Imported on first use: the SDK (grpc, protobuf) is slow to import
+    import google.generativeai as genai
+
+    global _configured
+    if not _configured:
+        genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+        _configured = True
+    model = _models.get(model_name)
+    if model is None:
+        model = genai.GenerativeModel(model_name)
+        _models[model_name] = model
+    return model
+
+def estimate_tokens(text):
+    """Cheap token estimate, good enough for budgeting prompt sizes"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def split_into_chunks(text, token_budget=CHUNK_TOKEN_BUDGET):
+    """Split text into sections of roughly token_budget tokens on paragraph or sentence boundaries"""
+    max_chars = token_budget * CHARS_PER_TOKEN
+    pieces = []
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        # Oversized paragraph: fall back to sentences, then to hard cuts
+        for sentence in re.split(r'(?<=[.!?])\s+', paragraph):
+            while len(sentence) > max_chars:
+                pieces.append(sentence[:max_chars])
+                sentence = sentence[max_chars:]
+            if sentence:
+                pieces.append(sentence)
+
+    chunks = []
+    current = []
+    current_len = 0
+    for piece in pieces:
+        if current and current_len + len(piece) + 2 > max_chars:
+            chunks.append("\n\n".join(current))
+            current = []
+            current_len = 0
+        current.append(piece)
+        current_len += len(piece) + 2
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+def spread_order(count):
+    """Indices 0..count-1 ordered so that every prefix is spread across the range (midpoints first)"""
+    order = []
+    intervals = [(0, count)]
+    while intervals:
+        start, end = intervals.pop(0)
+        if start >= end:
+            continue
+        middle = (start + end) // 2
+        order.append(middle)
+        intervals += [(start, middle), (middle + 1, end)]
+    return order
+
+def evenly_spaced(count, picks):
+    """picks indices out of range(count), evenly spaced from start to end"""
+    if picks >= count:
+        return list(range(count))
+    return [int((i + 0.5) * count / picks) for i in range(picks)]
+
+def question_fingerprint(question):
+    """Normalized question text used to spot duplicates"""
+    words = re.findall(r'\w+', str(question.get("text", "")).lower())
+    return frozenset(words)
+
+def is_duplicate(fingerprint, seen, threshold=0.8):
+    """True if fingerprint overlaps any seen fingerprint by at least threshold (Jaccard)"""
+    for other in seen:
+        union = len(fingerprint | other)
+        if union and len(fingerprint & other) / union >= threshold:
+            return True
+    return False
+
+def dedupe_questions(questions, seen=None):
+    """Drop near-duplicate questions, keeping the first of each"""
+    seen = [] if seen is None else seen
+    unique = []
+    for question in questions:
+        fingerprint = question_fingerprint(question)
+        if is_duplicate(fingerprint, seen):
+            continue
+        seen.append(fingerprint)
+        unique.append(question)
+    return unique
+
+def variant_key(quiz_type, difficulty):
+    return f"{quiz_type}:{difficulty}"
+
+def _get_llm_semaphore():
+    # Created lazily so it is bound to the running event loop
+    global _llm_semaphore
+    if _llm_semaphore is None:
+        _llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _llm_semaphore
+
+async def generate_content(model_name, prompt, generation_config, timeout=None):
+    """Run one non-blocking LLM call under the concurrency limit and per-call deadline"""
+    model = get_model(model_name)
+    async with _get_llm_semaphore():
+        mark_call_started()
+        return await asyncio.wait_for(
+            model.generate_content_async(prompt, generation_config=generation_config),
+            timeout=timeout or LLM_CALL_TIMEOUT_SECONDS
+        )
+
+async def stream_content(model_name, prompt, generation_config, timeout=None):
+    """Stream the text of one LLM call, chunk by chunk, under the same limit and deadline"""
+    model = get_model(model_name)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + (timeout or LLM_CALL_TIMEOUT_SECONDS)
+    async with _get_llm_semaphore():
+        mark_call_started()
+        response = await asyncio.wait_for(
+            model.generate_content_async(prompt, generation_config=generation_config, stream=True),
+            timeout=deadline - loop.time()
+        )
+        chunks = response.__aiter__()
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=deadline - loop.time())
+            except StopAsyncIteration:
+                return
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. safety metadata) carry nothing to parse
+                continue
+            yield text
+
+def response_text(response):
+    """Text of a Gemini response, or an empty string if it carries no text parts"""
+    try:
+        return response.text
+    except ValueError:
+        return ""
+
+def finish_reason(response):
+    """Name of the finish reason of the first candidate (e.g. 'STOP', 'MAX_TOKENS')"""
+    try:
+        reason = response.candidates[0].finish_reason
+    except (AttributeError, IndexError):
+        return None
+    return getattr(reason, "name", str(reason))
 
 class QuizGenerator:
     def __init__(self, text: str):
-        genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
         self.text = text
         # Try using a different model that might be better suited for structured output
-        self.model = genai.GenerativeModel('gemini-1.5-pro')
+        self.model_name = PRIMARY_MODEL
         # Fallback model
-        self.fallback_model = genai.GenerativeModel('gemini-2.0-flash')
-
-    def generate_quiz_prompt(self, quiz_type: str, difficulty: str = 'medium'):
-        # Create a more structured prompt with strict type handling
-        type_specific_instructions = {
-            "mcq": """
-            - Generate ONLY Multiple Choice Questions with ONE correct answer
-            - Each question MUST have exactly 4 options
-            - Use the "correct_answer" field to specify the exact text of the correct option
-            - Do NOT use "correct_answers" field
-            """,
-            "true_false": """
-            - Generate ONLY True/False questions
-            - Each question MUST have exactly 2 options: ["True", "False"]
-            - Use the "correct_answer" field to specify either "True" or "False"
-            - Do NOT use "correct_answers" field
-            """,
-            "multi_answer": """
-            - Generate ONLY Multiple Choice Questions with MULTIPLE correct answers
-            - Each question MUST have 4-6 options
-            - Use the "correct_answers" field as an array of the exact text of ALL correct options
-            - Do NOT use "correct_answer" field
-            """
-        }
-
-        difficulty_instructions = {
-            "easy": """
-            - Questions should test basic understanding and recall
-            - Use simple vocabulary and straightforward concepts
-            - Focus on main ideas and explicit information from the text
-            """,
-            "medium": """
-            - Questions should test comprehension and application
-            - Include some analytical thinking
-            - Mix straightforward and more nuanced concepts
-            """,
-            "hard": """
-            - Questions should test analysis and evaluation
-            - Include complex relationships between concepts
-            - Require deeper understanding and critical thinking
-            - Challenge students with nuanced distinctions
-            """
-        }
+        self.fallback_model_name = FALLBACK_MODEL
+
+    def generate_quiz_prompt(self, quiz_type: str, difficulty: str = 'medium',
+                             num_questions: int = QUESTIONS_PER_CALL, text: str = None, section=None,
+                             avoid=None):
+        section_note = ""
+        if section:
+            index, total = section
+            section_note = f"The text is section {index} of {total} of a longer document. Only ask about this section."
+
+        avoid_note = ""
+        if avoid:
+            existing = "\n".join(f"        - {question_text[:200]}" for question_text in avoid)
+            avoid_note = f"""
+        These questions already exist. Do NOT repeat or paraphrase them, ask about different facts:
+{existing}
+"""
 
         return f"""
         You are a quiz generator. Your task is to create a quiz based on the following text:
+        {section_note}
 
         TEXT:
-        {self.text}
+        {text if text is not None else self.text}
 
         INSTRUCTIONS:
-        1. Generate exactly 10 questions based on the text above.
+        1. Generate exactly {num_questions} questions based on the text above.
         2. Each question MUST follow this EXACT format:
            {{
              "text": "Question text here",
@@ -73,10 +318,10 @@ class QuizGenerator:
            }}
 
         DIFFICULTY LEVEL: {difficulty.upper()}
-        {difficulty_instructions.get(difficulty, "")}
+        {DIFFICULTY_INSTRUCTIONS.get(difficulty, "")}
 
         TYPE-SPECIFIC REQUIREMENTS:
-        {type_specific_instructions.get(quiz_type, "")}
+        {TYPE_INSTRUCTIONS.get(quiz_type, "")}
 
         IMPORTANT:
         - Return ONLY the JSON array, with no additional text
@@ -88,10 +333,84 @@ class QuizGenerator:
         - For MCQ questions, options MUST be an array of 4 strings
         - For multi-answer questions, options MUST be an array of 4-6 strings
         - ALL questions must match the specified difficulty level
+        {avoid_note}"""
+
+    def generate_batch_prompt(self, variants, num_questions: int = QUESTIONS_PER_CALL):
+        """One prompt asking for several (quiz_type, difficulty) quizzes over the same text"""
+        quizzes = "".join(f"""
+        QUIZ "{variant_key(quiz_type, difficulty)}": exactly {num_questions} questions, type "{quiz_type}", difficulty "{difficulty}"
+        DIFFICULTY LEVEL: {difficulty.upper()}
+        {DIFFICULTY_INSTRUCTIONS.get(difficulty, "")}
+        TYPE-SPECIFIC REQUIREMENTS:
+        {TYPE_INSTRUCTIONS.get(quiz_type, "")}
+""" for quiz_type, difficulty in variants)
+        keys = ", ".join(f'"{variant_key(quiz_type, difficulty)}"' for quiz_type, difficulty in variants)
+
+        return f"""
+        You are a quiz generator. Your task is to create several quizzes based on the following text:
+
+        TEXT:
+        {self.text}
+
+        INSTRUCTIONS:
+        1. Return ONE JSON object with exactly these keys: {keys}
+        2. The value of each key is a JSON array with the questions of that quiz.
+        3. Each question MUST follow this EXACT format:
+           {{
+             "text": "Question text here",
+             "type": "<quiz type>",
+             "difficulty": "<quiz difficulty>",
+             "options": ["Option 1", "Option 2", "Option 3", "Option 4"],
+             "correct_answer": "The correct answer here"  // For MCQ and True/False ONLY
+             "correct_answers": ["Answer 1", "Answer 2"]  // For multi-answer ONLY
+           }}
+
+        QUIZZES:
+        {quizzes}
+
+        IMPORTANT:
+        - Return ONLY the JSON object, with no additional text
+        - Ensure the JSON is properly formatted and valid
+        - Every question in a quiz MUST have that quiz's type and difficulty
+        - Do NOT reuse the same question in different quizzes
+        - NEVER include both correct_answer and correct_answers in the same question
+        - For True/False questions, options MUST be ["True", "False"]
+        - For MCQ questions, options MUST be an array of 4 strings
+        - For multi-answer questions, options MUST be an array of 4-6 strings
         """
 
+    def parse_batch_response(self, response_text, keys):
+        """Parse a batch response into {key: questions}, salvaging arrays from truncated output"""
+        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
+        if json_match:
+            try:
+                parsed = json.loads(json_match.group(0))
+                if isinstance(parsed, dict):
+                    return {key: parsed.get(key) or [] for key in keys}
+            except json.JSONDecodeError as e:
+                print(f"Failed to parse batch JSON: {e}")
+
+        # Pull every complete question that follows each key
+        salvaged = {}
+        for key in keys:
+            match = re.search(r'"' + re.escape(key) + r'"\s*:', response_text)
+            if not match:
+                salvaged[key] = []
+                continue
+            parser = JSONArrayStreamParser()
+            salvaged[key] = parser.feed(response_text[match.end():])
+        print(f"Recovered batch questions: { {key: len(value) for key, value in salvaged.items()} }")
+        return salvaged
+
     def parse_response(self, response_text):
         """Parse the response text and extract valid questions"""
+        questions, _ = self.parse_response_detailed(response_text)
+        return questions
+
+    def parse_response_detailed(self, response_text):
+        """Parse the response text, salvaging complete questions from a truncated or malformed array.
+
+        Returns (questions, truncated)."""
         print("Parsing response:", response_text[:100] + "..." if len(response_text) > 100 else response_text)
         
         # Try to extract JSON from the response if it's not directly parseable
@@ -103,131 +422,475 @@ class QuizGenerator:
             try:
                 questions = json.loads(json_str)
                 print(f"Successfully parsed extracted JSON. Type: {type(questions)}")
-                return questions
+                return questions, False
             except json.JSONDecodeError as e:
                 print(f"Failed to parse extracted JSON: {e}")
-                return []
         else:
-            print("No JSON array pattern found in response")
-            return []
+            print("No complete JSON array found in response")
+
+        # Keep every complete question object, e.g. when max_output_tokens cut the array short
+        parser = JSONArrayStreamParser()
+        questions = parser.feed(response_text)
+        print(f"Recovered {len(questions)} questions ({parser.malformed} malformed, truncated: {parser.incomplete})")
+        return questions, parser.incomplete
+
+    def check_question(self, q):
+        """Check a single question against the type-specific rules.
+
+        Returns None if the question is valid, otherwise a rejection
+        {"reason": <code>, "message": <text>}."""
+        def reject(reason, message):
+            return {"reason": reason, "message": message}
+
+        if not isinstance(q, dict):
+            return reject("not_object", "Question is not an object")
+
+        # Basic validation
+        missing = [key for key in ["text", "type", "difficulty", "options"] if key not in q]
+        if missing:
+            return reject("missing_fields", f"Question missing required fields: {missing}")
+        if not isinstance(q["options"], list):
+            return reject("options_not_list", "Options must be a list")
+
+        # Type-specific validation
+        question_type = q.get("type")
+        if question_type == "mcq":
+            if len(q["options"]) != 4:
+                return reject("option_count", "MCQ question must have exactly 4 options")
+            if "correct_answer" not in q or "correct_answers" in q:
+                return reject("answer_field", "MCQ question must have correct_answer and not correct_answers")
+            if q["correct_answer"] not in q["options"]:
+                return reject("answer_not_in_options", "MCQ correct answer must be one of the options")
+        elif question_type == "true_false":
+            if q["options"] != ["True", "False"]:
+                return reject("true_false_options", "True/False question must have options ['True', 'False']")
+            if "correct_answer" not in q or "correct_answers" in q:
+                return reject("answer_field", "True/False question must have correct_answer and not correct_answers")
+            if q["correct_answer"] not in ["True", "False"]:
+                return reject("answer_not_in_options", "True/False correct answer must be 'True' or 'False'")
+        elif question_type == "multi_answer":
+            if not (4 <= len(q["options"]) <= 6):
+                return reject("option_count", "Multi-answer question must have 4-6 options")
+            if "correct_answers" not in q or "correct_answer" in q:
+                return reject("answer_field", "Multi-answer question must have correct_answers and not correct_answer")
+            if not isinstance(q["correct_answers"], list):
+                return reject("answers_not_list", "Multi-answer correct_answers must be a list")
+            if not all(ans in q["options"] for ans in q["correct_answers"]):
+                return reject("answer_not_in_options", "Multi-answer correct answers must be from the options")
+        else:
+            return reject("invalid_type", f"Invalid question type: {question_type}")
+
+        return None
+
+    def validate_question(self, q):
+        """True if the question passes check_question"""
+        rejection = self.check_question(q)
+        if rejection:
+            print(f"{rejection['message']}: {q}")
+            return False
+        return True
 
     def validate_questions(self, questions):
         """Validate the questions and return only valid ones"""
+        validated_questions, _ = self.validate_questions_detailed(questions)
+        return validated_questions
+
+    def validate_questions_detailed(self, questions, quiz_type: str = None, difficulty: str = None):
+        """Validate the questions, repairing what can be fixed deterministically.
+
+        Returns (valid questions, rejections) where each rejection carries the
+        question, a reason code and a message."""
         if not isinstance(questions, list):
             print(f"Response is not a list of questions. Type: {type(questions)}")
-            return []
+            return [], [{"question": questions, "reason": "not_list", "message": "Response is not a list"}]
         
         validated_questions = []
+        rejections = []
         for q in questions:
-            # Basic validation
-            if not all(key in q for key in ["text", "type", "difficulty", "options"]):
-                print(f"Question missing required fields: {q}")
+            rejection = self.check_question(q)
+            if rejection:
+                q, rejection = self.repair_question(q, rejection, quiz_type, difficulty)
+            if rejection:
+                print(f"{rejection['message']}: {q}")
+                rejection_counts[rejection["reason"]] += 1
+                rejections.append({"question": q, **rejection})
                 continue
-
-            # Type-specific validation
-            question_type = q.get("type")
-            if question_type == "mcq":
-                if len(q["options"]) != 4:
-                    print(f"MCQ question must have exactly 4 options: {q}")
-                    continue
-                if "correct_answer" not in q or "correct_answers" in q:
-                    print(f"MCQ question must have correct_answer and not correct_answers: {q}")
-                    continue
-                if q["correct_answer"] not in q["options"]:
-                    print(f"MCQ correct answer must be one of the options: {q}")
-                    continue
-            elif question_type == "true_false":
-                if q["options"] != ["True", "False"]:
-                    print(f"True/False question must have options ['True', 'False']: {q}")
-                    continue
-                if "correct_answer" not in q or "correct_answers" in q:
-                    print(f"True/False question must have correct_answer and not correct_answers: {q}")
-                    continue
-                if q["correct_answer"] not in ["True", "False"]:
-                    print(f"True/False correct answer must be 'True' or 'False': {q}")
-                    continue
-            elif question_type == "multi_answer":
-                if not (4 <= len(q["options"]) <= 6):
-                    print(f"Multi-answer question must have 4-6 options: {q}")
-                    continue
-                if "correct_answers" not in q or "correct_answer" in q:
-                    print(f"Multi-answer question must have correct_answers and not correct_answer: {q}")
-                    continue
-                if not isinstance(q["correct_answers"], list):
-                    print(f"Multi-answer correct_answers must be a list: {q}")
-                    continue
-                if not all(ans in q["options"] for ans in q["correct_answers"]):
-                    print(f"Multi-answer correct answers must be from the options: {q}")
-                    continue
-            else:
-                print(f"Invalid question type: {question_type}")
-                continue
-
             validated_questions.append(q)
         
         print(f"Validated {len(validated_questions)} questions out of {len(questions)}")
-        return validated_questions
+        return validated_questions, rejections
 
-    def generate_quiz(self, quiz_type: str = 'mcq', difficulty: str = 'medium'):
-        prompt = self.generate_quiz_prompt(quiz_type, difficulty)
-        try:
-            print(f"Generating quiz with type: {quiz_type} and difficulty: {difficulty}")
-            print(f"Input text length: {len(self.text)}")
-            
-            # Increase safety settings to handle potential content issues
-            generation_config = {
-                'temperature': 0.7,
-                'max_output_tokens': 2048  # Increased token limit
-            }
-            
-            # Try with the primary model first
-            try:
-                print("Trying with primary model (gemini-1.5-pro)...")
-                response = self.model.generate_content(
-                    prompt, 
-                    generation_config=generation_config
-                )
-                
-                # Print raw response for debugging
-                print("Raw Gemini Response:", response.text)
-                print("Response type:", type(response.text))
-                
-                # Parse and validate the response
-                questions = self.parse_response(response.text)
-                validated_questions = self.validate_questions(questions)
-                
-                if validated_questions:
-                    return validated_questions
-                
-                print("Primary model failed to generate valid questions, trying fallback model...")
-            except Exception as e:
-                print(f"Error with primary model: {e}")
-                print("Trying fallback model...")
-            
-            # If primary model fails, try with the fallback model
-            try:
-                response = self.fallback_model.generate_content(
-                    prompt, 
-                    generation_config=generation_config
+    def repair_question(self, q, rejection, quiz_type: str = None, difficulty: str = None):
+        """Apply cheap, deterministic fixes for a rejection before paying for another LLM call.
+
+        Returns (question, remaining rejection or None)."""
+        if not isinstance(q, dict):
+            return q, rejection
+
+        q = dict(q)
+        # One reason is fixed per pass; a question may need a few in a row
+        for _ in range(MAX_REPAIR_PASSES):
+            if not self._repair_once(q, rejection["reason"], quiz_type, difficulty):
+                return q, rejection
+            repair_counts[rejection["reason"]] += 1
+            rejection = self.check_question(q)
+            if rejection is None:
+                return q, None
+        return q, rejection
+
+    def _repair_once(self, q, reason, quiz_type, difficulty):
+        """Fix q in place for one rejection reason. Returns False if no fix applies."""
+        question_type = q.get("type")
+
+        if reason == "missing_fields":
+            # Only fields we already know from the request can be filled in
+            if "type" not in q and quiz_type:
+                q["type"] = quiz_type
+            elif "difficulty" not in q and difficulty:
+                q["difficulty"] = difficulty
+            elif "options" not in q and quiz_type == "true_false":
+                q["options"] = ["True", "False"]
+            else:
+                return False
+            return True
+
+        if reason == "invalid_type":
+            normalized = TYPE_ALIASES.get(str(question_type).strip().lower().replace("-", "_").replace(" ", "_"))
+            if not normalized or normalized == question_type:
+                return False
+            q["type"] = normalized
+            return True
+
+        if reason == "true_false_options":
+            if [str(option).strip().lower() for option in q["options"]] not in (["true", "false"], ["false", "true"]):
+                return False
+            q["options"] = ["True", "False"]
+            return True
+
+        if reason == "answer_field":
+            if question_type in ("mcq", "true_false"):
+                answers = q.pop("correct_answers", None)
+                if "correct_answer" not in q:
+                    if isinstance(answers, list) and len(answers) == 1:
+                        q["correct_answer"] = answers[0]
+                    elif isinstance(answers, str):
+                        q["correct_answer"] = answers
+                    else:
+                        return False
+                return True
+            answer = q.pop("correct_answer", None)
+            if "correct_answers" not in q:
+                if answer is None:
+                    return False
+                q["correct_answers"] = answer if isinstance(answer, list) else [answer]
+            return True
+
+        if reason == "answers_not_list":
+            if not isinstance(q["correct_answers"], str):
+                return False
+            q["correct_answers"] = [part.strip() for part in q["correct_answers"].split(",") if part.strip()]
+            return True
+
+        if reason == "answer_not_in_options":
+            # Match answers to options ignoring case and surrounding whitespace/punctuation
+            by_key = {self._answer_key(option): option for option in q["options"]}
+            if question_type == "multi_answer":
+                matched = [by_key.get(self._answer_key(answer)) for answer in q["correct_answers"]]
+                if None in matched:
+                    return False
+                q["correct_answers"] = matched
+                return True
+            matched = by_key.get(self._answer_key(q["correct_answer"]))
+            if matched is None:
+                return False
+            q["correct_answer"] = matched
+            return True
+
+        if reason == "option_count":
+            # Only trimming is safe: drop surplus distractors, never the correct answers
+            limit = 4 if question_type == "mcq" else 6
+            if len(q["options"]) <= limit:
+                return False
+            answers = q.get("correct_answers")
+            answers = list(answers) if isinstance(answers, list) else [answers]
+            answers.append(q.get("correct_answer"))
+            keep = {self._answer_key(answer) for answer in answers}
+            distractors = [option for option in q["options"] if self._answer_key(option) not in keep]
+            surplus = len(q["options"]) - limit
+            if surplus > len(distractors):
+                return False
+            drop = set(distractors[-surplus:])
+            q["options"] = [option for option in q["options"] if option not in drop]
+            return True
+
+        return False
+
+    @staticmethod
+    def _answer_key(value):
+        return re.sub(r'^[\W_]+|[\W_]+$', '', str(value)).lower()
+
+    async def stream_quiz(self, quiz_type: str = 'mcq', difficulty: str = 'medium',
+                          num_questions: int = QUESTIONS_PER_CALL):
+        """Yield each valid question as soon as the model has produced it, topping up any shortfall"""
+        accepted = []
+        seen = []
+        # Streams cannot be hedged, but still follow the router's order and feed its breakers
+        for model_name in router.candidates():
+            for round_number in range(MAX_TOPUP_ROUNDS + 1):
+                missing = num_questions - len(accepted)
+                if missing <= 0:
+                    return
+
+                prompt = self.generate_quiz_prompt(
+                    quiz_type, difficulty, missing, avoid=[q["text"] for q in accepted]
                 )
-                
-                # Print raw response for debugging
-                print("Raw Fallback Model Response:", response.text)
-                
-                # Parse and validate the response
-                questions = self.parse_response(response.text)
-                validated_questions = self.validate_questions(questions)
-                
-                if validated_questions:
-                    return validated_questions
-                
-                print("Fallback model also failed to generate valid questions.")
-            except Exception as e:
-                print(f"Error with fallback model: {e}")
-            
-            print("No valid questions generated from either model.")
+                parser = JSONArrayStreamParser()
+                added = 0
+                failed = False
+                router.begin(model_name)
+                reset_call_timer()
+                try:
+                    print(f"Streaming {missing} questions from {model_name} (round {round_number + 1})...")
+                    async for text in stream_content(model_name, prompt, GENERATION_CONFIG):
+                        completed = parser.feed(text)
+                        if not completed:
+                            continue
+                        questions, _ = self.validate_questions_detailed(completed, quiz_type, difficulty)
+                        for question in questions:
+                            fingerprint = question_fingerprint(question)
+                            if len(accepted) >= num_questions or is_duplicate(fingerprint, seen):
+                                continue
+                            seen.append(fingerprint)
+                            accepted.append(question)
+                            added += 1
+                            yield question
+                except (asyncio.CancelledError, GeneratorExit):
+                    # The client went away mid-stream
+                    router.record(model_name, "cancelled", call_elapsed())
+                    raise
+                except asyncio.TimeoutError:
+                    print(f"Streaming from {model_name} timed out after {LLM_CALL_TIMEOUT_SECONDS}s")
+                    router.record(model_name, "timeout")
+                    failed = True
+                except Exception as e:
+                    print(f"Error streaming from {model_name}: {e}")
+                    router.record(model_name, "error")
+                    failed = True
+                else:
+                    router.record(model_name, "success" if added else "invalid", call_elapsed())
+
+                if failed or not added:
+                    break
+
+    async def generate_variants(self, variants, num_questions: int = QUESTIONS_PER_CALL):
+        """Generate several (quiz_type, difficulty) variants of a quiz over the same text.
+
+        Short texts are sent once per VARIANTS_PER_CALL variants instead of once
+        per variant; long texts, and quizzes longer than one call, are generated
+        per variant. All calls run concurrently. Returns {(quiz_type, difficulty): questions}."""
+        variants = list(dict.fromkeys(variants))
+        if self.needs_chunking(num_questions) or num_questions > QUESTIONS_PER_CALL:
+            results = await asyncio.gather(*(
+                self.generate_quiz(quiz_type, difficulty, num_questions) for quiz_type, difficulty in variants
+            ))
+            return dict(zip(variants, results))
+
+        groups = [variants[i:i + VARIANTS_PER_CALL] for i in range(0, len(variants), VARIANTS_PER_CALL)]
+        results = await asyncio.gather(*(self._generate_variant_group(group, num_questions) for group in groups))
+        merged = {}
+        for result in results:
+            merged.update(result)
+        return merged
+
+    async def _generate_variant_group(self, variants, num_questions: int):
+        prompt = self.generate_batch_prompt(variants, num_questions)
+        keys = {variant_key(quiz_type, difficulty): (quiz_type, difficulty) for quiz_type, difficulty in variants}
+
+        async def ask(model_name):
+            response = await generate_content(model_name, prompt, BATCH_GENERATION_CONFIG)
+            text = response_text(response)
+            print(f"Raw {model_name} Batch Response:", text[:200])
+            parsed = self.parse_batch_response(text, list(keys))
+            result = {}
+            for key, (quiz_type, difficulty) in keys.items():
+                questions, _ = self.validate_questions_detailed(parsed[key], quiz_type, difficulty)
+                # A valid question filed under the wrong quiz is still wrong for this variant
+                result[(quiz_type, difficulty)] = dedupe_questions(
+                    [q for q in questions if q["type"] == quiz_type]
+                )[:num_questions]
+            return result
+
+        print(f"Generating {len(variants)} variants in one call: {list(keys)}")
+        _, result = await router.route(ask, accept=lambda result: any(result.values()))
+        result = result or {}
+
+        # Variants that came back short are topped up individually
+        async def complete(variant):
+            questions = result.get(variant, [])
+            if len(questions) >= num_questions:
+                return questions
+            return await self.run_prompt(variant[0], variant[1], num_questions, accepted=questions)
+
+        completed = await asyncio.gather(*(complete(variant) for variant in variants))
+        return dict(zip(variants, completed))
+
+    def needs_chunking(self, num_questions: int = QUESTIONS_PER_CALL):
+        # Only the text length matters: a short text has one section however many questions are asked
+        return estimate_tokens(self.text) > CHUNK_TOKEN_BUDGET
+
+    async def generate_quiz(self, quiz_type: str = 'mcq', difficulty: str = 'medium',
+                            num_questions: int = QUESTIONS_PER_CALL, chunked: bool = None):
+        print(f"Generating quiz with type: {quiz_type} and difficulty: {difficulty}")
+        print(f"Input text length: {len(self.text)}")
+
+        if chunked is None:
+            chunked = self.needs_chunking(num_questions)
+        if chunked:
+            return await self.generate_quiz_chunked(quiz_type, difficulty, num_questions)
+
+        questions = await self.generate_section(quiz_type, difficulty, num_questions)
+        return questions[:num_questions]
+
+    async def generate_quiz_chunked(self, quiz_type: str, difficulty: str, num_questions: int):
+        """Map-reduce generation: quiz every section concurrently, then pick a balanced, deduplicated set"""
+        chunks = split_into_chunks(self.text)
+        if not chunks:
             return []
-        
-        except Exception as e:
-            print(f"Error in quiz generation: {e}")
-            return []
\ No newline at end of file
+        # More sections than questions: quiz evenly spaced sections only, so coverage spans
+        # the whole document without paying for candidates the reduce step would drop
+        sections = evenly_spaced(len(chunks), num_questions)
+        print(f"Chunked generation: {len(sections)} of {len(chunks)} sections for {num_questions} questions")
+
+        # Map: sections run concurrently, each with its share of candidates
+        per_chunk = max(2, math.ceil(num_questions * CHUNK_OVERSAMPLE / len(sections)))
+        if len(sections) == 1:
+            # Nothing to balance across; oversampling would only buy duplicates
+            per_chunk = num_questions
+        results = await asyncio.gather(*[
+            self.generate_section(quiz_type, difficulty, per_chunk, text=chunks[index], section=(index + 1, len(chunks)))
+            for index in sections
+        ], return_exceptions=True)
+        candidates = []
+        for index, result in zip(sections, results):
+            if isinstance(result, Exception):
+                print(f"Section {index + 1} failed: {result}")
+                result = []
+            candidates.append(result)
+
+        return self.reduce_questions(candidates, num_questions)
+
+    def reduce_questions(self, candidates, num_questions: int):
+        """Round-robin across sections so every part of the document is covered, skipping duplicates.
+
+        Each round visits the sections in spread_order, so when a round is cut
+        short by num_questions its picks still span the document."""
+        selected = []
+        seen = []
+        positions = [0] * len(candidates)
+        order = spread_order(len(candidates))
+        while len(selected) < num_questions:
+            progressed = False
+            for index in order:
+                section_questions = candidates[index]
+                while positions[index] < len(section_questions):
+                    question = section_questions[positions[index]]
+                    positions[index] += 1
+                    fingerprint = question_fingerprint(question)
+                    if is_duplicate(fingerprint, seen):
+                        continue
+                    seen.append(fingerprint)
+                    selected.append(question)
+                    progressed = True
+                    break
+                if len(selected) >= num_questions:
+                    break
+            if not progressed:
+                break
+
+        print(f"Reduced {sum(len(c) for c in candidates)} candidates to {len(selected)} questions")
+        return selected
+
+    async def ask_model(self, model_name: str, prompt: str, quiz_type: str = None, difficulty: str = None):
+        """Call one model and return (valid questions, whether its output was cut short)"""
+        response = await generate_content(model_name, prompt, GENERATION_CONFIG)
+        text = response_text(response)
+
+        # Print raw response for debugging
+        print(f"Raw {model_name} Response:", text)
+
+        questions, truncated = self.parse_response_detailed(text)
+        truncated = truncated or finish_reason(response) == "MAX_TOKENS"
+        validated_questions, _ = self.validate_questions_detailed(questions, quiz_type, difficulty)
+        return validated_questions, truncated
+
+    async def generate_section(self, quiz_type: str, difficulty: str, num_questions: int,
+                               text: str = None, section=None):
+        """Generate num_questions from one text in sequential calls of at most QUESTIONS_PER_CALL.
+
+        Each call carries the questions accepted so far, so the model asks
+        about new facts instead of repeating itself."""
+        accepted = []
+        while len(accepted) < num_questions:
+            before = len(accepted)
+            target = min(num_questions, before + QUESTIONS_PER_CALL)
+            accepted = await self.run_prompt(
+                quiz_type, difficulty, target, text=text, section=section, accepted=accepted
+            )
+            if len(accepted) == before:
+                break
+        return accepted
+
+    async def run_prompt(self, quiz_type: str, difficulty: str, num_questions: int,
+                         text: str = None, section=None, accepted=None):
+        """Generate num_questions valid questions, topping up any shortfall with small follow-up requests.
+
+        Each follow-up asks only for the missing count and lists the questions
+        already accepted so the model avoids duplicates. Every request goes
+        through the model router, which hedges a slow primary with the
+        fallback and skips models whose circuit is open. Questions passed in
+        as accepted count towards num_questions."""
+        accepted = list(accepted or [])
+        seen = [question_fingerprint(q) for q in accepted]
+        for round_number in range(MAX_TOPUP_ROUNDS + 1):
+            missing = num_questions - len(accepted)
+            if missing <= 0:
+                break
+
+            prompt = self.generate_quiz_prompt(
+                quiz_type, difficulty, missing, text=text, section=section,
+                avoid=[q["text"] for q in accepted]
+            )
+
+            async def ask(model_name):
+                return await self.ask_model(model_name, prompt, quiz_type, difficulty)
+
+            print(f"Requesting {missing} questions (round {round_number + 1})...")
+            model_name, result = await router.route(ask, accept=lambda result: bool(result[0]))
+            if model_name is None:
+                print("No model produced valid questions for this round")
+                break
+
+            questions, truncated = result
+            added = 0
+            for question in questions[:missing]:
+                fingerprint = question_fingerprint(question)
+                if is_duplicate(fingerprint, seen):
+                    continue
+                seen.append(fingerprint)
+                accepted.append(question)
+                added += 1
+            if truncated:
+                print(f"Output from {model_name} was truncated, kept {added} complete questions")
+
+            # Only duplicates came back; more rounds are unlikely to help
+            if not added:
+                break
+
+        if not accepted:
+            print("No valid questions generated from either model.")
+        return accepted
+
+
+def preload_modules():
+    """Import the Gemini SDK ahead of the first request (see PRELOAD_HEAVY_MODULES)"""
+    import google.generativeai  # noqa: F401
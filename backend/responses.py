@@ -0,0 +1,37 @@
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def bson_default(value):
+    """orjson fallback for BSON types it doesn't know (datetimes are native)"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content):
+    return orjson.dumps(content, default=bson_default, option=OPTIONS)
+
+
+class BSONJSONResponse(JSONResponse):
+    """JSON response encoded with orjson: ObjectIds become strings, datetimes ISO 8601.
+
+    Used as the app's default response class. Handlers that return Mongo
+    documents should return an instance directly: FastAPI then skips its
+    jsonable_encoder pass (and any response_model validation) entirely."""
+
+    def render(self, content):
+        return dumps(content)
+
+
+async def stream_json_array(cursor):
+    """Encode documents from a Motor cursor as one JSON array, a document at a time"""
+    yield b"["
+    first = True
+    async for document in cursor:
+        yield (b"" if first else b",") + dumps(document)
+        first = False
+    yield b"]"
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteConcernError
+
+from attempt_writer import AttemptWriter
+
+
+class FakeCollection:
+    """insert_many stand-in; fails documents whose "n" is in duplicates, or the whole batch's write concern"""
+
+    def __init__(self, duplicates=(), write_concern_error=False):
+        self.duplicates = set(duplicates)
+        self.write_concern_error = write_concern_error
+        self.batches = []
+
+    async def insert_many(self, documents, ordered):
+        assert ordered is False
+        self.batches.append(len(documents))
+        await asyncio.sleep(0.001)
+        details = {"writeErrors": [], "writeConcernErrors": []}
+        for index, document in enumerate(documents):
+            if document["n"] in self.duplicates:
+                details["writeErrors"].append({"index": index, "code": 11000, "errmsg": "E11000 duplicate key"})
+        if self.write_concern_error:
+            details["writeConcernErrors"].append({"code": 64, "errmsg": "waiting for replication timed out"})
+        if details["writeErrors"] or details["writeConcernErrors"]:
+            raise BulkWriteError(details)
+
+
+async def submit_all(writer, count):
+    async def submit(n):
+        try:
+            await writer.insert({"n": n})
+            return "saved"
+        except DuplicateKeyError:
+            return "duplicate"
+        except WriteConcernError:
+            return "not durable"
+
+    return await asyncio.gather(*(submit(n) for n in range(count)))
+
+
+async def test_concurrent_inserts_are_batched():
+    collection = FakeCollection()
+    writer = AttemptWriter(collection, batch_size=100, window=0.01)
+    results = await submit_all(writer, 1000)
+    assert results.count("saved") == 1000
+    assert collection.batches == [100] * 10
+    assert writer.stats()["written"] == 1000
+
+
+async def test_partial_batch_is_flushed_after_the_window():
+    collection = FakeCollection()
+    writer = AttemptWriter(collection, batch_size=100, window=0.01)
+    results = await submit_all(writer, 7)
+    assert results == ["saved"] * 7
+    assert collection.batches == [7]
+
+
+async def test_duplicate_is_reported_only_to_its_submitter():
+    collection = FakeCollection(duplicates={3})
+    writer = AttemptWriter(collection, batch_size=10, window=0.01)
+    results = await submit_all(writer, 10)
+    assert results[3] == "duplicate"
+    assert results.count("saved") == 9
+    assert writer.stats()["failed"] == 1
+
+
+async def test_write_concern_error_fails_the_whole_batch():
+    collection = FakeCollection(write_concern_error=True)
+    writer = AttemptWriter(collection, batch_size=10, window=0.01)
+    results = await submit_all(writer, 2)
+    assert results == ["not durable", "not durable"]
+    assert writer.stats()["written"] == 0
+    assert writer.stats()["failed"] == 2
+
+
+async def test_unexpected_error_fails_every_submitter():
+    class Broken:
+        async def insert_many(self, documents, ordered):
+            raise RuntimeError("connection reset")
+
+    writer = AttemptWriter(Broken(), batch_size=10, window=0.01)
+    with pytest.raises(RuntimeError):
+        await writer.insert({"n": 1})
+
+
+async def test_flush_writes_queued_attempts():
+    collection = FakeCollection()
+    writer = AttemptWriter(collection, batch_size=100, window=60)
+    pending = asyncio.ensure_future(writer.insert({"n": 1}))
+    await asyncio.sleep(0)
+    await writer.flush()
+    assert (await pending) == {"n": 1}
+    assert collection.batches == [1]
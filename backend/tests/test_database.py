@@ -0,0 +1,67 @@
+import database
+from database import check_unique_attempts_index, ensure_ttl_index, unique_attempts_enforced
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.commands = []
+
+    async def command(self, name, value, **kwargs):
+        self.commands.append((name, value, kwargs))
+
+
+class FakeCollection:
+    name = "generation_cache"
+
+    def __init__(self, indexes):
+        self.indexes = indexes
+        self.database = FakeDatabase()
+        self.created = []
+
+    async def index_information(self):
+        return self.indexes
+
+    async def create_index(self, keys, **kwargs):
+        self.created.append((keys, kwargs))
+
+
+async def test_ttl_index_is_created_when_missing():
+    collection = FakeCollection({"_id_": {"key": [("_id", 1)]}})
+    await ensure_ttl_index(collection, "created_at", 3600)
+    assert collection.created == [("created_at", {"expireAfterSeconds": 3600})]
+    assert collection.database.commands == []
+
+
+async def test_changed_ttl_is_updated_with_coll_mod():
+    collection = FakeCollection({"created_at_1": {"key": [("created_at", 1)], "expireAfterSeconds": 3600}})
+    await ensure_ttl_index(collection, "created_at", 7200)
+    assert collection.created == []
+    assert collection.database.commands == [(
+        "collMod", "generation_cache",
+        {"index": {"keyPattern": {"created_at": 1}, "expireAfterSeconds": 7200}}
+    )]
+
+
+async def test_unchanged_ttl_is_left_alone():
+    collection = FakeCollection({"created_at_1": {"key": [("created_at", 1)], "expireAfterSeconds": 3600}})
+    await ensure_ttl_index(collection, "created_at", 3600)
+    assert collection.created == []
+    assert collection.database.commands == []
+
+
+async def test_non_unique_attempts_index_is_not_trusted(monkeypatch):
+    collection = FakeCollection({database.ATTEMPTS_INDEX_NAME: {"key": [("student_id", 1), ("quiz_id", 1)]}})
+    monkeypatch.setattr(database, "attempts_collection", collection)
+
+    assert await check_unique_attempts_index() is False
+    assert not unique_attempts_enforced()
+    assert collection.created == []
+
+
+async def test_unique_attempts_index_is_trusted(monkeypatch):
+    collection = FakeCollection({database.ATTEMPTS_INDEX_NAME: {"key": [], "unique": True}})
+    monkeypatch.setattr(database, "attempts_collection", collection)
+    monkeypatch.setattr(database, "_unique_attempts_confirmed", False)
+
+    assert await check_unique_attempts_index(create=False) is True
+    assert unique_attempts_enforced()
@@ -0,0 +1,50 @@
+from grading import compile_answer_key, grade
+
+
+def quiz(*questions):
+    return {"_id": "q1", "questions": list(questions)}
+
+
+MCQ = {"id": "a", "type": "mcq", "options": ["1", "2", "3", "4"], "correct_answer": "2"}
+TRUE_FALSE = {"id": "b", "type": "true_false", "options": ["True", "False"], "correct_answer": "False"}
+MULTI = {"id": "c", "type": "multi_answer", "options": ["w", "x", "y", "z"], "correct_answers": ["x", "z"]}
+
+
+def test_each_question_type_is_graded():
+    key = compile_answer_key(quiz(MCQ, TRUE_FALSE, MULTI))
+
+    correct, score, details = grade(key, [("a", "2"), ("b", "True"), ("c", "z,x")])
+
+    assert correct == 2
+    assert round(score, 2) == 66.67
+    assert [detail["is_correct"] for detail in details] == [True, False, True]
+    assert details[2]["correct_answers"] == ["x", "z"]
+
+
+def test_multi_answer_needs_exactly_the_correct_set():
+    key = compile_answer_key(quiz(MULTI))
+
+    assert grade(key, [("c", "x")])[0] == 0
+    assert grade(key, [("c", "x,y,z")])[0] == 0
+    assert grade(key, [("c", "x,x")])[0] == 0
+
+
+def test_questions_are_found_by_id_or_position():
+    key = compile_answer_key(quiz({k: v for k, v in MCQ.items() if k != "id"}, TRUE_FALSE))
+
+    correct, _, details = grade(key, [("0", "2"), ("b", "False"), ("missing", "2")])
+
+    assert correct == 2
+    assert [detail["question_id"] for detail in details] == ["0", "b"]
+
+
+def test_duplicate_questions_are_graded_separately():
+    key = compile_answer_key(quiz(dict(MCQ, id="0"), dict(MCQ, id="1")))
+
+    correct, score, _ = grade(key, [("0", "2"), ("1", "3")])
+
+    assert (correct, score) == (1, 50)
+
+
+def test_empty_quiz_scores_zero():
+    assert grade(compile_answer_key(quiz()), [("a", "2")]) == (0, 0, [])
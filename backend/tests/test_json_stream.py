@@ -0,0 +1,39 @@
+import pytest
+
+from json_stream import JSONArrayStreamParser
+
+
+def feed_all(text, chunk_size=None):
+    parser = JSONArrayStreamParser()
+    chunk_size = chunk_size or len(text) or 1
+    objects = []
+    for start in range(0, len(text), chunk_size):
+        objects.extend(parser.feed(text[start:start + chunk_size]))
+    return parser, objects
+
+
+@pytest.mark.parametrize("chunk_size", [None, 1, 3])
+def test_objects_are_returned_across_chunks(chunk_size):
+    parser, objects = feed_all('```json\n[{"a": "x]}"}, {"b": [1, {"c": 2}]}]\n```', chunk_size)
+    assert objects == [{"a": "x]}"}, {"b": [1, {"c": 2}]}]
+    assert not parser.incomplete
+
+
+@pytest.mark.parametrize("chunk_size", [None, 1])
+def test_brackets_in_prose_are_not_the_array(chunk_size):
+    parser, objects = feed_all('Here [1] are the questions: [ [x] [\n  {"a": 1}, {"a": 2}]', chunk_size)
+    assert objects == [{"a": 1}, {"a": 2}]
+    assert not parser.incomplete
+
+
+def test_truncated_array_is_incomplete():
+    parser, objects = feed_all('[{"a": 1}, {"a": 2}, {"a": "cut of')
+    assert objects == [{"a": 1}, {"a": 2}]
+    assert parser.incomplete
+
+
+def test_malformed_object_is_skipped():
+    parser, objects = feed_all('[{"a": 1}, {"a": nope}, {"a": 3}]')
+    assert objects == [{"a": 1}, {"a": 3}]
+    assert parser.malformed == 1
+    assert parser.parsed == 2
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+import model_router
+from model_router import CircuitBreaker, ModelRouter, mark_call_started
+
+
+@pytest.fixture(autouse=True)
+def fast_hedging(monkeypatch):
+    monkeypatch.setattr(model_router, "HEDGE_DEFAULT_DELAY_SECONDS", 0.05)
+    monkeypatch.setattr(model_router, "HEDGE_MIN_DELAY_SECONDS", 0.01)
+
+
+async def test_invalid_results_do_not_open_the_circuit():
+    router = ModelRouter(["primary", "fallback"])
+
+    async def empty(model_name):
+        return []
+
+    for _ in range(10):
+        assert await router.route(empty) == (None, [])
+    assert router.breakers["primary"].state == "closed"
+    assert router.breakers["fallback"].state == "closed"
+    assert router.stats()["models"]["primary"]["outcomes"] == {"invalid": 10}
+
+
+async def test_errors_open_the_circuit_and_fail_over():
+    router = ModelRouter(["primary", "fallback"])
+
+    async def call(model_name):
+        if model_name == "primary":
+            raise RuntimeError("503 from the API")
+        return ["question"]
+
+    for _ in range(model_router.CIRCUIT_FAILURE_THRESHOLD):
+        assert await router.route(call) == ("fallback", ["question"])
+    assert router.breakers["primary"].state == "open"
+    assert router.candidates() == ["fallback"]
+
+
+async def test_slow_model_is_hedged():
+    router = ModelRouter(["primary", "fallback"])
+
+    async def call(model_name):
+        await asyncio.sleep(1 if model_name == "primary" else 0)
+        return [model_name]
+
+    assert await router.route(call) == ("fallback", ["fallback"])
+    assert router.decisions["hedged"] == 1
+    assert router.decisions["hedge_won_by:fallback"] == 1
+
+
+async def test_queue_wait_is_not_counted_as_latency():
+    router = ModelRouter(["primary"])
+    slot = asyncio.Semaphore(1)
+
+    async def call(model_name):
+        async with slot:
+            mark_call_started()
+            await asyncio.sleep(0.05)
+        return ["question"]
+
+    await asyncio.gather(*(router.route(call) for _ in range(4)))
+    latencies = list(router.latency["primary"].recent)
+    assert len(latencies) == 4
+    # Each call waited for up to three others, but only its own 50 ms counts
+    assert max(latencies) < 0.12
+
+
+def test_half_open_trial_failure_reopens():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0)
+    breaker.record_failure()
+    assert breaker.state == "half_open"
+    assert breaker.allow_request()
+    breaker.begin()
+    assert not breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.times_opened == 2
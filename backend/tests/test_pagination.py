@@ -0,0 +1,42 @@
+import base64
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from pagination import InvalidCursorError, decode_cursor, encode_cursor, keyset_filter
+
+
+def test_cursor_round_trips_bson_values():
+    values = [datetime(2024, 5, 1, 12, 30, 0, 123000), ObjectId()]
+    assert decode_cursor(encode_cursor(values), 2) == values
+
+
+@pytest.mark.parametrize("values", [[], [1], [1, ObjectId(), 3]])
+def test_cursor_with_the_wrong_number_of_values_is_invalid(values):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(encode_cursor(values), 2)
+
+
+def raw_cursor(text):
+    return base64.urlsafe_b64encode(text.encode()).decode()
+
+
+@pytest.mark.parametrize("cursor", [
+    "not-a-cursor",
+    encode_cursor({"a": 1}).replace("=", ""),
+    "e30",
+    raw_cursor('[{"$oid": "zz"}, 1]'),
+    raw_cursor('[{"$date": "nope"}, 1]'),
+])
+def test_malformed_cursor_is_invalid(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, 2)
+
+
+def test_keyset_filter_breaks_ties_on_id():
+    last_id = ObjectId()
+    assert keyset_filter("score", True, [80, last_id]) == {"$or": [
+        {"score": {"$lt": 80}},
+        {"score": 80, "_id": {"$lt": last_id}}
+    ]}
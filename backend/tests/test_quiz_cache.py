@@ -0,0 +1,49 @@
+import asyncio
+
+from bson import ObjectId
+
+from database import Quiz
+from quiz_cache import QuizCache
+
+
+def fake_reads(monkeypatch, quiz):
+    reads = []
+
+    async def get_by_access_code(access_code):
+        reads.append(access_code)
+        await asyncio.sleep(0.01)
+        return quiz if access_code == quiz["access_code"] else None
+
+    monkeypatch.setattr(Quiz, "get_by_access_code", staticmethod(get_by_access_code))
+    return reads
+
+
+async def test_concurrent_misses_share_one_read(monkeypatch):
+    quiz = {"_id": ObjectId(), "access_code": "EXAM42", "questions": []}
+    reads = fake_reads(monkeypatch, quiz)
+    cache = QuizCache()
+
+    results = await asyncio.gather(*(cache.get_by_access_code("EXAM42") for _ in range(50)))
+
+    assert all(result is quiz for result in results)
+    assert reads == ["EXAM42"]
+    assert cache.loads == 1
+    assert cache.coalesced == 49
+    # Later lookups, by code or by id, are served from memory
+    assert await cache.get_by_id(quiz["_id"]) is quiz
+    assert await cache.get_by_access_code("EXAM42") is quiz
+    assert reads == ["EXAM42"]
+
+
+async def test_invalidation_during_a_read_is_not_overwritten(monkeypatch):
+    quiz = {"_id": ObjectId(), "access_code": "EXAM42", "questions": []}
+    reads = fake_reads(monkeypatch, quiz)
+    cache = QuizCache()
+
+    pending = asyncio.ensure_future(cache.get_by_access_code("EXAM42"))
+    await asyncio.sleep(0)
+    cache.invalidate(quiz["_id"], "EXAM42")
+    assert await pending is quiz
+
+    await cache.get_by_access_code("EXAM42")
+    assert len(reads) == 2
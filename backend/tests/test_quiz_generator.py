@@ -0,0 +1,161 @@
+import pytest
+
+import quiz_generator
+from quiz_generator import QUESTIONS_PER_CALL, QuizGenerator
+
+
+def mcq(text, answer="Paris"):
+    return {
+        "text": text,
+        "type": "mcq",
+        "difficulty": "medium",
+        "options": ["Paris", "Rome", "Madrid", "Berlin"],
+        "correct_answer": answer
+    }
+
+
+class FakeModel:
+    """Stands in for QuizGenerator.ask_model: returns as many distinct questions as the prompt asks for"""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def __call__(self, model_name, prompt, quiz_type=None, difficulty=None):
+        self.prompts.append(prompt)
+        count = int(prompt.split("Generate exactly ")[1].split()[0])
+        offset = len(self.prompts) * 100
+        section = int(prompt.split("section ")[1].split(" of")[0]) if "is section " in prompt else None
+        questions = [mcq(f"Unique question {offset + i} about topic {offset + i} alpha beta") for i in range(count)]
+        for question in questions:
+            question["section"] = section
+        return questions, False
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    model = FakeModel()
+    monkeypatch.setattr(QuizGenerator, "ask_model", lambda self, *args: model(*args))
+    return model
+
+
+async def test_short_text_with_many_questions_is_not_chunked(fake_model):
+    generator = QuizGenerator("A short text about European capitals.")
+    assert not generator.needs_chunking(30)
+
+    questions = await generator.generate_quiz("mcq", "medium", 30)
+
+    assert len(questions) == 30
+    # Sequential calls of at most QUESTIONS_PER_CALL, each told what already exists
+    assert len(fake_model.prompts) == 30 // QUESTIONS_PER_CALL
+    assert "already exist" not in fake_model.prompts[0]
+    assert all("already exist" in prompt for prompt in fake_model.prompts[1:])
+    assert all("section" not in prompt.split("TEXT:")[0] for prompt in fake_model.prompts)
+
+
+async def test_long_text_is_split_into_sections(fake_model):
+    # Three paragraphs that each take up most of a section's token budget
+    paragraph_chars = quiz_generator.CHUNK_TOKEN_BUDGET * quiz_generator.CHARS_PER_TOKEN * 3 // 4
+    text = "\n\n".join(f"Paragraph {i} " + "word " * (paragraph_chars // 5) for i in range(3))
+    generator = QuizGenerator(text)
+    assert generator.needs_chunking(5)
+
+    questions = await generator.generate_quiz("mcq", "medium", 5)
+
+    assert len(questions) == 5
+    sections = {prompt.split("section ")[1].split(" of")[0] for prompt in fake_model.prompts}
+    assert sections == {"1", "2", "3"}
+
+
+async def test_many_sections_are_sampled_across_the_document(fake_model):
+    # 40 sections, far more than the 10 questions asked for
+    paragraph_chars = quiz_generator.CHUNK_TOKEN_BUDGET * quiz_generator.CHARS_PER_TOKEN * 3 // 4
+    text = "\n\n".join(f"Paragraph {i} " + "word " * (paragraph_chars // 5) for i in range(40))
+    generator = QuizGenerator(text)
+    assert len(quiz_generator.split_into_chunks(text)) == 40
+
+    questions = await generator.generate_quiz("mcq", "medium", 10)
+
+    assert len(questions) == 10
+    # One call per quizzed section, not one per section of the document
+    assert len(fake_model.prompts) == 10
+    sections = sorted(int(prompt.split("section ")[1].split(" of")[0]) for prompt in fake_model.prompts)
+    assert sections[0] <= 5 and sections[-1] >= 36
+    picked = sorted({question["section"] for question in questions})
+    assert len(picked) == 10 and picked[0] <= 5 and picked[-1] >= 36
+
+
+def test_reduce_spreads_a_short_round_across_sections(generator):
+    candidates = [[mcq(f"Which claim{s}x{n} about topic{s}y{n} holds{s}z{n}?") for n in range(3)]
+                  for s in range(8)]
+    for s, section_questions in enumerate(candidates):
+        for question in section_questions:
+            question["section"] = s
+
+    selected = generator.reduce_questions(candidates, 4)
+
+    sections = sorted(question["section"] for question in selected)
+    assert len(set(sections)) == 4
+    assert sections[0] <= 1 and sections[-1] >= 6
+
+
+@pytest.fixture
+def generator():
+    return QuizGenerator("")
+
+
+def test_valid_question_passes(generator):
+    assert generator.check_question(mcq("Capital of France?")) is None
+
+
+def test_repairs_answer_casing(generator):
+    question = mcq("Capital of France?", answer=" paris.")
+    valid, rejections = generator.validate_questions_detailed([question], "mcq", "medium")
+    assert rejections == []
+    assert valid[0]["correct_answer"] == "Paris"
+
+
+def test_repairs_single_answer_in_wrong_field(generator):
+    question = mcq("Capital of France?")
+    question["correct_answers"] = [question.pop("correct_answer")]
+    valid, _ = generator.validate_questions_detailed([question], "mcq", "medium")
+    assert valid[0]["correct_answer"] == "Paris"
+    assert "correct_answers" not in valid[0]
+
+
+def test_trims_surplus_options_but_keeps_the_answer(generator):
+    question = mcq("Capital of France?")
+    question["options"] = ["Lyon", "Rome", "Madrid", "Berlin", "paris"]
+    question["correct_answer"] = "Paris"
+    valid, _ = generator.validate_questions_detailed([question], "mcq", "medium")
+    assert len(valid[0]["options"]) == 4
+    assert valid[0]["correct_answer"] in valid[0]["options"]
+
+
+def test_fills_missing_type_from_the_request(generator):
+    question = mcq("Capital of France?")
+    del question["type"]
+    valid, _ = generator.validate_questions_detailed([question], "mcq", "medium")
+    assert valid[0]["type"] == "mcq"
+
+
+def test_unfixable_question_is_rejected_with_a_reason(generator):
+    question = mcq("Capital of France?", answer="Lisbon")
+    valid, rejections = generator.validate_questions_detailed([question], "mcq", "medium")
+    assert valid == []
+    assert rejections[0]["reason"] == "answer_not_in_options"
+
+
+def test_repair_does_not_modify_the_input(generator):
+    question = mcq("Capital of France?", answer="paris")
+    generator.validate_questions_detailed([question], "mcq", "medium")
+    assert question["correct_answer"] == "paris"
+
+
+def test_truncated_response_after_prose_brackets_is_salvaged():
+    generator = QuizGenerator("A short text about European capitals.")
+    text = 'Here [1] are the questions: [{"text": "Capital of France?"}, {"text": "Capital of It'
+
+    questions, truncated = generator.parse_response_detailed(text)
+
+    assert questions == [{"text": "Capital of France?"}]
+    assert truncated
@@ -0,0 +1,86 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from fastapi.testclient import TestClient
+
+import main
+from auth import get_student_claims, get_teacher_claims
+from database import Quiz
+
+TEACHER_ID = ObjectId()
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+    async def to_list(self, length):
+        return self.documents[:length]
+
+
+@pytest.fixture
+def find_page(monkeypatch):
+    calls = []
+
+    def fake_find_page(query, projection=None, after=None, descending=False, limit=None):
+        calls.append({"query": query, "projection": projection, "after": after, "limit": limit})
+        quizzes = [
+            {"_id": ObjectId(), "teacher_id": TEACHER_ID, "title": f"Quiz {i}", "created_at": datetime(2024, 1, 1)}
+            for i in range(3)
+        ]
+        return FakeCursor(quizzes[:limit + 1] if limit else quizzes)
+
+    monkeypatch.setattr(Quiz, "find_page", staticmethod(fake_find_page))
+    return calls
+
+
+@pytest.fixture
+def client():
+    main.app.dependency_overrides[get_student_claims] = lambda: {"_id": ObjectId(), "name": "S", "email": "s@x.io"}
+    main.app.dependency_overrides[get_teacher_claims] = lambda: {"_id": TEACHER_ID, "name": "T", "email": "t@x.io"}
+    yield TestClient(main.app)
+    main.app.dependency_overrides.clear()
+
+
+def test_students_get_summaries_by_default(client, find_page):
+    response = client.get("/quizzes")
+    assert response.status_code == 200
+    assert [quiz["title"] for quiz in response.json()] == ["Quiz 0", "Quiz 1", "Quiz 2"]
+    assert "question_count" in find_page[0]["projection"]
+    assert "questions" not in find_page[0]["projection"]
+
+
+def test_student_full_view_hides_answers_and_codes(client, find_page):
+    client.get("/quizzes", params={"view": "full"})
+    projection = find_page[0]["projection"]
+    assert projection["questions.correct_answer"] == 0
+    assert projection["questions.correct_answers"] == 0
+    assert projection["access_code"] == 0
+
+
+def test_teacher_listing_is_scoped_and_full_view_is_unprojected(client, find_page):
+    client.get("/quizzes/teacher", params={"view": "full"})
+    assert find_page[0]["query"] == {"teacher_id": TEACHER_ID}
+    assert find_page[0]["projection"] is None
+
+
+def test_pages_chain_through_the_cursor_header(client, find_page):
+    first = client.get("/quizzes", params={"limit": 2})
+    assert len(first.json()) == 2
+    cursor = first.headers["X-Next-Cursor"]
+    client.get("/quizzes", params={"limit": 2, "cursor": cursor})
+    assert str(find_page[1]["after"]) == first.json()[-1]["_id"]
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "W3siJG9pZCI6ICJ6eiJ9XQ", "W3siJGRhdGUiOiAibm9wZSJ9XQ"])
+def test_bad_cursor_is_rejected(client, find_page, cursor):
+    # The last two are well-formed base64 JSON: [{"$oid": "zz"}] and [{"$date": "nope"}]
+    assert client.get("/quizzes", params={"limit": 2, "cursor": cursor}).status_code == 400
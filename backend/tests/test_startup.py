@@ -0,0 +1,8 @@
+from bench.importtime import LAZY_MODULES, import_times
+
+
+def test_importing_main_leaves_heavy_modules_unloaded():
+    times = import_times("main")
+
+    assert "main" in times
+    assert [name for name in LAZY_MODULES if name in times] == []
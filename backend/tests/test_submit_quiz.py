@@ -0,0 +1,68 @@
+import pytest
+from bson import ObjectId
+from fastapi.testclient import TestClient
+
+import database
+import main
+from auth import get_current_student
+from database import QuizAttempt
+
+STUDENT = {"_id": ObjectId(), "name": "S", "email": "s@x.io"}
+QUIZ = {
+    "_id": ObjectId(),
+    "questions": [{"id": "0", "type": "mcq", "options": ["a", "b", "c", "d"], "correct_answer": "a"}]
+}
+
+
+@pytest.fixture
+def submit(monkeypatch):
+    lookups = []
+    inserted = []
+
+    async def get_by_id(quiz_id):
+        return QUIZ
+
+    async def get_by_student_and_quiz(student_id, quiz_id):
+        lookups.append((student_id, quiz_id))
+        return {"_id": ObjectId(), "score": 100}
+
+    async def insert(attempt):
+        inserted.append(attempt)
+        return attempt
+
+    monkeypatch.setattr(main.quiz_cache, "get_by_id", get_by_id)
+    monkeypatch.setattr(QuizAttempt, "get_by_student_and_quiz", staticmethod(get_by_student_and_quiz))
+    monkeypatch.setattr(main.attempt_writer, "insert", insert)
+    main.app.dependency_overrides[get_current_student] = lambda: STUDENT
+    client = TestClient(main.app)
+
+    def post():
+        return client.post("/quizzes/submit", json={
+            "quiz_id": str(QUIZ["_id"]), "answers": [{"question_id": "0", "answer": "a"}]
+        })
+
+    yield post, lookups, inserted
+    main.app.dependency_overrides.clear()
+
+
+def test_resubmission_is_rejected_before_the_unique_index_exists(monkeypatch, submit):
+    post, lookups, inserted = submit
+    monkeypatch.setattr(database, "_unique_attempts_confirmed", False)
+
+    response = post()
+
+    assert response.status_code == 400
+    assert lookups == [(str(STUDENT["_id"]), str(QUIZ["_id"]))]
+    assert inserted == []
+
+
+def test_unique_index_replaces_the_lookup(monkeypatch, submit):
+    post, lookups, inserted = submit
+    monkeypatch.setattr(database, "_unique_attempts_confirmed", True)
+
+    response = post()
+
+    assert response.status_code == 200
+    assert response.json()["score"] == 100
+    assert lookups == []
+    assert len(inserted) == 1
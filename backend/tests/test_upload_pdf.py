@@ -0,0 +1,48 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import pdf_extraction
+
+
+@pytest.fixture
+def spooled_paths(monkeypatch):
+    paths = []
+    spool_upload = pdf_extraction.spool_upload
+
+    async def recording_spool_upload(upload, *args, **kwargs):
+        result = await spool_upload(upload, *args, **kwargs)
+        paths.append(result[0])
+        return result
+
+    async def fake_iter_pages_cached(path, digest, size, start_page=1, end_page=None):
+        yield [(1, "Page one")]
+
+    monkeypatch.setattr(pdf_extraction, "spool_upload", recording_spool_upload)
+    monkeypatch.setattr(pdf_extraction, "iter_pages_cached", fake_iter_pages_cached)
+    return paths
+
+
+def test_streamed_upload_removes_its_temp_file(spooled_paths):
+    response = TestClient(main.app).post(
+        "/upload-pdf?stream=true", files={"file": ("a.pdf", b"%PDF-1.4 test", "application/pdf")}
+    )
+
+    assert response.status_code == 200
+    assert "event: done" in response.text
+    assert len(spooled_paths) == 1
+    assert not os.path.exists(spooled_paths[0])
+
+
+def test_declared_oversize_upload_is_rejected_before_parsing(monkeypatch, spooled_paths):
+    monkeypatch.setattr(pdf_extraction, "MAX_PDF_UPLOAD_BYTES", 1024)
+    body = b"x" * (1024 + main.PDF_MULTIPART_OVERHEAD_BYTES + 1)
+
+    response = TestClient(main.app).post(
+        "/upload-pdf", content=body, headers={"Content-Type": "multipart/form-data; boundary=b"}
+    )
+
+    assert response.status_code == 413
+    assert spooled_paths == []
@@ -0,0 +1,113 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+import web_scraper
+from web_scraper import FetchError, PageTooLargeError, ResponseCache
+
+PAGE = b"<html><body><p>Cached page</p></body></html>"
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Local stand-in for the sites being scraped"""
+
+    requests = []
+
+    def do_GET(self):
+        Handler.requests.append((self.path, self.headers.get("If-None-Match")))
+        if self.path == "/etag":
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_page(PAGE, {"ETag": '"v1"'})
+        elif self.path == "/big":
+            # No Content-Length, so the limit has to be enforced while reading
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.end_headers()
+            for _ in range(8):
+                self.wfile.write(b"x" * 1024)
+        elif self.path == "/slow":
+            time.sleep(1)
+            self.send_page(PAGE)
+        else:
+            self.send_response(404)
+            self.end_headers()
+
+    def send_page(self, body, headers=None):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+async def scraper(monkeypatch):
+    Handler.requests = []
+    monkeypatch.setattr(web_scraper, "response_cache", ResponseCache())
+    monkeypatch.setattr(web_scraper, "SCRAPE_TIMEOUT_SECONDS", 0.2)
+    monkeypatch.setattr(web_scraper, "SCRAPE_MAX_BODY_BYTES", 4 * 1024)
+    monkeypatch.setattr(web_scraper, "_client", None)
+    yield web_scraper
+    await web_scraper.close_client()
+
+
+async def test_stale_entry_is_revalidated_with_etag(server, scraper, monkeypatch):
+    first = await scraper.fetch(server + "/etag")
+    assert first.body == PAGE and not first.from_cache
+
+    fresh = await scraper.fetch(server + "/etag")
+    assert fresh.from_cache and not fresh.revalidated
+    assert len(Handler.requests) == 1
+
+    monkeypatch.setattr(web_scraper, "SCRAPE_CACHE_FRESH_SECONDS", 0)
+    revalidated = await scraper.fetch(server + "/etag")
+    assert revalidated.revalidated and revalidated.body == PAGE
+    assert Handler.requests[-1] == ("/etag", '"v1"')
+    assert scraper.response_cache.stats()["revalidated_304"] == 1
+
+
+async def test_body_over_the_limit_is_rejected(server, scraper):
+    with pytest.raises(PageTooLargeError):
+        await scraper.fetch(server + "/big")
+    assert len(scraper.response_cache.entries) == 0
+
+
+async def test_slow_server_times_out(server, scraper):
+    with pytest.raises(FetchError) as error:
+        await scraper.fetch(server + "/slow")
+    assert isinstance(error.value.__cause__, httpx.TimeoutException)
+
+
+def test_response_cache_is_capped_by_total_bytes():
+    cache = ResponseCache(maxsize=100, maxbytes=250)
+    for i in range(3):
+        cache.entries.set(f"/page{i}", web_scraper.CachedResponse(b"x" * 100, "utf-8", None, None, 0.0))
+
+    assert "/page0" not in cache.entries
+    assert len(cache.entries) == 2
+    assert cache.stats()["bytes"] == 200
+
+    cache.entries.set("/huge", web_scraper.CachedResponse(b"x" * 300, "utf-8", None, None, 0.0))
+    assert len(cache.entries) == 0
+    assert cache.stats()["bytes"] == 0
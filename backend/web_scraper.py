@@ -0,0 +1,408 @@
+import asyncio
+import os
+import re
+import time
+from collections import Counter
+import threading
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+from dotenv import load_dotenv
+from caching import LRUCache
+from extraction_cache import extraction_cache, sha256_hex
+
+load_dotenv()
+
+# Shared connection pool and per-request limits
+SCRAPE_TIMEOUT_SECONDS = float(os.getenv("SCRAPE_TIMEOUT_SECONDS", "15"))
+SCRAPE_MAX_BODY_BYTES = int(os.getenv("SCRAPE_MAX_BODY_BYTES", str(10 * 1024 * 1024)))
+SCRAPE_MAX_CONNECTIONS = int(os.getenv("SCRAPE_MAX_CONNECTIONS", "50"))
+# Cached responses (capped by count and by total body bytes) are reused as-is for this long,
+# then revalidated with ETag/Last-Modified
+SCRAPE_CACHE_SIZE = int(os.getenv("SCRAPE_CACHE_SIZE", "256"))
+SCRAPE_CACHE_MAX_BYTES = int(os.getenv("SCRAPE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+SCRAPE_CACHE_FRESH_SECONDS = float(os.getenv("SCRAPE_CACHE_FRESH_SECONDS", "300"))
+# Reading lists: parallel fetches allowed against one host
+SCRAPE_PER_HOST_CONCURRENCY = int(os.getenv("SCRAPE_PER_HOST_CONCURRENCY", "2"))
+
+# Parsed articles are kept briefly so keywords/summary can be computed on a follow-up request
+ARTICLE_CACHE_SIZE = int(os.getenv("ARTICLE_CACHE_SIZE", "64"))
+ARTICLE_CACHE_TTL_SECONDS = float(os.getenv("ARTICLE_CACHE_TTL_SECONDS", "600"))
+
+USER_AGENT = "Mozilla/5.0 (compatible; TestifyAI/1.0; +https://github.com/Hitoshi-Kazuto/QuizGenerator)"
+
+# Look for NLTK punkt (bundled via NLTK_DATA) once, downloading it only if missing and allowed
+NLTK_DOWNLOAD_IF_MISSING = os.getenv("NLTK_DOWNLOAD_IF_MISSING", "true").lower() == "true"
+
+_client = None
+_nltk_checked = False
+_nltk_lock = threading.Lock()
+
+
+class FetchError(Exception):
+    """The page could not be downloaded"""
+
+
+class PageTooLargeError(FetchError):
+    pass
+
+
+def ensure_nltk_data():
+    """Make sure the punkt tokenizer that article.nlp() needs is available, checking only once"""
+    global _nltk_checked
+    if _nltk_checked:
+        return
+    with _nltk_lock:
+        if _nltk_checked:
+            return
+        import nltk
+        try:
+            nltk.data.find('tokenizers/punkt')
+        except LookupError:
+            if not NLTK_DOWNLOAD_IF_MISSING:
+                raise
+            # Download required NLTK data
+            nltk.download('punkt', quiet=True)
+        _nltk_checked = True
+
+
+@dataclass
+class FetchResult:
+    url: str
+    body: bytes
+    encoding: str
+    from_cache: bool = False
+    revalidated: bool = False
+
+    @property
+    def html(self):
+        return self.body.decode(self.encoding or "utf-8", errors="replace")
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    encoding: str
+    etag: str
+    last_modified: str
+    fetched_at: float
+
+
+class ResponseCache:
+    """In-process URL cache that revalidates stale entries with conditional requests.
+
+    Bounded by total body size as well as entry count, since a single page
+    may be up to SCRAPE_MAX_BODY_BYTES."""
+
+    def __init__(self, maxsize=SCRAPE_CACHE_SIZE, maxbytes=SCRAPE_CACHE_MAX_BYTES):
+        self.entries = LRUCache(maxsize=maxsize, maxbytes=maxbytes, sizeof=lambda cached: len(cached.body))
+        self.fresh_hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "bytes": self.entries.bytes,
+            "fresh_hits": self.fresh_hits,
+            "revalidated_304": self.revalidated,
+            "misses": self.misses
+        }
+
+
+response_cache = ResponseCache()
+article_cache = LRUCache(maxsize=ARTICLE_CACHE_SIZE, ttl=ARTICLE_CACHE_TTL_SECONDS)
+
+
+def get_client():
+    """Shared AsyncClient so connections are pooled and reused across requests"""
+    global _client
+    if _client is None:
+        import httpx
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(SCRAPE_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=SCRAPE_MAX_CONNECTIONS,
+                max_keepalive_connections=SCRAPE_MAX_CONNECTIONS // 2
+            ),
+            follow_redirects=True,
+            headers={"User-Agent": USER_AGENT}
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def fetch(url):
+    """GET url through the response cache, reading at most SCRAPE_MAX_BODY_BYTES"""
+    import httpx
+    try:
+        return await _fetch(url)
+    except httpx.HTTPError as e:
+        raise FetchError(str(e)) from e
+
+
+async def _fetch(url):
+    cached = response_cache.entries.get(url)
+    if cached and time.monotonic() - cached.fetched_at < SCRAPE_CACHE_FRESH_SECONDS:
+        response_cache.fresh_hits += 1
+        return FetchResult(url, cached.body, cached.encoding, from_cache=True)
+
+    headers = {}
+    if cached and cached.etag:
+        headers["If-None-Match"] = cached.etag
+    if cached and cached.last_modified:
+        headers["If-Modified-Since"] = cached.last_modified
+
+    async with get_client().stream("GET", url, headers=headers) as response:
+        if response.status_code == 304 and cached:
+            response_cache.revalidated += 1
+            cached.fetched_at = time.monotonic()
+            return FetchResult(url, cached.body, cached.encoding, from_cache=True, revalidated=True)
+
+        response.raise_for_status()
+        declared = response.headers.get("Content-Length")
+        if declared and declared.isdigit() and int(declared) > SCRAPE_MAX_BODY_BYTES:
+            raise PageTooLargeError(f"Page is larger than {SCRAPE_MAX_BODY_BYTES} bytes")
+
+        chunks = []
+        size = 0
+        async for chunk in response.aiter_bytes():
+            size += len(chunk)
+            if size > SCRAPE_MAX_BODY_BYTES:
+                raise PageTooLargeError(f"Page is larger than {SCRAPE_MAX_BODY_BYTES} bytes")
+            chunks.append(chunk)
+        body = b"".join(chunks)
+        encoding = response.charset_encoding or "utf-8"
+
+        response_cache.misses += 1
+        response_cache.entries.set(url, CachedResponse(
+            body=body,
+            encoding=encoding,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            fetched_at=time.monotonic()
+        ))
+        return FetchResult(url, body, encoding)
+
+
+def soup_text(html):
+    """Plain-text fallback: visible text of the page with whitespace collapsed"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    # Remove script and style elements
+    for script in soup(["script", "style"]):
+        script.decompose()
+    
+    # Get text content
+    text = soup.get_text()
+    
+    # Clean up the text
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return ' '.join(chunk for chunk in chunks if chunk)
+
+
+def parse_page(url, html):
+    """Parse an already downloaded page (CPU-bound, run off the event loop).
+
+    Returns (text, metadata, article); metadata and article are None when
+    newspaper could not parse the page. Keywords and summary are left to
+    run_nlp, which is much more expensive than the parse itself."""
+    from newspaper import Article
+
+    try:
+        article = Article(url)
+        article.download(input_html=html)
+        article.parse()
+    except Exception as e:
+        print(f"Article extraction failed: {e}")
+        # If article extraction fails, try basic BeautifulSoup scraping
+        text = soup_text(html)
+        print(f"Extracted text length (fallback): {len(text)}")
+        return text, None, None
+
+    # Get the cleaned text, or the BeautifulSoup text if the article text is empty
+    text = article.text
+    if not text.strip():
+        text = soup_text(html)
+    print(f"Extracted text length: {len(text)}")
+
+    metadata = {
+        "title": article.title,
+        "authors": article.authors,
+        "publish_date": article.publish_date.isoformat() if article.publish_date else None
+    }
+    return text, metadata, article
+
+
+def run_nlp(article):
+    """Keywords and summary of a parsed article (needs NLTK punkt)"""
+    ensure_nltk_data()
+    # Natural Language Processing
+    article.nlp()
+    return {
+        "keywords": article.keywords,
+        "summary": article.summary
+    }
+
+
+async def article_metadata(url):
+    """Keywords and summary for url, reusing the recently parsed article when there is one.
+
+    Returns None if the page cannot be parsed as an article."""
+    page = await fetch(url)
+    digest = sha256_hex(page.body)
+    cached = await extraction_cache.get(digest)
+    if cached and "summary" in (cached.get("metadata") or {}):
+        return cached["metadata"]
+
+    article = article_cache.get(url)
+    if article is None:
+        _, _, article = await asyncio.to_thread(parse_page, url, page.html)
+        if article is None:
+            return None
+        article_cache.set(url, article)
+
+    nlp_metadata = await asyncio.to_thread(run_nlp, article)
+    entry = await extraction_cache.put(digest, 1, {}, nlp_metadata)
+    return entry.get("metadata") or nlp_metadata
+
+
+async def scrape(url, nlp=False):
+    """Fetch and extract one page. Returns (text, metadata).
+
+    With nlp=True the metadata also carries keywords and a summary."""
+    page = await fetch(url)
+
+    # The same page is often scraped again; skip parsing when its HTML was seen before
+    digest = sha256_hex(page.body)
+    cached = await extraction_cache.get(digest)
+    extraction_cache.record_lookup(1, 1 if cached and cached["pages"].get(1) else 0, len(page.body))
+    if cached and cached["pages"].get(1):
+        text, metadata = cached["pages"][1], cached.get("metadata") or None
+    else:
+        text, metadata, article = await asyncio.to_thread(parse_page, url, page.html)
+        if article is not None:
+            article_cache.set(url, article)
+        if text.strip():
+            await extraction_cache.put(digest, 1, {1: text}, metadata)
+
+    if nlp and metadata is not None and "summary" not in metadata:
+        metadata = await article_metadata(url) or metadata
+    return text, metadata
+
+
+def split_segments(text):
+    """Paragraphs of a page, or sentences when the text is one long line (BeautifulSoup fallback)"""
+    segments = [line.strip() for line in text.splitlines() if line.strip()]
+    if len(segments) <= 1:
+        segments = [part.strip() for part in re.split(r'(?<=[.!?])\s+', text) if part.strip()]
+    return segments
+
+
+def remove_shared_boilerplate(texts):
+    """Drop segments (navigation, footers, cookie notices) that appear on more than one page.
+
+    Returns the cleaned texts and the number of characters removed from each."""
+    segmented = [split_segments(text) for text in texts]
+    if len(segmented) < 2:
+        return list(texts), [0] * len(texts)
+
+    seen_on = Counter()
+    for segments in segmented:
+        seen_on.update(set(segments))
+
+    cleaned = []
+    removed = []
+    for text, segments in zip(texts, segmented):
+        kept = [segment for segment in segments if seen_on[segment] < 2]
+        joined = "\n".join(kept)
+        cleaned.append(joined)
+        removed.append(max(0, len(text) - len(joined)))
+    return cleaned, removed
+
+
+def allocate_budget(lengths, budget):
+    """Split budget characters across pages: short pages keep everything, long ones share the rest evenly"""
+    allocation = [0] * len(lengths)
+    remaining = budget
+    order = sorted(range(len(lengths)), key=lambda index: lengths[index])
+    for position, index in enumerate(order):
+        share = remaining // (len(order) - position)
+        allocation[index] = min(lengths[index], share)
+        remaining -= allocation[index]
+    return allocation
+
+
+def truncate_text(text, limit):
+    """Cut text to at most limit characters, preferring a paragraph or sentence boundary"""
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    boundary = max(cut.rfind("\n"), cut.rfind(". "))
+    if boundary > limit // 2:
+        cut = cut[:boundary + 1]
+    return cut.rstrip()
+
+
+async def scrape_many(urls, max_chars):
+    """Scrape a reading list concurrently and combine it into one text of at most max_chars.
+
+    Fetches run in parallel with at most SCRAPE_PER_HOST_CONCURRENCY per host.
+    Returns (combined text, per-URL results in input order)."""
+    host_limits = {}
+
+    async def scrape_one(url):
+        host = urlsplit(url).hostname
+        limit = host_limits.setdefault(host, asyncio.Semaphore(SCRAPE_PER_HOST_CONCURRENCY))
+        started = time.perf_counter()
+        result = {"url": url, "status": "ok", "error": None, "title": None}
+        async with limit:
+            try:
+                text, metadata = await scrape(url)
+                result["text"] = text
+                result["title"] = (metadata or {}).get("title")
+                if not text.strip():
+                    result["status"] = "empty"
+                    result["error"] = "No text could be extracted from the website"
+            except FetchError as e:
+                result.update(status="error", error=f"Failed to access website: {str(e)}", text="")
+            except Exception as e:
+                result.update(status="error", error=str(e), text="")
+        result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    results = await asyncio.gather(*(scrape_one(url) for url in urls))
+
+    ok = [result for result in results if result["status"] == "ok"]
+    cleaned, removed = remove_shared_boilerplate([result["text"] for result in ok])
+    separator = "\n\n"
+    budget = max(0, max_chars - len(separator) * max(0, len(ok) - 1))
+    allocation = allocate_budget([len(text) for text in cleaned], budget)
+
+    parts = []
+    for result, text, removed_chars, limit in zip(ok, cleaned, removed, allocation):
+        used = truncate_text(text, limit)
+        result["chars"] = len(result["text"])
+        result["boilerplate_chars_removed"] = removed_chars
+        result["chars_used"] = len(used)
+        if used:
+            parts.append(used)
+
+    for result in results:
+        del result["text"]
+    return separator.join(parts), results
+
+
+def preload_modules():
+    """Import the parsing libraries ahead of the first request (see PRELOAD_HEAVY_MODULES)"""
+    import httpx  # noqa: F401
+    import bs4  # noqa: F401
+    import newspaper  # noqa: F401
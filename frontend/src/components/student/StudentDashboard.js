@@ -53,7 +53,9 @@ const StudentDashboard = () => {
   const fetchQuizzes = async () => {
     try {
       const token = localStorage.getItem('token');
+      // Summaries only: questions are loaded when a quiz is accessed by code
       const response = await axios.get(`${API_BASE_URL}/quizzes`, {
+        params: { view: 'summary' },
         headers: { Authorization: `Bearer ${token}` }
       });
       setQuizzes(response.data);
@@ -239,7 +241,7 @@ const StudentDashboard = () => {
                   <div key={index} className="quiz-card">
                     <h3>{quiz.title}</h3>
                     <p className="quiz-description">{quiz.description}</p>
-                    <p>Number of questions: {quiz.questions.length}</p>
+                    <p>Number of questions: {quiz.question_count}</p>
                     <p>Type: {quiz.quiz_type}</p>
                     <button 
                       className="start-quiz-btn"
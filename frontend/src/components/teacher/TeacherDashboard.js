@@ -45,7 +45,9 @@ function TeacherDashboard() {
   const fetchTeacherQuizzes = async () => {
     try {
       const token = localStorage.getItem('token');
+      // Full view: the preview and downloads use each quiz's questions and answers
       const response = await axios.get(`${API_BASE_URL}/quizzes/teacher`, {
+        params: { view: 'full' },
         headers: { Authorization: `Bearer ${token}` }
       });
       setSavedQuizzes(response.data);
@@ -162,6 +164,15 @@ function TeacherDashboard() {
         }
         if (summary) {
           setQuizDescription(summary);
+        } else {
+          // The summary is computed lazily by a follow-up request; fill it in when it arrives
+          axios.post(`${API_BASE_URL}/scrape-website/metadata`, { url: websiteUrl })
+            .then((metadataResponse) => {
+              if (metadataResponse.data.summary) {
+                setQuizDescription(metadataResponse.data.summary);
+              }
+            })
+            .catch((err) => console.error('Fetching website summary failed:', err));
         }
       }
       